@@ -1,10 +1,103 @@
-import os
 import json
 import logging
-from app import app
+from string import Template
+from project_tree import ProjectTree, DirectorySink, write_tree_to_directory, diff_trees
+from zip_stream import iter_zip_tree
+from project_skeleton import ProjectSkeleton
+
+# Compiled once; these are the only boilerplate files that vary between projects
+DEFAULT_GRADLE_TEMPLATE = Template('''apply plugin: 'com.android.application'
+
+android {
+    namespace '${package_name}'
+    compileSdk 34
+
+    defaultConfig {
+        applicationId "${package_name}"
+        minSdk 21
+        targetSdk 34
+        versionCode 1
+        versionName "1.0"
+
+        testInstrumentationRunner "androidx.test.runner.AndroidJUnitRunner"
+    }
+
+    buildTypes {
+        release {
+            minifyEnabled false
+            proguardFiles getDefaultProguardFile('proguard-android-optimize.txt'), 'proguard-rules.pro'
+        }
+    }
+    compileOptions {
+        sourceCompatibility JavaVersion.VERSION_11
+        targetCompatibility JavaVersion.VERSION_11
+    }
+}
+
+dependencies {
+    implementation 'androidx.appcompat:appcompat:1.6.1'
+    implementation 'com.google.android.material:material:1.8.0'
+    implementation 'androidx.constraintlayout:constraintlayout:2.1.4'
+    testImplementation 'junit:junit:4.13.2'
+    androidTestImplementation 'androidx.test.ext:junit:1.1.5'
+    androidTestImplementation 'androidx.test.espresso:espresso-core:3.5.1'
+}''')
+
+README_TEMPLATE = Template('''# ${app_name}
+
+${description}
+
+## Project Information
+- **Package Name**: ${package_name}
+- **Generated**: Automatically created using Gemini AI
+- **Target SDK**: 33
+- **Min SDK**: 21
+
+## Features
+This Android application includes:
+- Modern Material Design UI
+- Responsive layouts
+- Java-based implementation
+- AndroidX compatibility
+
+## Getting Started
+
+### Prerequisites
+- Android Studio (latest version recommended)
+- Android SDK 33
+- Java Development Kit (JDK) 8 or higher
+
+### Installation
+1. Open Android Studio
+2. Select "Open an existing Android Studio project"
+3. Navigate to and select this project folder
+4. Wait for Gradle sync to complete
+5. Build and run the app on your device or emulator
+
+### Building the App
+1. In Android Studio, go to Build → Build Bundle(s) / APK(s) → Build APK(s)
+2. Once built, the APK will be located in `app/build/outputs/apk/`
+
+## Project Structure
+```
+app/
+├── src/main/
+│   ├── java/           # Java source files
+│   ├── res/           # Resources (layouts, values, etc.)
+│   └── AndroidManifest.xml
+├── build.gradle       # App-level build configuration
+└── README.md          # This file
+```
+
+## Support
+This project was generated using AI. For Android development help, refer to the official Android documentation at https://developer.android.com/
+''')
+
+# Default location of generated projects, relative to the working directory
+DEFAULT_OUTPUT_DIR = 'generated_projects'
 
 class AndroidGenerator:
-    def __init__(self):
+    def __init__(self, sink=None, skeleton_folder=None, catalog=None, output_dir=DEFAULT_OUTPUT_DIR):
         self.base_project_structure = {
             'app/src/main/java/': {},
             'app/src/main/res/layout/': {},
@@ -13,117 +106,150 @@ class AndroidGenerator:
             'app/src/main/': {},
             'app/': {}
         }
-
-    def create_android_project(self, app_structure, project_id):
+        # Where create_android_project stores projects; defaults to one folder per project under output_dir
+        self.sink = sink or DirectorySink(output_dir)
+        # Optional ProjectCatalog recording each project's metadata for listing and search
+        self.catalog = catalog
+        self.skeleton = self.build_skeleton(skeleton_folder)
+
+    def build_skeleton(self, folder=None):
+        """Render the boilerplate shared by every project once"""
+        skeleton = ProjectSkeleton(folder)
+        skeleton.add_file('build.gradle', self.generate_project_gradle())
+        skeleton.add_file('settings.gradle', "include ':app'\n")
+        skeleton.add_file('gradle.properties', self.generate_gradle_properties())
+        self.add_gradle_wrapper(skeleton)
+        return skeleton.finalize()
+
+    def create_android_project(self, app_structure, project_id, sink=None, prompt=None, provider=None):
         """Create complete Android project structure with generated code"""
         try:
-            # Clean app_structure of problematic Unicode characters
-            app_structure = self.sanitize_app_structure(app_structure)
-            project_path = os.path.join(app.config['GENERATED_PROJECTS_FOLDER'], project_id)
-            os.makedirs(project_path, exist_ok=True)
-
-            # Extract package name and create directory structure
-            package_name = app_structure.get('package_name', 'com.example.myapp')
-            package_path = package_name.replace('.', '/')
-
-            # Create directory structure
-            directories = [
-                f'app/src/main/java/{package_path}',
-                'app/src/main/res/layout',
-                'app/src/main/res/values',
-                'app/src/main/res/drawable',
-                'app/src/main/res/mipmap-hdpi',
-                'app/src/main/res/mipmap-mdpi',
-                'app/src/main/res/mipmap-xhdpi',
-                'app/src/main/res/mipmap-xxhdpi',
-                'app/src/main/res/mipmap-xxxhdpi'
-            ]
-
-            for directory in directories:
-                os.makedirs(os.path.join(project_path, directory), exist_ok=True)
-
-            # Create MainActivity.java
-            main_activity = app_structure.get('main_activity', {})
-            if main_activity.get('java_code'):
-                with open(os.path.join(project_path, f'app/src/main/java/{package_path}/MainActivity.java'), 'w', encoding='utf-8') as f:
-                    f.write(main_activity['java_code'])
-
-            # Create additional activities
-            additional_activities = app_structure.get('additional_activities', [])
-            for activity in additional_activities:
-                if activity.get('java_code'):
-                    activity_name = activity.get('name', 'Activity')
-                    with open(os.path.join(project_path, f'app/src/main/java/{package_path}/{activity_name}.java'), 'w', encoding='utf-8') as f:
-                        f.write(activity['java_code'])
-
-            # Create layout files
-            if main_activity.get('xml_layout'):
-                layout_name = main_activity.get('layout', 'activity_main')
-                with open(os.path.join(project_path, f'app/src/main/res/layout/{layout_name}.xml'), 'w', encoding='utf-8') as f:
-                    f.write(main_activity['xml_layout'])
-
-            # Create additional layout files
-            for activity in additional_activities:
-                if activity.get('xml_layout'):
-                    layout_name = activity.get('layout', 'layout')
-                    with open(os.path.join(project_path, f'app/src/main/res/layout/{layout_name}.xml'), 'w', encoding='utf-8') as f:
-                        f.write(activity['xml_layout'])
-
-            # Create resource files
-            resource_files = {
-                'strings.xml': app_structure.get('strings'),
-                'colors.xml': app_structure.get('colors'),
-                'styles.xml': app_structure.get('styles')
-            }
-
-            for filename, content in resource_files.items():
-                if content:
-                    with open(os.path.join(project_path, f'app/src/main/res/values/{filename}'), 'w', encoding='utf-8') as f:
-                        f.write(content)
-
-            # Create AndroidManifest.xml
-            if app_structure.get('manifest'):
-                with open(os.path.join(project_path, 'app/src/main/AndroidManifest.xml'), 'w', encoding='utf-8') as f:
-                    f.write(app_structure['manifest'])
-
-            # Create build.gradle
-            if app_structure.get('gradle'):
-                with open(os.path.join(project_path, 'app/build.gradle'), 'w', encoding='utf-8') as f:
-                    f.write(app_structure['gradle'])
-            else:
-                # Create default build.gradle
-                default_gradle = self.generate_default_gradle(app_structure)
-                with open(os.path.join(project_path, 'app/build.gradle'), 'w', encoding='utf-8') as f:
-                    f.write(default_gradle)
-
-            # Create project-level build.gradle
-            project_gradle = self.generate_project_gradle()
-            with open(os.path.join(project_path, 'build.gradle'), 'w', encoding='utf-8') as f:
-                f.write(project_gradle)
+            tree = self.build_project_tree(app_structure)
+            location = (sink or self.sink).write(project_id, tree)
+            self.catalog_project(project_id, app_structure, tree, prompt, provider)
+            return location
 
-            # Create settings.gradle
-            with open(os.path.join(project_path, 'settings.gradle'), 'w', encoding='utf-8') as f:
-                f.write("include ':app'\n")
-
-            # Create gradle.properties
-            gradle_props = self.generate_gradle_properties()
-            with open(os.path.join(project_path, 'gradle.properties'), 'w', encoding='utf-8') as f:
-                f.write(gradle_props)
+        except Exception as e:
+            logging.error(f"Error creating Android project: {str(e)}")
+            return None
 
-            # Create Gradle wrapper files
-            self.create_gradle_wrapper(project_path)
+    def catalog_project(self, project_id, app_structure, tree, prompt=None, provider=None):
+        """Record the project in the catalog; a catalog failure never fails the generation"""
+        if self.catalog is None:
+            return
+        try:
+            self.catalog.record(project_id, app_structure, tree, prompt=prompt, provider=provider)
+        except Exception as e:
+            logging.error(f"Error cataloguing project {project_id}: {str(e)}")
 
-            # Create README.md
-            readme_content = self.generate_readme(app_structure)
-            with open(os.path.join(project_path, 'README.md'), 'w', encoding='utf-8') as f:
-                f.write(readme_content)
+    def update_android_project(self, app_structure, project_id, sink=None, prompt=None, provider=None):
+        """Rewrite only the files of an existing project that app_structure changes.
 
-            return project_path
+        Returns the list of written or deleted paths, or None if the project could not be updated.
+        """
+        sink = sink or self.sink
+        try:
+            tree = self.build_project_tree(app_structure)
+            previous = sink.load(project_id)
+            if previous is None:
+                sink.write(project_id, tree)
+                self.catalog_project(project_id, app_structure, tree, prompt, provider)
+                return [path for path, _ in tree.iter_files()]
+            changed, removed = diff_trees(previous, tree)
+            if changed or removed:
+                sink.update(project_id, tree, changed, removed)
+            self.catalog_project(project_id, app_structure, tree, prompt, provider)
+            logging.info(f"Updated project {project_id}: {len(changed)} files written, {len(removed)} removed")
+            return sorted(changed + removed)
 
         except Exception as e:
-            logging.error(f"Error creating Android project: {str(e)}")
+            logging.error(f"Error updating Android project: {str(e)}")
             return None
 
+    def iter_project_zip(self, app_structure):
+        """Stream a ZIP of the generated project without writing anything to disk"""
+        return iter_zip_tree(self.build_project_tree(app_structure))
+
+    def build_project_tree(self, app_structure):
+        """Build the complete Android project as an in-memory file tree"""
+        # Clean app_structure of problematic Unicode characters
+        app_structure = self.sanitize_app_structure(app_structure)
+        tree = ProjectTree()
+
+        # Extract package name and create directory structure
+        package_name = app_structure.get('package_name', 'com.example.myapp')
+        package_path = package_name.replace('.', '/')
+
+        # Create directory structure
+        directories = [
+            f'app/src/main/java/{package_path}',
+            'app/src/main/res/layout',
+            'app/src/main/res/values',
+            'app/src/main/res/drawable',
+            'app/src/main/res/mipmap-hdpi',
+            'app/src/main/res/mipmap-mdpi',
+            'app/src/main/res/mipmap-xhdpi',
+            'app/src/main/res/mipmap-xxhdpi',
+            'app/src/main/res/mipmap-xxxhdpi'
+        ]
+
+        for directory in directories:
+            tree.add_directory(directory)
+
+        # Create MainActivity.java
+        main_activity = app_structure.get('main_activity', {})
+        if main_activity.get('java_code'):
+            tree.add_file(f'app/src/main/java/{package_path}/MainActivity.java', main_activity['java_code'])
+
+        # Create additional activities
+        additional_activities = app_structure.get('additional_activities', [])
+        for activity in additional_activities:
+            if activity.get('java_code'):
+                activity_name = activity.get('name', 'Activity')
+                tree.add_file(f'app/src/main/java/{package_path}/{activity_name}.java', activity['java_code'])
+
+        # Create layout files
+        if main_activity.get('xml_layout'):
+            layout_name = main_activity.get('layout', 'activity_main')
+            tree.add_file(f'app/src/main/res/layout/{layout_name}.xml', main_activity['xml_layout'])
+
+        # Create additional layout files
+        for activity in additional_activities:
+            if activity.get('xml_layout'):
+                layout_name = activity.get('layout', 'layout')
+                tree.add_file(f'app/src/main/res/layout/{layout_name}.xml', activity['xml_layout'])
+
+        # Create resource files
+        resource_files = {
+            'strings.xml': app_structure.get('strings'),
+            'colors.xml': app_structure.get('colors'),
+            'styles.xml': app_structure.get('styles')
+        }
+
+        for filename, content in resource_files.items():
+            if content:
+                tree.add_file(f'app/src/main/res/values/{filename}', content)
+
+        # Create AndroidManifest.xml
+        if app_structure.get('manifest'):
+            tree.add_file('app/src/main/AndroidManifest.xml', app_structure['manifest'])
+
+        # Create build.gradle
+        if app_structure.get('gradle'):
+            tree.add_file('app/build.gradle', app_structure['gradle'])
+        else:
+            # Create default build.gradle
+            tree.add_file('app/build.gradle', self.generate_default_gradle(app_structure))
+
+        # Project-level build.gradle, settings.gradle, gradle.properties and the Gradle
+        # wrapper are identical in every project and shared from the skeleton
+        self.skeleton.apply(tree)
+
+        # Create README.md
+        tree.add_file('README.md', self.generate_readme(app_structure))
+
+        return tree
+
     def sanitize_app_structure(self, app_structure):
         """Remove or replace problematic Unicode characters"""
         import json
@@ -149,10 +275,10 @@ class AndroidGenerator:
             app_name = app_structure.get('app_name', 'My Android App')
             ui_components = app_structure.get('ui_components', [])
 
-            # Extract colors for theming
+            # Extract colors for theming (preview responses carry them as plain hex values)
             colors_xml = app_structure.get('colors', '')
-            primary_color = self.extract_color(colors_xml, 'colorPrimary', '#2196F3')
-            accent_color = self.extract_color(colors_xml, 'colorAccent', '#FF4081')
+            primary_color = app_structure.get('primary_color') or self.extract_color(colors_xml, 'colorPrimary', '#2196F3')
+            accent_color = app_structure.get('accent_color') or self.extract_color(colors_xml, 'colorAccent', '#FF4081')
 
             # Generate HTML for UI components
             components_html = ""
@@ -229,44 +355,7 @@ class AndroidGenerator:
     def generate_default_gradle(self, app_structure):
         """Generate default build.gradle for app module"""
         package_name = app_structure.get('package_name', 'com.example.myapp')
-        app_name = app_structure.get('app_name', 'MyApp').replace(' ', '')
-
-        return f'''apply plugin: 'com.android.application'
-
-android {{
-    namespace '{package_name}'
-    compileSdk 34
-
-    defaultConfig {{
-        applicationId "{package_name}"
-        minSdk 21
-        targetSdk 34
-        versionCode 1
-        versionName "1.0"
-
-        testInstrumentationRunner "androidx.test.runner.AndroidJUnitRunner"
-    }}
-
-    buildTypes {{
-        release {{
-            minifyEnabled false
-            proguardFiles getDefaultProguardFile('proguard-android-optimize.txt'), 'proguard-rules.pro'
-        }}
-    }}
-    compileOptions {{
-        sourceCompatibility JavaVersion.VERSION_11
-        targetCompatibility JavaVersion.VERSION_11
-    }}
-}}
-
-dependencies {{
-    implementation 'androidx.appcompat:appcompat:1.6.1'
-    implementation 'com.google.android.material:material:1.8.0'
-    implementation 'androidx.constraintlayout:constraintlayout:2.1.4'
-    testImplementation 'junit:junit:4.13.2'
-    androidTestImplementation 'androidx.test.ext:junit:1.1.5'
-    androidTestImplementation 'androidx.test.espresso:espresso-core:3.5.1'
-}}'''
+        return DEFAULT_GRADLE_TEMPLATE.substitute(package_name=package_name)
 
     def generate_project_gradle(self):
         """Generate project-level build.gradle"""
@@ -306,84 +395,39 @@ android.nonTransitiveRClass=true
 # Automatically convert third-party libraries to use AndroidX
 android.enableJetifier=true'''
 
-    def create_gradle_wrapper(self, project_path):
-        """Create Gradle wrapper files"""
-        gradle_wrapper_dir = os.path.join(project_path, 'gradle', 'wrapper')
-        os.makedirs(gradle_wrapper_dir, exist_ok=True)
-
+    def add_gradle_wrapper(self, tree):
+        """Add Gradle wrapper files to a project tree"""
         # Create gradle-wrapper.properties
-        with open(os.path.join(gradle_wrapper_dir, 'gradle-wrapper.properties'), 'w', encoding='utf-8') as f:
-            f.write("distributionBase=GRADLE_USER_HOME\n")
-            f.write("distributionPath=wrapper/dists\n")
-            f.write("distributionUrl=https\\://services.gradle.org/distributions/gradle-8.0-bin.zip\n")
-            f.write("zipStoreBase=GRADLE_USER_HOME\n")
-            f.write("zipStorePath=wrapper/dists\n")
+        tree.add_file('gradle/wrapper/gradle-wrapper.properties',
+                      "distributionBase=GRADLE_USER_HOME\n"
+                      "distributionPath=wrapper/dists\n"
+                      "distributionUrl=https\\://services.gradle.org/distributions/gradle-8.0-bin.zip\n"
+                      "zipStoreBase=GRADLE_USER_HOME\n"
+                      "zipStorePath=wrapper/dists\n")
 
         # Create gradlew (Linux/macOS)
-        with open(os.path.join(project_path, 'gradlew'), 'w', encoding='utf-8') as f:
-            f.write("#!/usr/bin/env sh\n")
-            f.write("eval \"$(dirname $0)/gradlew\" \"$@\"\n")
-        os.chmod(os.path.join(project_path, 'gradlew'), 0o755)
+        tree.add_file('gradlew',
+                      "#!/usr/bin/env sh\n"
+                      "eval \"$(dirname $0)/gradlew\" \"$@\"\n",
+                      mode=0o755)
 
         # Create gradlew.bat (Windows)
-        with open(os.path.join(project_path, 'gradlew.bat'), 'w', encoding='utf-8') as f:
-            f.write("@echo off\n")
-            f.write("if not defined PROG do set PROG=%0\n")
-            f.write("call \"%PROG%\" --sys-prop org.gradle.jvmargs=-Xmx2048m -Dfile.encoding=UTF-8 \"%@\"\n")
+        tree.add_file('gradlew.bat',
+                      "@echo off\n"
+                      "if not defined PROG do set PROG=%0\n"
+                      "call \"%PROG%\" --sys-prop org.gradle.jvmargs=-Xmx2048m -Dfile.encoding=UTF-8 \"%@\"\n")
+
+    def create_gradle_wrapper(self, project_path):
+        """Create Gradle wrapper files"""
+        tree = ProjectTree()
+        self.add_gradle_wrapper(tree)
+        write_tree_to_directory(tree, project_path)
 
 
     def generate_readme(self, app_structure):
         """Generate README.md for the Android project"""
-        app_name = app_structure.get('app_name', 'Android App')
-        description = app_structure.get('description', 'Generated Android application')
-        package_name = app_structure.get('package_name', 'com.example.myapp')
-
-        return f'''# {app_name}
-
-{description}
-
-## Project Information
-- **Package Name**: {package_name}
-- **Generated**: Automatically created using Gemini AI
-- **Target SDK**: 33
-- **Min SDK**: 21
-
-## Features
-This Android application includes:
-- Modern Material Design UI
-- Responsive layouts
-- Java-based implementation
-- AndroidX compatibility
-
-## Getting Started
-
-### Prerequisites
-- Android Studio (latest version recommended)
-- Android SDK 33
-- Java Development Kit (JDK) 8 or higher
-
-### Installation
-1. Open Android Studio
-2. Select "Open an existing Android Studio project"
-3. Navigate to and select this project folder
-4. Wait for Gradle sync to complete
-5. Build and run the app on your device or emulator
-
-### Building the App
-1. In Android Studio, go to Build → Build Bundle(s) / APK(s) → Build APK(s)
-2. Once built, the APK will be located in `app/build/outputs/apk/`
-
-## Project Structure
-```
-app/
-├── src/main/
-│   ├── java/           # Java source files
-│   ├── res/           # Resources (layouts, values, etc.)
-│   └── AndroidManifest.xml
-├── build.gradle       # App-level build configuration
-└── README.md          # This file
-```
-
-## Support
-This project was generated using AI. For Android development help, refer to the official Android documentation at https://developer.android.com/
-'''
\ No newline at end of file
+        return README_TEMPLATE.substitute(
+            app_name=app_structure.get('app_name', 'Android App'),
+            description=app_structure.get('description', 'Generated Android application'),
+            package_name=app_structure.get('package_name', 'com.example.myapp')
+        )
@@ -1,6 +1,7 @@
 import os
 import logging
 from flask import Flask
+from rate_limiter import parse_rate_limits
 
 # Configure logging for debug mode
 logging.basicConfig(level=logging.DEBUG)
@@ -13,14 +14,98 @@ app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-prod
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['GENERATED_PROJECTS_FOLDER'] = 'generated_projects'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['CACHE_FOLDER'] = 'cache'
+app.config['CONFIG_FILE'] = os.environ.get('CONFIG_FILE', 'config.json')
+
+# Provider response cache (in-process LRU + SQLite on disk)
+app.config['RESPONSE_CACHE_MEMORY_ENTRIES'] = int(os.environ.get('RESPONSE_CACHE_MEMORY_ENTRIES', 256))
+app.config['RESPONSE_CACHE_MAX_BYTES'] = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+app.config['RESPONSE_CACHE_TTL'] = int(os.environ.get('RESPONSE_CACHE_TTL', 7 * 24 * 3600))
+
+# Pooled keep-alive HTTP sessions for provider calls
+app.config['HTTP_POOL_SIZE'] = int(os.environ.get('HTTP_POOL_SIZE', 10))
+app.config['HTTP_CONNECT_TIMEOUT'] = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+app.config['HTTP_READ_TIMEOUT'] = float(os.environ.get('HTTP_READ_TIMEOUT', 120))
+
+# Serving through asgi.py: connection cap of the shared asyncio HTTP client, and threads
+# running the remaining (synchronous) Flask views
+app.config['ASYNC_MAX_CONNECTIONS'] = int(os.environ.get('ASYNC_MAX_CONNECTIONS', 200))
+app.config['ASGI_WSGI_WORKERS'] = int(os.environ.get('ASGI_WSGI_WORKERS', 10))
+
+# Background generation jobs (set JOB_WORKERS=0 for processes that should only enqueue)
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['JOB_DEFAULT_CONCURRENCY'] = int(os.environ.get('JOB_DEFAULT_CONCURRENCY', 2))
+app.config['JOB_PROVIDER_CONCURRENCY'] = {
+    # e.g. JOB_PROVIDER_CONCURRENCY="groq=4,gemini=1"
+    name.strip(): int(limit)
+    for name, limit in (item.split('=') for item in os.environ.get('JOB_PROVIDER_CONCURRENCY', '').split(',') if '=' in item)
+}
+app.config['JOB_STALE_AFTER'] = int(os.environ.get('JOB_STALE_AFTER', 900))
+
+# Uploads whose perceptual hashes differ by at most this many bits (up to 7) are reported as similar_to
+# an earlier upload; they are still stored, only byte-identical uploads reuse the existing file
+app.config['IMAGE_DUPLICATE_MAX_DISTANCE'] = int(os.environ.get('IMAGE_DUPLICATE_MAX_DISTANCE', 4))
+
+# Keep built project ZIPs under cache/zips (keyed on a content digest) instead of streaming each download
+app.config['ZIP_CACHE_ENABLED'] = os.environ.get('ZIP_CACHE_ENABLED', 'false').lower() in ['1', 'true', 'yes']
+
+# Send the image once with the generation call (vision providers) instead of a separate analysis call
+app.config['IMAGE_SINGLE_PASS'] = os.environ.get('IMAGE_SINGLE_PASS', 'true').lower() in ['1', 'true', 'yes']
+
+# Generate full apps as a plan call followed by concurrent per-screen, resource and build-file calls
+app.config['GENERATION_PIPELINE'] = os.environ.get('GENERATION_PIPELINE', 'false').lower() in ['1', 'true', 'yes']
+app.config['PIPELINE_WORKERS'] = int(os.environ.get('PIPELINE_WORKERS', 4))
+
+# Input-token budget per prompt; long requirements and image analyses are trimmed to fit (0 = no limit)
+app.config['PROMPT_INPUT_BUDGET'] = int(os.environ.get('PROMPT_INPUT_BUDGET', 6000))
+
+# How long a session's last generated app is kept as the base for prompt edits (edit=1)
+app.config['EDIT_SESSION_TTL'] = int(os.environ.get('EDIT_SESSION_TTL', 24 * 3600))
+
+# Batch generation (/generate_batch, batch_generation.py): prompts per batch and generations in flight
+app.config['BATCH_MAX_PROMPTS'] = int(os.environ.get('BATCH_MAX_PROMPTS', 100))
+app.config['BATCH_CONCURRENCY'] = int(os.environ.get('BATCH_CONCURRENCY', 4))
+
+# Where generated projects live: 'disk' (generated_projects/<id>), 'memory' (most recent N, never written)
+# or 'blobstore' (deduplicated blobs plus one manifest per project under BLOB_STORE_FOLDER)
+app.config['PROJECT_BACKEND'] = os.environ.get('PROJECT_BACKEND', 'disk').lower()
+app.config['MEMORY_PROJECTS_MAX'] = int(os.environ.get('MEMORY_PROJECTS_MAX', 200))
+app.config['BLOB_STORE_FOLDER'] = os.environ.get('BLOB_STORE_FOLDER', 'project_store')
+
+# Retention: items unused for longer than the TTL are removed, then the least recently used
+# until each folder fits its quota. 0 disables a limit; a sweep interval of 0 disables the sweeper.
+app.config['RETENTION_SWEEP_INTERVAL'] = int(os.environ.get('RETENTION_SWEEP_INTERVAL', 600))
+app.config['RETENTION_BATCH_SIZE'] = int(os.environ.get('RETENTION_BATCH_SIZE', 200))
+app.config['UPLOAD_TTL'] = int(os.environ.get('UPLOAD_TTL', 7 * 24 * 3600))
+app.config['UPLOAD_MAX_BYTES'] = int(os.environ.get('UPLOAD_MAX_BYTES', 1024 * 1024 * 1024))
+app.config['PROJECT_TTL'] = int(os.environ.get('PROJECT_TTL', 14 * 24 * 3600))
+app.config['PROJECT_MAX_BYTES'] = int(os.environ.get('PROJECT_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+app.config['ZIP_CACHE_TTL'] = int(os.environ.get('ZIP_CACHE_TTL', 24 * 3600))
+app.config['ZIP_CACHE_MAX_BYTES'] = int(os.environ.get('ZIP_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+
+# Route each request to the best healthy provider that has credentials in config.json, failing
+# over on errors and rate limits; previews can also be hedged across two providers
+app.config['PROVIDER_ROUTING'] = os.environ.get('PROVIDER_ROUTING', 'false').lower() in ['1', 'true', 'yes']
+app.config['ROUTING_PROVIDERS'] = tuple(p.strip() for p in os.environ.get('ROUTING_PROVIDERS', 'gemini,groq,huggingface,ollama').split(',') if p.strip())
+app.config['HEDGE_PREVIEWS'] = os.environ.get('HEDGE_PREVIEWS', 'false').lower() in ['1', 'true', 'yes']
+app.config['HEDGE_DELAY'] = float(os.environ.get('HEDGE_DELAY', 2.0))
+
+# Client-side budgets per provider and API key, checked before each call; 0 means unlimited
+# e.g. RATE_LIMITS="groq=30:6000,gemini=15" (requests per minute[:tokens per minute]); bad entries fail at startup
+app.config['RATE_LIMITS'] = parse_rate_limits(os.environ.get('RATE_LIMITS', ''))
+# Longest a request waits for budget before it is rejected (or failed over to another provider)
+app.config['RATE_LIMIT_MAX_WAIT'] = float(os.environ.get('RATE_LIMIT_MAX_WAIT', 10))
+app.config['PROVIDER_MAX_RETRIES'] = int(os.environ.get('PROVIDER_MAX_RETRIES', 2))
 
 # Ensure upload directories exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['GENERATED_PROJECTS_FOLDER'], exist_ok=True)
+os.makedirs(app.config['CACHE_FOLDER'], exist_ok=True)
 
 # Import routes after app creation to avoid circular imports
 from routes import *
 
 if __name__ == '__main__':
     # Use 0.0.0.0 for compatibility with different environments
+    start_background_workers(reloader=True)
     app.run(host='0.0.0.0', port=8080, debug=True)
@@ -0,0 +1,293 @@
+import io
+import json
+import asyncio
+import logging
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+from werkzeug.wrappers import Request
+from app import app
+from routes import (response_cache, session_pool, rate_limiter, prompt_builder, config_store, job_queue,
+                    preview_requests, resolve_uploaded_image, complete_generation_result, android_generator,
+                    find_edit_base, build_edit_result, edit_preview_structure, remember_generation,
+                    start_background_workers, provider_router)
+from service_registry import ServiceRegistry
+from async_service import AsyncGeminiService, AsyncClientPool, run_blocking
+from request_coalescer import AsyncSingleFlight, CancelToken
+from response_cache import make_cache_key
+
+# Serve with an ASGI server, e.g. `uvicorn asgi:application`. /generate_app, /update_preview
+# and /test_api_key run on the event loop; every other route is the regular Flask app.
+
+client_pool = AsyncClientPool(max_connections=app.config['ASYNC_MAX_CONNECTIONS'],
+                              max_keepalive=app.config['HTTP_POOL_SIZE'],
+                              connect_timeout=app.config['HTTP_CONNECT_TIMEOUT'],
+                              read_timeout=app.config['HTTP_READ_TIMEOUT'])
+
+
+def create_async_ai_service():
+    """Build an async provider service sharing the sync clients' cache and rate limiter"""
+    return AsyncGeminiService(client_pool=client_pool, cache=response_cache, session_pool=session_pool,
+                              single_pass_images=app.config['IMAGE_SINGLE_PASS'],
+                              rate_limiter=rate_limiter, max_retries=app.config['PROVIDER_MAX_RETRIES'],
+                              pipeline_workers=app.config['PIPELINE_WORKERS'] if app.config['GENERATION_PIPELINE'] else 0,
+                              prompt_builder=prompt_builder)
+
+
+async_ai_services = ServiceRegistry(create_async_ai_service)
+
+
+def resolve_async_ai_service(config, provider=None):
+    """Async counterpart of routes.resolve_ai_service"""
+    if app.config['PROVIDER_ROUTING']:
+        return provider_router.for_config_async(config, async_ai_services, provider)
+    return async_ai_services.for_config(config, provider)
+
+
+# Supersession is tracked together with the sync endpoint; coalescing is per event loop
+async_preview_flights = AsyncSingleFlight()
+
+wsgi_application = WSGIMiddleware(app, workers=app.config['ASGI_WSGI_WORKERS'])
+
+
+class PayloadTooLarge(Exception):
+    pass
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+async def read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ClientDisconnected()
+        body.extend(message.get('body', b''))
+        if len(body) > app.config['MAX_CONTENT_LENGTH']:
+            raise PayloadTooLarge()
+        if not message.get('more_body'):
+            return bytes(body)
+
+
+def build_request(scope, body):
+    """Wrap an ASGI request in a werkzeug Request so forms parse exactly as in Flask"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value.decode('latin-1')
+        elif name != 'CONTENT_LENGTH':
+            environ[f'HTTP_{name}'] = value.decode('latin-1')
+    return Request(environ)
+
+
+def read_session_key(request):
+    """Return the browser session id from Flask's signed session cookie, if it has one"""
+    cookie = request.cookies.get(app.session_interface.get_cookie_name(app))
+    serializer = app.session_interface.get_signing_serializer(app)
+    if not cookie or serializer is None:
+        return None
+    try:
+        data = serializer.loads(cookie, max_age=int(app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return None
+    return data.get('client_id')
+
+
+async def edit_preview_async(ai_service, base, prompt):
+    """Run the blocking preview edit off the loop; cancelling the task aborts its provider call"""
+    cancel_token = CancelToken()
+    try:
+        return await run_blocking(edit_preview_structure, ai_service, base, prompt, cancel_token)
+    except asyncio.CancelledError:
+        cancel_token.cancel()
+        raise
+
+
+async def test_api_key(request):
+    """Test the configured API key with a simple call"""
+    try:
+        provider, api_key, current_ai_service = resolve_async_ai_service(config_store.load())
+        if not current_ai_service:
+            return {'success': False, 'message': f'No API key configured for {provider}'}
+
+        success, message = await current_ai_service.test_connection_async()
+
+        return {'success': success, 'message': message}
+    except Exception as e:
+        app.logger.error(f"Error testing API key: {str(e)}")
+        return {'success': False, 'message': f'Error testing API key: {str(e)}'}
+
+
+async def generate_app(request):
+    """Generate Android app based on prompt and optional image"""
+    try:
+        provider, api_key, current_ai_service = resolve_async_ai_service(config_store.load())
+        if not current_ai_service:
+            return {'success': False, 'message': f'No API key configured for {provider}'}
+
+        prompt = request.form.get('prompt', '').strip()
+        if not prompt:
+            return {'success': False, 'message': 'Prompt cannot be empty'}
+
+        uploaded_image = request.form.get('uploaded_image')
+        image_path = resolve_uploaded_image(uploaded_image)
+        edit = request.form.get('edit', '').lower() in ['1', 'true', 'yes']
+        session_key = read_session_key(request)
+
+        # Queue the work and return immediately when the client asks for a background job
+        if request.form.get('async', '').lower() in ['1', 'true', 'yes']:
+            job_id = job_queue.enqueue('generate_app', {
+                'prompt': prompt,
+                'image_path': image_path,
+                'provider': provider,
+                'session_key': session_key,
+                'edit': edit
+            }, provider=provider)
+            urls = app.url_map.bind_to_environ(request.environ)
+            return {
+                'success': True,
+                'message': 'Generation job queued',
+                'job_id': job_id,
+                'status_url': urls.build('job_status', {'job_id': job_id}),
+                'result_url': urls.build('job_result', {'job_id': job_id})
+            }, 202
+
+        result = None
+        base = find_edit_base(session_key, image_path) if edit else None
+        if base is not None:
+            # The edit is a single call followed by file writes, so it runs off the loop
+            result = await run_blocking(build_edit_result, current_ai_service, base, prompt)
+        if result is None:
+            app.logger.info(f"Generating app with provider: {provider}")
+            app_structure = await current_ai_service.generate_android_app_async(prompt, image_path)
+            result = await run_blocking(complete_generation_result, app_structure, None, prompt, provider)
+        remember_generation(session_key, prompt, image_path, result)
+        return result
+
+    except Exception as e:
+        app.logger.error(f"Error generating app: {str(e)}")
+        return {'success': False, 'message': f'Error generating app: {str(e)}'}
+
+
+async def update_preview(request):
+    """Update preview based on modified prompt"""
+    try:
+        provider, api_key, current_ai_service = resolve_async_ai_service(config_store.load())
+        if not current_ai_service:
+            return {'success': False, 'message': f'No API key configured for {provider}'}
+
+        prompt = request.form.get('prompt', '').strip()
+        if not prompt:
+            return {'success': False, 'message': 'Prompt cannot be empty'}
+
+        uploaded_image = request.form.get('uploaded_image')
+        image_path = resolve_uploaded_image(uploaded_image)
+
+        session_key = read_session_key(request)
+        base = None
+        if request.form.get('edit', '').lower() in ['1', 'true', 'yes']:
+            base = find_edit_base(session_key, image_path, require_project=False)
+
+        async def build_preview():
+            if base is not None:
+                app_structure = await async_preview_flights.do(
+                    make_cache_key('preview-edit', provider, current_ai_service.api_url, base['project_id'], prompt),
+                    lambda: edit_preview_async(current_ai_service, base, prompt))
+                if app_structure:
+                    return app_structure
+            return await async_preview_flights.do(
+                make_cache_key('preview', provider, current_ai_service.api_url, prompt, image_path),
+                lambda: current_ai_service.generate_android_app_async(prompt, image_path, preview_only=True))
+
+        preview = asyncio.ensure_future(build_preview())
+
+        # A newer preview from the same browser session cancels this one
+        cancel_token = preview_requests.begin(session_key) if session_key else None
+        if cancel_token is not None:
+            loop = asyncio.get_running_loop()
+            cancel_token.on_cancel(lambda: loop.call_soon_threadsafe(preview.cancel))
+        try:
+            app_structure = await preview
+        except asyncio.CancelledError:
+            if cancel_token is None or not cancel_token.cancelled:
+                raise
+            return {'success': False, 'superseded': True, 'message': 'Preview superseded by a newer request'}
+        finally:
+            if cancel_token is not None:
+                preview_requests.end(session_key, cancel_token)
+
+        if not app_structure:
+            return {'success': False, 'message': 'Failed to generate preview. Please check your API key and try a simpler prompt.'}
+
+        return {
+            'success': True,
+            'preview_html': android_generator.generate_preview_html(app_structure)
+        }
+
+    except Exception as e:
+        app.logger.error(f"Error updating preview: {str(e)}")
+        return {'success': False, 'message': f'Error updating preview: {str(e)}'}
+
+
+ASYNC_ROUTES = {
+    '/generate_app': generate_app,
+    '/update_preview': update_preview,
+    '/test_api_key': test_api_key,
+}
+
+
+async def send_json(send, payload, status=200):
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode('latin-1'))],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            start_background_workers()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await client_pool.aclose_all()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    handler = ASYNC_ROUTES.get(scope['path']) if scope['type'] == 'http' and scope['method'] == 'POST' else None
+    if handler is None:
+        return await wsgi_application(scope, receive, send)
+
+    try:
+        body = await read_body(receive)
+    except PayloadTooLarge:
+        return await send_json(send, {'success': False, 'message': 'Request body too large'}, 413)
+    except ClientDisconnected:
+        logging.info(f"Client disconnected before sending {scope['path']}")
+        return
+
+    result = await handler(build_request(scope, body))
+    payload, status = result if isinstance(result, tuple) else (result, 200)
+    await send_json(send, payload, status)
@@ -0,0 +1,250 @@
+import os
+import asyncio
+import logging
+import functools
+import httpx
+import google.generativeai as genai
+from gemini_service import GeminiService
+from provider_errors import is_rate_limit_error, raise_for_provider_status
+from rate_limiter import estimate_tokens
+from prompt_builder import as_messages, as_parts
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run blocking work (disk writes, image analysis) on the default thread pool"""
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+
+class AsyncClientPool:
+    """Process-wide httpx.AsyncClient per provider, the asyncio counterpart of SessionPool.
+
+    Clients belong to the event loop that first used them, so a pool serves a single loop
+    (one ASGI worker process).
+    """
+
+    def __init__(self, max_connections=200, max_keepalive=10, connect_timeout=5.0, read_timeout=120.0):
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._clients = {}
+
+    @property
+    def timeout(self):
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+    def get(self, provider):
+        """Return the shared client for a provider, creating it on first use"""
+        client = self._clients.get(provider)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_keepalive),
+                timeout=self.timeout)
+            self._clients[provider] = client
+            logging.debug(f"Created async HTTP client for {provider} (max={self.max_connections})")
+        return client
+
+    async def aclose_all(self):
+        """Close every client and drop its connections"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+
+class AsyncGeminiService(GeminiService):
+    """GeminiService whose provider calls are coroutines.
+
+    Prompt building, caching, parsing and fallbacks are inherited, so both variants return
+    the same structures; the synchronous methods keep working for existing callers.
+    """
+
+    def __init__(self, client_pool=None, **kwargs):
+        super().__init__(**kwargs)
+        self.client_pool = client_pool or AsyncClientPool()
+
+    @property
+    def aclient(self):
+        """Shared asyncio HTTP client for the configured provider"""
+        return self.client_pool.get(self.provider)
+
+    async def test_connection_async(self):
+        """Async variant of test_connection"""
+        try:
+            if self.provider == "gemini":
+                if not self.api_key:
+                    return False, "API key not set"
+                model = genai.GenerativeModel('gemini-1.5-flash')
+                response = await model.generate_content_async(
+                    "Hello, this is a test. Please respond with 'API connection successful.'")
+                if response.text and "API connection successful" in response.text:
+                    return True, "API connection successful"
+                elif response.text:
+                    return True, f"API connected. Response: {response.text[:100]}"
+                else:
+                    return False, "API response was empty"
+
+            elif self.provider == "ollama":
+                response = await self.aclient.get(f"{self.api_url}/api/tags")
+                if response.status_code == 200:
+                    return True, "Ollama connection successful"
+                else:
+                    return False, "Ollama server not responding"
+
+            elif self.provider == "groq":
+                headers = {"Authorization": f"Bearer {self.api_key}"}
+                data = {
+                    "messages": [{"role": "user", "content": "Hello, test connection"}],
+                    "model": "llama3-8b-8192"
+                }
+                response = await self.aclient.post(f"{self.api_url}/chat/completions", headers=headers, json=data)
+                if response.status_code == 200:
+                    return True, "Groq API connection successful"
+                else:
+                    return False, f"Groq API error: {response.status_code}"
+
+            elif self.provider == "huggingface":
+                headers = {"Authorization": f"Bearer {self.api_key}"}
+                response = await self.aclient.post(f"{self.api_url}/{self.get_model_name()}",
+                                                   headers=headers, json={"inputs": "Hello"})
+                if response.status_code == 200:
+                    return True, "Hugging Face API connection successful"
+                else:
+                    return False, f"Hugging Face API error: {response.status_code}"
+
+            return False, "Unknown provider"
+
+        except Exception as e:
+            return False, self.connection_error_message(e)
+
+    async def request_content_async(self, prompt, image_path=None, model_name=None, max_tokens=None):
+        """Async variant of request_content: rate limited, retried on 429, raises on failure"""
+        estimated = estimate_tokens(str(prompt), max_tokens)
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire_async(self.provider, self.api_key, estimated)
+            try:
+                text, tokens_used = await self._request_content_once_async(prompt, image_path, model_name, max_tokens)
+            except Exception as e:
+                if self.should_retry(e, attempt):
+                    continue
+                raise
+            if self.rate_limiter is not None:
+                self.rate_limiter.settle(self.provider, self.api_key, estimated, tokens_used)
+            return text
+
+    async def _request_content_once_async(self, prompt, image_path=None, model_name=None, max_tokens=None):
+        model_name = model_name or self.get_model_name()
+        if self.provider == "gemini":
+            model = genai.GenerativeModel(model_name)
+            generation_config = {"max_output_tokens": max_tokens} if max_tokens else None
+            if image_path and os.path.exists(image_path):
+                image_part = await run_blocking(self.load_image_part, image_path)
+                response = await model.generate_content_async(as_parts(prompt) + [image_part],
+                                                              generation_config=generation_config)
+            else:
+                response = await model.generate_content_async(as_parts(prompt), generation_config=generation_config)
+            usage = getattr(response, "usage_metadata", None)
+            return (response.text if response.text else None), getattr(usage, "total_token_count", None)
+
+        elif self.provider == "ollama":
+            data = {
+                "model": model_name,
+                "messages": as_messages(prompt),
+                "stream": False
+            }
+            if max_tokens:
+                data["options"] = {"num_predict": max_tokens}
+            response = await self.aclient.post(f"{self.api_url}/api/chat", json=data)
+            raise_for_provider_status("Ollama", response)
+            result = response.json()
+            tokens_used = result.get("prompt_eval_count", 0) + result.get("eval_count", 0)
+            return result.get("message", {}).get("content"), tokens_used or None
+
+        elif self.provider == "groq":
+            headers = {"Authorization": f"Bearer {self.api_key}"}
+            data = {
+                "messages": as_messages(prompt),
+                "model": model_name
+            }
+            if max_tokens:
+                data["max_tokens"] = max_tokens
+            response = await self.aclient.post(f"{self.api_url}/chat/completions", headers=headers, json=data)
+            raise_for_provider_status("Groq", response)
+            payload = response.json()
+            return payload["choices"][0]["message"]["content"], payload.get("usage", {}).get("total_tokens")
+
+        elif self.provider == "huggingface":
+            headers = {"Authorization": f"Bearer {self.api_key}"}
+            data = {"inputs": str(prompt)}
+            if max_tokens:
+                data["parameters"] = {"max_new_tokens": max_tokens}
+            response = await self.aclient.post(f"{self.api_url}/{model_name}", headers=headers, json=data)
+            raise_for_provider_status("Hugging Face", response)
+            result = response.json()
+            if isinstance(result, list) and len(result) > 0:
+                return result[0].get("generated_text", ""), None
+            return None, None
+
+        return None, None
+
+    async def generate_android_app_async(self, prompt, image_path=None, preview_only=False, use_fallback=True):
+        """Async variant of generate_android_app; cancel the awaiting task to abort the call"""
+        try:
+            if self.provider != "ollama" and not self.api_key:
+                return None
+
+            if self.pipeline is not None and not preview_only:
+                # The pipeline fans out on its own thread pool
+                return await run_blocking(self.generate_android_app, prompt, image_path, use_fallback=use_fallback)
+
+            # A separate image analysis call is still synchronous, so prepare off the loop
+            full_prompt, model_name, max_tokens = await run_blocking(
+                self.prepare_request, prompt, image_path, preview_only)
+
+            cache_key = self.get_cache_key(full_prompt, image_path, model_name)
+            if cache_key:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logging.info(f"Response cache hit for {self.provider} ({cache_key[:12]})")
+                    return cached
+
+            try:
+                response_text = await self.request_content_async(full_prompt, image_path, model_name=model_name,
+                                                                 max_tokens=max_tokens)
+            except Exception as e:
+                logging.error(f"Error generating content with {self.provider}: {str(e)}")
+                if use_fallback and not is_rate_limit_error(e):
+                    return None
+                raise
+
+            if not response_text:
+                return None
+
+            result = self.parse_generated_structure(response_text, preview_only)
+            app_structure = result.data
+            missing = result.missing_fields
+            if app_structure is not None and missing and not preview_only:
+                app_structure, missing = await self.complete_missing_fields_async(prompt, app_structure, missing,
+                                                                                  model_name=model_name)
+            if app_structure is not None and cache_key:
+                self.cache_if_complete(cache_key, app_structure, missing)
+            return app_structure
+
+        except Exception as e:
+            logging.error(f"Error generating Android app: {str(e)}")
+            if not use_fallback:
+                raise
+            return self.get_error_fallback(prompt, e)
+
+    async def complete_missing_fields_async(self, prompt, app_structure, fields, model_name=None):
+        """Async variant of complete_missing_fields"""
+        logging.info(f"Re-requesting {', '.join(fields)} from {self.provider}")
+        try:
+            response_text = await self.request_content_async(self.build_fields_prompt(prompt, app_structure, fields),
+                                                             model_name=model_name)
+        except Exception as e:
+            logging.error(f"Could not complete missing fields: {str(e)}")
+            return app_structure, list(fields)
+        return self.merge_fields(app_structure, fields, response_text)
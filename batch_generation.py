@@ -0,0 +1,220 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from project_tree import ProjectTree
+
+BATCH_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def normalize_prompt(prompt):
+    """Key under which identical prompts are generated once"""
+    return ' '.join(prompt.split())
+
+
+def project_folder_name(app_name, project_id):
+    """Folder of one project inside the batch ZIP"""
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', app_name or '').strip('-').lower() or 'app'
+    return f"{slug}-{project_id[:8]}"
+
+
+class ProviderSlots:
+    """Hands each call the provider with the fewest calls in flight, within per-provider limits.
+
+    providers is [(name, service)] in preference order, which breaks ties.
+    """
+
+    def __init__(self, providers, limits=None, default_limit=None):
+        self.providers = list(providers)
+        self.limits = limits or {}
+        self.default_limit = default_limit
+        self._in_flight = {name: 0 for name, _ in self.providers}
+        self._condition = threading.Condition()
+
+    def _has_room(self, name):
+        limit = self.limits.get(name, self.default_limit)
+        return not limit or self._in_flight[name] < limit
+
+    def acquire(self):
+        with self._condition:
+            while True:
+                free = [(self._in_flight[name], index) for index, (name, _) in enumerate(self.providers)
+                        if self._has_room(name)]
+                if free:
+                    name, service = self.providers[min(free)[1]]
+                    self._in_flight[name] += 1
+                    return name, service
+                self._condition.wait()
+
+    def release(self, name):
+        with self._condition:
+            self._in_flight[name] -= 1
+            self._condition.notify()
+
+
+class BatchGenerator:
+    """Generates many prompts as one batch.
+
+    Identical prompts (ignoring whitespace) are generated once and share a project.
+    Unique prompts run max_concurrency at a time, spread over every configured provider,
+    so a batch draws on all provider quotas at once; the shared rate limiter still keeps
+    each provider within its budget.
+    """
+
+    def __init__(self, generate, max_concurrency=4, provider_limits=None, default_limit=None):
+        # generate(service, prompt, image_path) returns a result dict like build_generation_result
+        self.generate = generate
+        self.max_concurrency = max_concurrency
+        self.provider_limits = provider_limits or {}
+        self.default_limit = default_limit
+
+    def run(self, prompts, providers, image_path=None, report_progress=None, max_concurrency=None):
+        """Generate every prompt and return the batch manifest"""
+        report_progress = report_progress or (lambda progress, message='': None)
+        started = time.time()
+        unique = OrderedDict()
+        for index, prompt in enumerate(prompts):
+            unique.setdefault(normalize_prompt(prompt), []).append(index)
+
+        slots = ProviderSlots(providers, self.provider_limits, self.default_limit)
+        finished = []
+        lock = threading.Lock()
+
+        def generate_one(prompt):
+            provider, service = slots.acquire()
+            try:
+                result = self.generate(service, prompt, image_path)
+            except Exception as e:
+                logging.error(f"Batch prompt failed with {provider}: {str(e)}")
+                result = {'success': False, 'message': f'Error generating app: {str(e)}'}
+            finally:
+                slots.release(provider)
+            with lock:
+                finished.append(prompt)
+                report_progress(len(finished) / len(unique), f'Generated {len(finished)} of {len(unique)} apps')
+            return provider, result
+
+        workers = max(1, min(max_concurrency or self.max_concurrency, len(unique)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch') as executor:
+            calls = {key: executor.submit(generate_one, prompts[indices[0]].strip())
+                     for key, indices in unique.items()}
+            results = {key: call.result() for key, call in calls.items()}
+
+        items = []
+        for index, prompt in enumerate(prompts):
+            key = normalize_prompt(prompt)
+            provider, result = results[key]
+            first = unique[key][0]
+            app_structure = result.get('app_structure') or {}
+            item = {
+                'index': index,
+                'prompt': prompt,
+                'success': bool(result.get('success')),
+                'message': result.get('message'),
+                'provider': provider,
+                'duplicate_of': first if first != index else None,
+            }
+            if item['success']:
+                item.update({
+                    'project_id': result['project_id'],
+                    'app_name': app_structure.get('app_name'),
+                    'package_name': app_structure.get('package_name'),
+                    'folder': project_folder_name(app_structure.get('app_name'), result['project_id']),
+                    'rate_limited': bool(app_structure.get('rate_limit_hit')),
+                })
+            items.append(item)
+
+        succeeded = sum(1 for key in unique if results[key][1].get('success'))
+        return {
+            'batch_id': uuid.uuid4().hex,
+            'created_at': started,
+            'seconds': round(time.time() - started, 3),
+            'image': os.path.basename(image_path) if image_path else None,
+            'total': len(prompts),
+            'unique': len(unique),
+            'succeeded': succeeded,
+            'failed': len(unique) - succeeded,
+            'items': items,
+        }
+
+
+def build_batch_tree(manifest, load_project):
+    """Combine every generated project of a batch into one tree, one folder per project"""
+    tree = ProjectTree()
+    seen = set()
+    for item in manifest['items']:
+        if not item['success'] or item['project_id'] in seen:
+            continue
+        seen.add(item['project_id'])
+        project = load_project(item['project_id'])
+        if project is None:
+            logging.warning(f"Project {item['project_id']} of batch {manifest['batch_id']} no longer exists")
+            continue
+        for path, entry in project.iter_files():
+            tree.add_entry(f"{item['folder']}/{path}", entry)
+    tree.add_file('manifest.json', json.dumps(manifest, indent=2))
+    return tree
+
+
+class BatchStore:
+    """Batch manifests as JSON files, one per batch"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(self.folder, exist_ok=True)
+
+    def path_for(self, batch_id):
+        return os.path.join(self.folder, f"{batch_id}.json")
+
+    def save(self, manifest):
+        path = self.path_for(manifest['batch_id'])
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, path)
+
+    def load(self, batch_id):
+        if not BATCH_ID_PATTERN.match(batch_id):
+            return None
+        try:
+            with open(self.path_for(batch_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate one Android project per prompt and bundle them in a ZIP')
+    parser.add_argument('prompts', help="text file with one prompt per line, or '-' for stdin")
+    parser.add_argument('--image', help='design reference image shared by every prompt')
+    parser.add_argument('--provider', help='preferred AI provider (default: the configured one)')
+    parser.add_argument('--concurrency', type=int, default=0, help='max concurrent generations (default: BATCH_CONCURRENCY)')
+    parser.add_argument('--output', default='batch.zip', help="where to write the multi-project ZIP ('' to skip)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    from app import app
+    from routes import run_batch, batch_store, project_sink
+    from zip_stream import iter_zip_tree
+
+    source = sys.stdin if args.prompts == '-' else open(args.prompts)
+    with source:
+        prompts = [line.strip() for line in source if line.strip()]
+
+    response = run_batch(prompts, args.image, args.provider, max_concurrency=args.concurrency or None)
+    if not response['success']:
+        sys.exit(response['message'])
+    manifest = response['manifest']
+    if args.output:
+        with open(args.output, 'wb') as f:
+            for chunk in iter_zip_tree(build_batch_tree(manifest, project_sink.load)):
+                f.write(chunk)
+    print(json.dumps(manifest, indent=2))
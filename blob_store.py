@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from project_tree import ProjectTree
+
+
+def _atomic_write(path, data):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+
+
+class BlobStore:
+    """Content-addressed file store: each distinct file body is kept once, named by its SHA-256.
+
+    Projects are manifests mapping relative paths to blob hashes, so files that are identical
+    across projects (Gradle boilerplate, common styles and colors) take no extra space.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.blobs_folder = os.path.join(root, 'blobs')
+        self.manifests_folder = os.path.join(root, 'manifests')
+        self._lock = threading.Lock()
+        os.makedirs(self.blobs_folder, exist_ok=True)
+        os.makedirs(self.manifests_folder, exist_ok=True)
+
+    def blob_path(self, digest):
+        return os.path.join(self.blobs_folder, digest[:2], digest[2:])
+
+    def manifest_path(self, project_id):
+        return os.path.join(self.manifests_folder, f"{project_id}.json")
+
+    def put(self, data):
+        """Store data if it is not already present and return its hash"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        with self._lock:
+            if os.path.exists(path):
+                # Refresh the mtime so a concurrent gc treats the blob as newly referenced
+                os.utime(path)
+                return digest
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _atomic_write(path, data)
+        return digest
+
+    def write_manifest(self, project_id, manifest):
+        _atomic_write(self.manifest_path(project_id), json.dumps(manifest, sort_keys=True).encode('utf-8'))
+
+    def read_manifest(self, project_id):
+        try:
+            with open(self.manifest_path(project_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def delete_manifest(self, project_id):
+        try:
+            os.unlink(self.manifest_path(project_id))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def project_ids(self):
+        return [name[:-len('.json')] for name in os.listdir(self.manifests_folder) if name.endswith('.json')]
+
+    def gc(self, grace_seconds=3600):
+        """Delete blobs no manifest references.
+
+        Blobs touched within grace_seconds are kept: their project's manifest may not be
+        written yet.
+        """
+        referenced = set()
+        for project_id in self.project_ids():
+            manifest = self.read_manifest(project_id)
+            if manifest:
+                referenced.update(entry['sha256'] for entry in manifest['files'].values())
+
+        cutoff = time.time() - grace_seconds
+        removed = 0
+        freed = 0
+        with self._lock:
+            for current, dirs, files in os.walk(self.blobs_folder):
+                for name in files:
+                    digest = os.path.basename(current) + name
+                    if digest in referenced:
+                        continue
+                    path = os.path.join(current, name)
+                    try:
+                        stat = os.stat(path)
+                        if stat.st_mtime > cutoff:
+                            continue
+                        os.unlink(path)
+                    except OSError:
+                        continue
+                    removed += 1
+                    freed += stat.st_size
+
+        logging.info(f"Blob store gc removed {removed} blobs ({freed} bytes)")
+        return {'removed': removed, 'freed_bytes': freed, 'referenced': len(referenced)}
+
+    def stats(self):
+        blobs = 0
+        size = 0
+        for current, dirs, files in os.walk(self.blobs_folder):
+            for name in files:
+                try:
+                    size += os.path.getsize(os.path.join(current, name))
+                    blobs += 1
+                except OSError:
+                    pass
+        return {'projects': len(self.project_ids()), 'blobs': blobs, 'size_bytes': size}
+
+
+class BlobStoreSink:
+    """Stores projects as manifests over a shared BlobStore"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def write(self, project_id, tree):
+        files = {}
+        for path, entry in tree.iter_files():
+            data = entry.read()
+            files[path] = {'sha256': self.store.put(data), 'mode': entry.mode & 0o777, 'size': len(data)}
+        self.store.write_manifest(project_id, {
+            'created_at': time.time(),
+            'directories': sorted(tree.directories),
+            'files': files,
+        })
+        return project_id
+
+    def update(self, project_id, tree, changed, removed):
+        # Unchanged files hash to blobs that already exist, so only changed contents are stored
+        return self.write(project_id, tree)
+
+    def load(self, project_id):
+        manifest = self.store.read_manifest(project_id)
+        if manifest is None:
+            return None
+        tree = ProjectTree()
+        for directory in manifest.get('directories', []):
+            tree.add_directory(directory)
+        for path, entry in manifest['files'].items():
+            tree.add_source(path, self.store.blob_path(entry['sha256']), mode=entry['mode'],
+                            mtime=manifest['created_at'])
+        return tree
+
+    def exists(self, project_id):
+        return os.path.exists(self.store.manifest_path(project_id))
+
+    def delete(self, project_id):
+        return self.store.delete_manifest(project_id)
+
+
+if __name__ == '__main__':
+    # python blob_store.py <root> [grace_seconds]: remove unreferenced blobs
+    logging.basicConfig(level=logging.INFO)
+    root = sys.argv[1] if len(sys.argv) > 1 else 'project_store'
+    grace = int(sys.argv[2]) if len(sys.argv) > 2 else 3600
+    print(json.dumps(BlobStore(root).gc(grace)))
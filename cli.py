@@ -0,0 +1,109 @@
+import os
+import sys
+import json
+import uuid
+import logging
+import argparse
+from android_generator import AndroidGenerator, DEFAULT_OUTPUT_DIR
+from config_store import ConfigStore
+from gemini_service import GeminiService
+from response_cache import ResponseCache
+from service_registry import get_provider_credentials, SUPPORTED_PROVIDERS, KEYLESS_PROVIDERS
+
+# Generate a project without the web app, e.g.
+#   python -m cli "A todo app with reminders" --output-dir projects
+#   python -m cli --prompt-file idea.txt --image mockup.png --provider groq --zip todo.zip
+# Credentials come from config.json or the GEMINI_API_KEY/GROQ_API_KEY/... environment variables.
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m cli', description='Generate an Android project from a prompt')
+    parser.add_argument('prompt', nargs='?', help='app description')
+    parser.add_argument('--prompt-file', help="read the app description from a file ('-' for stdin)")
+    parser.add_argument('--image', help='design reference image')
+    parser.add_argument('--provider', choices=SUPPORTED_PROVIDERS, help='AI provider (default: the configured one)')
+    parser.add_argument('--api-key', help='API key (default: from the config file or environment)')
+    parser.add_argument('--api-url', help='provider API URL, e.g. a remote Ollama server')
+    parser.add_argument('--config', default='config.json', help='config file with saved API keys')
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR, help='folder the project directory is written to')
+    parser.add_argument('--zip', help='write the project as a ZIP file instead of a directory')
+    parser.add_argument('--project-id', help='name of the project directory (default: a new UUID)')
+    parser.add_argument('--cache-dir', default='cache', help="provider response cache folder ('' to disable)")
+    parser.add_argument('--verbose', '-v', action='store_true', help='log progress')
+    args = parser.parse_args(argv)
+    if bool(args.prompt) == bool(args.prompt_file):
+        parser.error('give either a prompt or --prompt-file')
+    if args.image and not os.path.exists(args.image):
+        parser.error(f'image not found: {args.image}')
+    return args
+
+
+def read_prompt(args):
+    if not args.prompt_file:
+        return args.prompt.strip()
+    if args.prompt_file == '-':
+        return sys.stdin.read().strip()
+    with open(args.prompt_file) as f:
+        return f.read().strip()
+
+
+def create_service(args):
+    """Configure a provider client from the arguments, falling back to the config file"""
+    provider, api_key, api_url = get_provider_credentials(ConfigStore(args.config).load(), args.provider)
+    api_key = args.api_key or api_key
+    if not api_key and provider not in KEYLESS_PROVIDERS:
+        return provider, None
+
+    cache = None
+    if args.cache_dir:
+        cache = ResponseCache(db_path=os.path.join(args.cache_dir, 'responses.db'))
+    service = GeminiService(cache=cache)
+    service.set_api_key(api_key, provider=provider, api_url=args.api_url or api_url)
+    return provider, service
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    prompt = read_prompt(args)
+    if not prompt:
+        print('Prompt cannot be empty', file=sys.stderr)
+        return 2
+
+    provider, service = create_service(args)
+    if service is None:
+        print(f'No API key configured for {provider}', file=sys.stderr)
+        return 2
+
+    try:
+        app_structure = service.generate_android_app(prompt, args.image, use_fallback=False)
+    except Exception as e:
+        print(f'Error generating app: {str(e)}', file=sys.stderr)
+        return 1
+    if not app_structure:
+        print('Failed to generate Android app structure', file=sys.stderr)
+        return 1
+
+    generator = AndroidGenerator(output_dir=args.output_dir)
+    summary = {'app_name': app_structure.get('app_name'), 'package_name': app_structure.get('package_name'),
+               'provider': provider}
+    if args.zip:
+        with open(args.zip, 'wb') as f:
+            for chunk in generator.iter_project_zip(app_structure):
+                f.write(chunk)
+        summary['zip'] = args.zip
+    else:
+        project_id = args.project_id or str(uuid.uuid4())
+        path = generator.create_android_project(app_structure, project_id)
+        if path is None:
+            print('Error writing the project', file=sys.stderr)
+            return 1
+        summary.update({'project_id': project_id, 'path': path})
+
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
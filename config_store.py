@@ -0,0 +1,108 @@
+import os
+import copy
+import json
+import time
+import logging
+import tempfile
+import threading
+
+# Environment variables that take precedence over config.json, e.g. for secrets in containers
+ENV_OVERRIDES = {
+    'AI_PROVIDER': 'ai_provider',
+    'AI_API_URL': 'api_url',
+    'GEMINI_API_KEY': 'gemini_api_key',
+    'GROQ_API_KEY': 'groq_api_key',
+    'OLLAMA_API_KEY': 'ollama_api_key',
+    'HUGGINGFACE_API_KEY': 'huggingface_api_key',
+    'LLAMA_API_KEY': 'llama_api_key',
+}
+
+
+class ConfigStore:
+    """config.json parsed once and kept in memory.
+
+    The file is re-read only when its mtime, inode or size changes (checked at most every
+    check_interval seconds), and saves replace it atomically so readers never see a
+    half-written file.
+    """
+
+    def __init__(self, path, check_interval=1.0, env_overrides=ENV_OVERRIDES):
+        self.path = path
+        self.check_interval = check_interval
+        self.env_overrides = env_overrides
+        self._lock = threading.RLock()
+        self._config = {}
+        self._signature = None
+        self._checked_at = 0
+
+    def _stat_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._checked_at and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        signature = self._stat_signature()
+        if signature == self._signature:
+            return
+        if signature is None:
+            self._config = {}
+        else:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._config = json.load(f)
+            except (OSError, ValueError) as e:
+                # Keep serving the last good configuration until the file is fixed
+                logging.error(f"Could not reload {self.path}: {str(e)}")
+                return
+        self._signature = signature
+
+    def _env_values(self):
+        return {key: os.environ[name] for name, key in self.env_overrides.items() if os.environ.get(name)}
+
+    def load(self):
+        """Return a copy of the configuration with environment overrides applied"""
+        with self._lock:
+            self._refresh()
+            config = copy.deepcopy(self._config)
+        config.update(self._env_values())
+        return config
+
+    def save(self, config_data):
+        """Atomically replace the file; values that only came from the environment are not written"""
+        with self._lock:
+            self._refresh()
+            config_data = copy.deepcopy(config_data)
+            for key, value in self._env_values().items():
+                if config_data.get(key) == value:
+                    if key in self._config:
+                        config_data[key] = self._config[key]
+                    else:
+                        config_data.pop(key, None)
+
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.config-', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(config_data, f, indent=2)
+                os.replace(temp_path, self.path)
+            except Exception:
+                os.unlink(temp_path)
+                raise
+
+            self._config = config_data
+            self._signature = self._stat_signature()
+            self._checked_at = time.monotonic()
+
+    def update(self, changes):
+        """Apply changes to the current configuration and save, as one step"""
+        with self._lock:
+            config = self.load()
+            config.update(changes)
+            self.save(config)
+            return config
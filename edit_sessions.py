@@ -0,0 +1,73 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from sqlite_util import connect
+
+
+class EditSessionStore:
+    """Remembers the last app generated for each browser session so later prompt edits can patch it.
+
+    Kept in SQLite so every web worker process sees the same sessions; entries unused for
+    longer than ttl_seconds are dropped.
+    """
+
+    def __init__(self, db_path, ttl_seconds=24 * 3600):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._last_prune = 0
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        with connect(self.db_path, row_factory=sqlite3.Row) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS edit_sessions (
+                session_key TEXT PRIMARY KEY,
+                project_id TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                image_path TEXT,
+                app_structure TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+
+    def get(self, session_key):
+        """Return {project_id, prompt, image_path, app_structure} for a session, or None"""
+        if not session_key:
+            return None
+        with connect(self.db_path, row_factory=sqlite3.Row) as conn:
+            row = conn.execute("SELECT * FROM edit_sessions WHERE session_key = ? AND updated_at >= ?",
+                               (session_key, time.time() - self.ttl_seconds)).fetchone()
+        if row is None:
+            return None
+        return {
+            'project_id': row['project_id'],
+            'prompt': row['prompt'],
+            'image_path': row['image_path'],
+            'app_structure': json.loads(row['app_structure']),
+        }
+
+    def save(self, session_key, project_id, prompt, image_path, app_structure):
+        if not session_key:
+            return
+        now = time.time()
+        with connect(self.db_path, row_factory=sqlite3.Row) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO edit_sessions (session_key, project_id, prompt, image_path, app_structure, "
+                "updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (session_key, project_id, prompt, image_path, json.dumps(app_structure), now))
+        with self._lock:
+            prune = now - self._last_prune > 3600
+            if prune:
+                self._last_prune = now
+        if prune:
+            self.prune()
+
+    def forget(self, session_key):
+        with connect(self.db_path, row_factory=sqlite3.Row) as conn:
+            conn.execute("DELETE FROM edit_sessions WHERE session_key = ?", (session_key,))
+
+    def prune(self):
+        """Drop sessions older than the TTL"""
+        with connect(self.db_path, row_factory=sqlite3.Row) as conn:
+            return conn.execute("DELETE FROM edit_sessions WHERE updated_at < ?",
+                                (time.time() - self.ttl_seconds,)).rowcount
@@ -2,14 +2,91 @@ import google.generativeai as genai
 import os
 import logging
 import json
-import requests
+import hashlib
+import threading
 from PIL import Image
+from response_cache import make_cache_key
+from http_pool import default_session_pool, abort_response
+from stream_json import IncrementalJSONParser, MalformedStreamError
+from image_processing import guess_mime_type
+from provider_errors import is_rate_limit_error, raise_for_provider_status
+from rate_limiter import RateLimitExceeded, estimate_tokens
+from generation_pipeline import GenerationPipeline
+from prompt_builder import PromptBuilder, INLINE_IMAGE_REFERENCE, as_messages, as_parts
+from response_parser import (ParseResult, parse_response, validate, APP_STRUCTURE_SCHEMA, APP_STRUCTURE_OPTIONAL,
+                             APP_STRUCTURE_EXAMPLE, PREVIEW_SCHEMA)
+
+# Generation model used for each provider
+DEFAULT_MODELS = {
+    "gemini": "gemini-1.5-pro",
+    "ollama": "llama3.2",
+    "groq": "llama3-8b-8192",
+    "huggingface": "microsoft/DialoGPT-medium",
+}
+
+# Faster models used for the preview-only prompt
+PREVIEW_MODELS = {
+    "gemini": "gemini-1.5-flash",
+    "ollama": "llama3.2",
+    "groq": "llama3-8b-8192",
+    "huggingface": "microsoft/DialoGPT-medium",
+}
+
+# Vision model and instruction used when an image is described in a separate call
+ANALYSIS_MODEL = "gemini-1.5-pro"
+ANALYSIS_PROMPT = "Analyze this image and describe what kind of mobile app UI design it represents. Focus on layout, colors, components, and user interface elements that could be implemented in an Android app."
+
+# Output token cap for preview responses (only a handful of short fields)
+PREVIEW_MAX_TOKENS = 600
+
+# Fields the preview renders; a preview edit only sends and patches these
+PREVIEW_FIELDS = ("app_name", "primary_color", "accent_color", "ui_components")
+
+# Array members reported element by element while a response streams in
+STREAMED_ITEM_KEYS = ("additional_activities", "ui_components")
+
+# genai.configure is process-wide; remember which key it holds so shared clients only reconfigure on change
+_configured_gemini_key = None
+_configure_lock = threading.Lock()
+
+def configure_gemini(api_key):
+    global _configured_gemini_key
+    with _configure_lock:
+        if api_key != _configured_gemini_key:
+            genai.configure(api_key=api_key)
+            _configured_gemini_key = api_key
 
 class GeminiService:
-    def __init__(self):
+    def __init__(self, cache=None, session_pool=None, single_pass_images=True, rate_limiter=None, max_retries=2,
+                 pipeline_workers=0, prompt_builder=None):
         self.api_key = None
         self.provider = "gemini"  # Default provider
         self.api_url = None
+        self.cache = cache  # Optional ResponseCache shared across requests
+        self.session_pool = session_pool or default_session_pool
+        # Send the image once with the generation request instead of analysing it separately first
+        self.single_pass_images = single_pass_images
+        # Optional RateLimiter shared by every client; calls wait for budget and back off on 429
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        # Keeps the static instructions as a stable prefix and fits prompts to the input budget
+        self.prompt_builder = prompt_builder or PromptBuilder()
+        # Full generations run as a plan plus concurrent per-part calls when enabled
+        self.pipeline = GenerationPipeline(self, pipeline_workers) if pipeline_workers else None
+
+    @property
+    def http(self):
+        """Pooled keep-alive session for the configured provider"""
+        return self.session_pool.get(self.provider)
+
+    @property
+    def timeout(self):
+        return self.session_pool.timeout
+
+    def get_model_name(self, preview_only=False):
+        """Return the generation model name for the configured provider"""
+        models = PREVIEW_MODELS if preview_only else DEFAULT_MODELS
+        return models.get(self.provider, models["gemini"])
 
     def set_api_key(self, api_key, provider="gemini", api_url=None):
         """Set the API key and configure the client for different providers"""
@@ -19,7 +96,7 @@ class GeminiService:
             self.api_url = api_url
 
             if self.provider == "gemini":
-                genai.configure(api_key=api_key)
+                configure_gemini(api_key)
             elif self.provider == "ollama":
                 # Ollama runs locally, no API key needed
                 self.api_url = api_url or "http://localhost:11434"
@@ -36,6 +113,11 @@ class GeminiService:
             logging.error(f"Error setting API key: {str(e)}")
             return False
 
+    def activate(self):
+        """Point process-wide SDK state at this client's credentials before it is used"""
+        if self.provider == "gemini" and self.api_key:
+            configure_gemini(self.api_key)
+
     def test_connection(self):
         """Test the API connection with a simple call"""
         try:
@@ -52,7 +134,7 @@ class GeminiService:
                     return False, "API response was empty"
 
             elif self.provider == "ollama":
-                response = requests.get(f"{self.api_url}/api/tags")
+                response = self.http.get(f"{self.api_url}/api/tags", timeout=self.timeout)
                 if response.status_code == 200:
                     return True, "Ollama connection successful"
                 else:
@@ -64,7 +146,8 @@ class GeminiService:
                     "messages": [{"role": "user", "content": "Hello, test connection"}],
                     "model": "llama3-8b-8192"
                 }
-                response = requests.post(f"{self.api_url}/chat/completions", headers=headers, json=data)
+                response = self.http.post(f"{self.api_url}/chat/completions", headers=headers, json=data,
+                                          timeout=self.timeout)
                 if response.status_code == 200:
                     return True, "Groq API connection successful"
                 else:
@@ -72,9 +155,10 @@ class GeminiService:
 
             elif self.provider == "huggingface":
                 headers = {"Authorization": f"Bearer {self.api_key}"}
-                response = requests.post(f"{self.api_url}/microsoft/DialoGPT-medium", 
-                                       headers=headers, 
-                                       json={"inputs": "Hello"})
+                response = self.http.post(f"{self.api_url}/{self.get_model_name()}",
+                                          headers=headers,
+                                          json={"inputs": "Hello"},
+                                          timeout=self.timeout)
                 if response.status_code == 200:
                     return True, "Hugging Face API connection successful"
                 else:
@@ -83,212 +167,588 @@ class GeminiService:
             return False, "Unknown provider"
 
         except Exception as e:
-            error_msg = str(e)
-            logging.error(f"Error testing API connection: {error_msg}")
+            return False, self.connection_error_message(e)
 
-            # Check for rate limit errors
-            if any(keyword in error_msg.lower() for keyword in ['rate limit', 'quota', 'limit exceeded', '429']):
-                return False, f"{self.provider.title()} API rate limit exceeded. Please wait or upgrade your plan. Details: {error_msg}"
-            else:
-                return False, f"API connection failed: {error_msg}"
+    def connection_error_message(self, error):
+        """Explain a failed connection test, calling out rate limits"""
+        error_msg = str(error)
+        logging.error(f"Error testing API connection: {error_msg}")
 
-    def generate_content(self, prompt, image_path=None):
+        # Check for rate limit errors
+        if any(keyword in error_msg.lower() for keyword in ['rate limit', 'quota', 'limit exceeded', '429']):
+            return f"{self.provider.title()} API rate limit exceeded. Please wait or upgrade your plan. Details: {error_msg}"
+        else:
+            return f"API connection failed: {error_msg}"
+
+    def generate_content(self, prompt, image_path=None, model_name=None, max_tokens=None):
         """Generate content using the configured AI provider"""
         try:
-            if self.provider == "gemini":
-                model = genai.GenerativeModel('gemini-1.5-pro')
-                if image_path and os.path.exists(image_path):
-                    with open(image_path, "rb") as f:
-                        image_data = f.read()
-                    image_part = {"mime_type": "image/jpeg", "data": image_data}
-                    response = model.generate_content([prompt, image_part])
-                else:
-                    response = model.generate_content(prompt)
-                return response.text if response.text else None
-
-            elif self.provider == "ollama":
-                data = {
-                    "model": "llama3.2",  # Default Llama model
-                    "prompt": prompt,
-                    "stream": False
-                }
-                response = requests.post(f"{self.api_url}/api/generate", json=data)
-                if response.status_code == 200:
-                    return response.json().get("response")
-                return None
-
-            elif self.provider == "groq":
-                headers = {"Authorization": f"Bearer {self.api_key}"}
-                data = {
-                    "messages": [{"role": "user", "content": prompt}],
-                    "model": "llama3-8b-8192"
-                }
-                logging.info(f"Sending request to Groq API for Android generation")
-                response = requests.post(f"{self.api_url}/chat/completions", headers=headers, json=data)
-                if response.status_code == 200:
-                    result = response.json()["choices"][0]["message"]["content"]
-                    logging.info(f"Groq API response received, length: {len(result) if result else 0}")
-                    return result
-                else:
-                    logging.error(f"Groq API error: {response.status_code}, {response.text}")
-                return None
-
-            elif self.provider == "huggingface":
-                headers = {"Authorization": f"Bearer {self.api_key}"}
-                data = {"inputs": prompt}
-                response = requests.post(f"{self.api_url}/microsoft/DialoGPT-medium", 
-                                       headers=headers, json=data)
-                if response.status_code == 200:
-                    result = response.json()
-                    if isinstance(result, list) and len(result) > 0:
-                        return result[0].get("generated_text", "")
-                return None
-
-            return None
+            return self.request_content(prompt, image_path, model_name=model_name, max_tokens=max_tokens)
         except Exception as e:
             logging.error(f"Error generating content with {self.provider}: {str(e)}")
+            if is_rate_limit_error(e):
+                # Let callers report throttling instead of a generic failure
+                raise
             return None
 
+    def admit(self, estimated_tokens):
+        """Wait for rate-limit budget, or raise RateLimitExceeded without calling the provider"""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(self.provider, self.api_key, estimated_tokens)
+
+    def should_retry(self, error, attempt):
+        """Back off and report whether a failed call should be retried"""
+        if self.rate_limiter is None or attempt >= self.max_retries:
+            return False
+        if isinstance(error, RateLimitExceeded) or not is_rate_limit_error(error):
+            return False
+        self.rate_limiter.backoff(self.provider, self.api_key, attempt, getattr(error, 'retry_after', None))
+        return True
+
+    def request_content(self, prompt, image_path=None, model_name=None, max_tokens=None):
+        """Like generate_content, but raises ProviderError instead of returning None on failure"""
+        estimated = estimate_tokens(str(prompt), max_tokens)
+        for attempt in range(self.max_retries + 1):
+            self.admit(estimated)
+            try:
+                text, tokens_used = self._request_content_once(prompt, image_path, model_name, max_tokens)
+            except Exception as e:
+                if self.should_retry(e, attempt):
+                    continue
+                raise
+            if self.rate_limiter is not None:
+                self.rate_limiter.settle(self.provider, self.api_key, estimated, tokens_used)
+            return text
+
+    def _request_content_once(self, prompt, image_path=None, model_name=None, max_tokens=None):
+        """Make one provider call; returns (text, tokens used or None if not reported)"""
+        model_name = model_name or self.get_model_name()
+        if self.provider == "gemini":
+            model = genai.GenerativeModel(model_name)
+            generation_config = {"max_output_tokens": max_tokens} if max_tokens else None
+            if image_path and os.path.exists(image_path):
+                image_part = self.load_image_part(image_path)
+                response = model.generate_content(as_parts(prompt) + [image_part], generation_config=generation_config)
+            else:
+                response = model.generate_content(as_parts(prompt), generation_config=generation_config)
+            usage = getattr(response, "usage_metadata", None)
+            return (response.text if response.text else None), getattr(usage, "total_token_count", None)
+
+        elif self.provider == "ollama":
+            # Chat API so the instructions are a system message Ollama can keep cached
+            data = {
+                "model": model_name,
+                "messages": as_messages(prompt),
+                "stream": False
+            }
+            if max_tokens:
+                data["options"] = {"num_predict": max_tokens}
+            response = self.http.post(f"{self.api_url}/api/chat", json=data, timeout=self.timeout)
+            raise_for_provider_status("Ollama", response)
+            result = response.json()
+            tokens_used = result.get("prompt_eval_count", 0) + result.get("eval_count", 0)
+            return result.get("message", {}).get("content"), tokens_used or None
+
+        elif self.provider == "groq":
+            headers = {"Authorization": f"Bearer {self.api_key}"}
+            data = {
+                "messages": as_messages(prompt),
+                "model": model_name
+            }
+            if max_tokens:
+                data["max_tokens"] = max_tokens
+            logging.info(f"Sending request to Groq API for Android generation")
+            response = self.http.post(f"{self.api_url}/chat/completions", headers=headers, json=data,
+                                      timeout=self.timeout)
+            raise_for_provider_status("Groq", response)
+            payload = response.json()
+            result = payload["choices"][0]["message"]["content"]
+            logging.info(f"Groq API response received, length: {len(result) if result else 0}")
+            return result, payload.get("usage", {}).get("total_tokens")
+
+        elif self.provider == "huggingface":
+            headers = {"Authorization": f"Bearer {self.api_key}"}
+            data = {"inputs": str(prompt)}
+            if max_tokens:
+                data["parameters"] = {"max_new_tokens": max_tokens}
+            response = self.http.post(f"{self.api_url}/{model_name}",
+                                      headers=headers, json=data, timeout=self.timeout)
+            raise_for_provider_status("Hugging Face", response)
+            result = response.json()
+            if isinstance(result, list) and len(result) > 0:
+                return result[0].get("generated_text", ""), None
+            return None, None
+
+        return None, None
+
+    def generate_content_stream(self, prompt, image_path=None, model_name=None, max_tokens=None, cancel_token=None):
+        """Yield generated text chunks as the provider streams them.
+
+        Closing the generator closes the underlying HTTP response, which aborts the call;
+        so does cancelling cancel_token, even while waiting for a stalled chunk.
+        A rate-limited call is retried only if nothing has been yielded yet.
+        """
+        estimated = estimate_tokens(str(prompt), max_tokens)
+        for attempt in range(self.max_retries + 1):
+            self.admit(estimated)
+            chunks = self._stream_content_once(prompt, image_path, model_name, max_tokens, cancel_token)
+            started = False
+            try:
+                for chunk in chunks:
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                cancelled = cancel_token is not None and cancel_token.cancelled
+                if not started and not cancelled and self.should_retry(e, attempt):
+                    continue
+                raise
+            finally:
+                chunks.close()
+
+    def _stream_content_once(self, prompt, image_path=None, model_name=None, max_tokens=None, cancel_token=None):
+        model_name = model_name or self.get_model_name()
+        if self.provider == "gemini":
+            model = genai.GenerativeModel(model_name)
+            generation_config = {"max_output_tokens": max_tokens} if max_tokens else None
+            if image_path and os.path.exists(image_path):
+                image_part = self.load_image_part(image_path)
+                response = model.generate_content(as_parts(prompt) + [image_part],
+                                                  generation_config=generation_config, stream=True)
+            else:
+                response = model.generate_content(as_parts(prompt), generation_config=generation_config, stream=True)
+            # The SDK streams over a gRPC call; cancelling it unblocks a pending read
+            stream_call = getattr(response, '_iterator', None)
+            if cancel_token is not None and hasattr(stream_call, 'cancel'):
+                cancel_token.on_cancel(stream_call.cancel)
+            for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+
+        elif self.provider == "ollama":
+            data = {
+                "model": model_name,
+                "messages": as_messages(prompt),
+                "stream": True
+            }
+            if max_tokens:
+                data["options"] = {"num_predict": max_tokens}
+            with self.http.post(f"{self.api_url}/api/chat", json=data, stream=True,
+                                timeout=self.timeout) as response:
+                if cancel_token is not None:
+                    cancel_token.on_cancel(lambda: abort_response(response))
+                raise_for_provider_status("Ollama", response)
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    message = json.loads(line)
+                    content = message.get("message", {}).get("content")
+                    if content:
+                        yield content
+                    if message.get("done"):
+                        break
+
+        elif self.provider == "groq":
+            headers = {"Authorization": f"Bearer {self.api_key}"}
+            data = {
+                "messages": as_messages(prompt),
+                "model": model_name,
+                "stream": True
+            }
+            if max_tokens:
+                data["max_tokens"] = max_tokens
+            with self.http.post(f"{self.api_url}/chat/completions", headers=headers, json=data,
+                                stream=True, timeout=self.timeout) as response:
+                if cancel_token is not None:
+                    cancel_token.on_cancel(lambda: abort_response(response))
+                raise_for_provider_status("Groq", response)
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    payload = line[len("data:"):].strip()
+                    if payload == "[DONE]":
+                        break
+                    delta = json.loads(payload)["choices"][0].get("delta", {})
+                    if delta.get("content"):
+                        yield delta["content"]
+
+        else:
+            # No streaming API for this provider; deliver the whole response as one chunk
+            text, _ = self._request_content_once(prompt, image_path, model_name, max_tokens)
+            if text:
+                yield text
+
+    def load_image_part(self, image_path):
+        """Read an image file into a Gemini content part labelled with its actual MIME type"""
+        with open(image_path, "rb") as f:
+            image_data = f.read()
+        return {"mime_type": guess_mime_type(image_path), "data": image_data}
+
     def analyze_image(self, image_path):
         """Analyze uploaded image for GUI design insights"""
         try:
             if not self.api_key:
                 return None
 
-            model = genai.GenerativeModel('gemini-1.5-pro')
+            # Load the image with its real MIME type
+            image_part = self.load_image_part(image_path)
 
-            # Load and prepare the image
-            with open(image_path, "rb") as f:
-                image_data = f.read()
+            # Users iterate on the prompt far more than on the image, so reuse earlier analyses
+            cache_key = None
+            if self.cache is not None:
+                image_hash = hashlib.sha256(image_part["data"]).hexdigest()
+                cache_key = make_cache_key("image_analysis", ANALYSIS_MODEL, ANALYSIS_PROMPT, image_hash)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logging.info(f"Image analysis cache hit ({image_hash[:12]})")
+                    return cached
 
-            # Create the image part
-            image_part = {
-                "mime_type": "image/jpeg",
-                "data": image_data
-            }
-
-            prompt = "Analyze this image and describe what kind of mobile app UI design it represents. Focus on layout, colors, components, and user interface elements that could be implemented in an Android app."
+            model = genai.GenerativeModel(ANALYSIS_MODEL)
+            response = model.generate_content([ANALYSIS_PROMPT, image_part])
+            if not response.text:
+                return "Could not analyze image"
 
-            response = model.generate_content([prompt, image_part])
-            return response.text if response.text else "Could not analyze image"
+            if cache_key:
+                self.cache.set(cache_key, response.text)
+            return response.text
 
         except Exception as e:
             logging.error(f"Error analyzing image: {str(e)}")
             return None
 
-    def generate_android_app(self, prompt, image_path=None, preview_only=False):
-        """Generate Android app structure based on prompt and optional image"""
+    def sends_image_inline(self):
+        """Whether the generation call itself carries the image (vision-capable provider)"""
+        return self.single_pass_images and self.provider == "gemini"
+
+    def describe_image(self, image_path=None):
+        """Return the GUI design reference for an image: a note that it is attached, its analysis, or None"""
+        if image_path and os.path.exists(image_path):
+            if self.sends_image_inline():
+                # The image travels with the generation request, so skip the separate vision call
+                return INLINE_IMAGE_REFERENCE
+            return self.analyze_image(image_path)
+        return None
+
+    def build_preview_prompt(self, prompt, image_path=None):
+        """Build the compact prompt that only asks for the fields the preview renders"""
+        return self.prompt_builder.preview_prompt(self.provider, prompt, self.describe_image(image_path))
+
+    def build_app_prompt(self, prompt, image_path=None):
+        """Build the full generation prompt, including image analysis when available"""
+        return self.prompt_builder.app_prompt(self.provider, prompt, self.describe_image(image_path))
+
+    def collect_content_stream(self, prompt, image_path, cancel_token, model_name=None, max_tokens=None):
+        """Stream a response to completion, aborting the provider call if the token is cancelled"""
+        parts = []
+        chunks = self.generate_content_stream(prompt, image_path, model_name=model_name, max_tokens=max_tokens,
+                                              cancel_token=cancel_token)
+        try:
+            for chunk in chunks:
+                if cancel_token.cancelled:
+                    break
+                parts.append(chunk)
+        except Exception:
+            # Cancelling closes the response under the reader, which surfaces as a read error
+            if not cancel_token.cancelled:
+                raise
+        finally:
+            chunks.close()
+        if cancel_token.cancelled:
+            logging.info(f"Cancelled in-flight {self.provider} request")
+            return None
+        return ''.join(parts)
+
+    def generate_android_app(self, prompt, image_path=None, preview_only=False, cancel_token=None,
+                             use_fallback=True):
+        """Generate Android app structure based on prompt and optional image.
+
+        With use_fallback=False provider errors are raised instead of being replaced by the
+        placeholder structure, so a caller such as the provider router can fail over.
+        """
         try:
             if self.provider != "ollama" and not self.api_key:
                 return None
 
-            # Add image analysis if provided
-            image_analysis = ""
-            if image_path and os.path.exists(image_path):
-                image_analysis = self.analyze_image(image_path)
-                if image_analysis:
-                    prompt = f"GUI Design Reference: {image_analysis}\n\nUser Requirements: {prompt}"
-                else:
-                    prompt = f"User Requirements: {prompt}"
+            if self.pipeline is not None and not preview_only:
+                app_structure = self.generate_with_pipeline(prompt, image_path, cancel_token)
+                if app_structure is not None or (cancel_token is not None and cancel_token.cancelled):
+                    return app_structure
+                logging.warning(f"Pipeline generation with {self.provider} failed; retrying as a single call")
+
+            full_prompt, model_name, max_tokens = self.prepare_request(prompt, image_path, preview_only)
+
+            cache_key = self.get_cache_key(full_prompt, image_path, model_name)
+            if cache_key:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logging.info(f"Response cache hit for {self.provider} ({cache_key[:12]})")
+                    return cached
+
+            if cancel_token is not None:
+                # Stream so a superseded request can drop the connection mid-response
+                response_text = self.collect_content_stream(full_prompt, image_path, cancel_token,
+                                                            model_name=model_name, max_tokens=max_tokens)
             else:
-                prompt = f"User Requirements: {prompt}"
-
-            # Create the main prompt
-            full_prompt = f"""You are an expert Android app developer. Generate a complete Android app structure based on the user's requirements.
-
-{prompt}
-
-Return your response as valid JSON with the following structure:
-{{
-  "app_name": "App Name",
-  "package_name": "com.example.appname",
-  "description": "Brief description of the app",
-  "main_activity": {{
-    "name": "MainActivity",
-    "layout": "activity_main",
-    "java_code": "Complete Java code for MainActivity",
-    "xml_layout": "Complete XML layout code"
-  }},
-  "additional_activities": [
-    {{
-      "name": "ActivityName",
-      "layout": "layout_name",
-      "java_code": "Complete Java code",
-      "xml_layout": "Complete XML layout code"
-    }}
-  ],
-  "styles": "Complete styles.xml content",
-  "colors": "Complete colors.xml content",
-  "strings": "Complete strings.xml content",
-  "manifest": "Complete AndroidManifest.xml content",
-  "gradle": "Complete build.gradle content",
-  "ui_components": [
-    {{
-      "type": "Button|TextView|ImageView|etc",
-      "id": "component_id",
-      "text": "display text",
-      "properties": {{}}
-    }}
-  ]
-}}
-
-Make sure all code is complete, functional, and follows Android development best practices. Return only the JSON, no other text."""
-
-            response_text = self.generate_content(full_prompt, image_path)
+                generate = self.generate_content if use_fallback else self.request_content
+                response_text = generate(full_prompt, image_path, model_name=model_name, max_tokens=max_tokens)
 
             if not response_text:
                 return None
 
-            # Parse the JSON response
-            try:
-                # Clean the response text
-                text = response_text.strip()
-
-                # Check if response starts with HTML (error page)
-                if text.startswith('<'):
-                    logging.error(f"Received HTML response instead of JSON: {text[:200]}")
-                    return None
-
-                # Try direct JSON parsing first
-                app_structure = json.loads(text)
-                return app_structure
-
-            except json.JSONDecodeError as e:
-                logging.error(f"JSON decode error: {str(e)}")
-                # Try to extract JSON from the response
-                text = response_text.strip() # Use response_text here, not response
-                start = text.find('{')
-                end = text.rfind('}') + 1
-
-                if start >= 0 and end > start:
-                    try:
-                        json_part = text[start:end]
-                        app_structure = json.loads(json_part)
-                        return app_structure
-                    except json.JSONDecodeError as inner_e:
-                        logging.error(f"Failed to parse extracted JSON: {str(inner_e)}")
-                        logging.error(f"Raw response: {text[:500]}")
-                        return None
-                else:
-                    logging.error("Could not find JSON structure in response")
-                    logging.error(f"Raw response: {text[:500]}")
-                    return None
+            result = self.parse_generated_structure(response_text, preview_only)
+            app_structure = result.data
+            missing = result.missing_fields
+            if app_structure is not None and missing and not preview_only:
+                app_structure, missing = self.complete_missing_fields(prompt, app_structure, missing,
+                                                                      model_name=model_name)
+            if app_structure is not None and cache_key:
+                self.cache_if_complete(cache_key, app_structure, missing)
+            return app_structure
 
         except Exception as e:
             error_msg = str(e)
             logging.error(f"Error generating Android app: {error_msg}")
+            if not use_fallback:
+                raise
+            return self.get_error_fallback(prompt, e)
+
+    def generate_with_pipeline(self, prompt, image_path=None, cancel_token=None):
+        """Generate through the plan-and-fan-out pipeline, caching the merged structure.
+
+        Returns None if a part failed or came back incomplete (or the call was cancelled);
+        rate-limit errors are raised so they are not retried straight away as a single call.
+        """
+        cache_key = self.get_cache_key(f"pipeline\n{prompt}", image_path)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logging.info(f"Response cache hit for {self.provider} pipeline ({cache_key[:12]})")
+                return cached
 
-            # Check for rate limit errors and log them specifically
-            if any(keyword in error_msg.lower() for keyword in ['rate limit', 'quota', 'limit exceeded', '429']):
-                logging.warning(f"Gemini API rate limit hit: {error_msg}")
-                # Still return fallback but with rate limit context
-                fallback = self.get_fallback_app_structure(prompt)
-                fallback['rate_limit_hit'] = True
-                fallback['error_message'] = f"API rate limit exceeded: {error_msg}"
-                return fallback
-
-            # Always return a fallback structure when API fails
-            return self.get_fallback_app_structure(prompt)
+        try:
+            app_structure = self.pipeline.run(prompt, image_path, cancel_token)
+        except Exception as e:
+            logging.error(f"Error generating content with {self.provider}: {str(e)}")
+            if is_rate_limit_error(e):
+                raise
+            return None
+        if app_structure is None:
+            return None
+
+        missing = validate(app_structure, APP_STRUCTURE_SCHEMA, APP_STRUCTURE_OPTIONAL)
+        missing += [f"additional_activities.{activity['name']}" for activity in app_structure['additional_activities']
+                    if not activity['java_code'] or not activity['xml_layout']]
+        if missing:
+            logging.warning(f"Pipeline result from {self.provider} is incomplete: {', '.join(missing)}")
+            return None
+        if cache_key:
+            self.cache.set(cache_key, app_structure)
+        return app_structure
+
+    def prepare_request(self, prompt, image_path=None, preview_only=False):
+        """Return (full_prompt, model_name, max_tokens) for a generation or preview call"""
+        if preview_only:
+            # Preview only needs app_name, colors and ui_components, so use a compact
+            # prompt, a faster model and a small output budget
+            return (self.build_preview_prompt(prompt, image_path), self.get_model_name(preview_only=True),
+                    PREVIEW_MAX_TOKENS)
+        return self.build_app_prompt(prompt, image_path), self.get_model_name(), None
+
+    def get_error_fallback(self, prompt, error):
+        """Placeholder structure returned when generation failed, flagged if it was rate limited"""
+        # Check for rate limit errors and log them specifically
+        if is_rate_limit_error(error):
+            logging.warning(f"Gemini API rate limit hit: {str(error)}")
+            # Still return fallback but with rate limit context
+            fallback = self.get_fallback_app_structure(prompt)
+            fallback['rate_limit_hit'] = True
+            fallback['error_message'] = f"API rate limit exceeded: {str(error)}"
+            return fallback
+
+        # Always return a fallback structure when API fails
+        return self.get_fallback_app_structure(prompt)
+
+    def stream_android_app(self, prompt, image_path=None):
+        """Generate an app structure while yielding partial results as they arrive.
+
+        Yields ('field', key, value), ('item', key, index, value), then either
+        ('done', app_structure) or ('error', message).
+        """
+        if self.provider != "ollama" and not self.api_key:
+            yield ('error', f"No API key configured for {self.provider}")
+            return
+
+        full_prompt = self.build_app_prompt(prompt, image_path)
+        cache_key = self.get_cache_key(full_prompt, image_path)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logging.info(f"Response cache hit for {self.provider} ({cache_key[:12]})")
+                for key, value in cached.items():
+                    yield ('field', key, value)
+                yield ('done', cached)
+                return
+
+        parser = IncrementalJSONParser(item_keys=STREAMED_ITEM_KEYS)
+        chunks = self.generate_content_stream(full_prompt, image_path)
+        try:
+            for chunk in chunks:
+                for event in parser.feed(chunk):
+                    yield event
+                if parser.done:
+                    break
+        except MalformedStreamError as e:
+            logging.error(f"Aborting malformed {self.provider} stream: {str(e)}")
+            yield ('error', f"The AI provider returned an unexpected response: {str(e)}")
+            return
+        except Exception as e:
+            logging.error(f"Error streaming Android app from {self.provider}: {str(e)}")
+            yield ('error', f"Error generating app: {str(e)}")
+            return
+        finally:
+            chunks.close()
+
+        result = self.parse_generated_structure(parser.text) if parser.text else None
+        app_structure = result.data if result else None
+        if not app_structure:
+            yield ('error', 'Failed to generate Android app structure. Please try again or check your API configuration.')
+            return
+        missing = result.missing_fields
+        if missing:
+            # Truncated or incomplete stream: fill the gaps with a follow-up call, as generate_android_app does
+            app_structure, still_missing = self.complete_missing_fields(prompt, app_structure, missing)
+            for field in missing:
+                if field not in still_missing:
+                    yield ('field', field, app_structure[field])
+            missing = still_missing
+        if cache_key:
+            self.cache_if_complete(cache_key, app_structure, missing)
+        yield ('done', app_structure)
+
+    def get_cache_key(self, full_prompt, image_path=None, model_name=None):
+        """Hash the final prompt, image bytes, provider and model into a cache key"""
+        if self.cache is None:
+            return None
+        image_data = b''
+        if image_path and os.path.exists(image_path):
+            with open(image_path, "rb") as f:
+                image_data = f.read()
+        return make_cache_key(str(full_prompt), image_data, self.provider, model_name or self.get_model_name())
+
+    def parse_app_structure(self, response_text):
+        """Parse the provider's JSON response into an app structure dict"""
+        return parse_response(response_text).data
+
+    def parse_generated_structure(self, response_text, preview_only=False):
+        """Parse and validate a generation or preview response; returns a ParseResult"""
+        if preview_only:
+            return parse_response(response_text, PREVIEW_SCHEMA)
+        return parse_response(response_text, APP_STRUCTURE_SCHEMA, APP_STRUCTURE_OPTIONAL)
+
+    def build_fields_prompt(self, prompt, app_structure, fields):
+        """Ask for only the given top-level fields of an app that is otherwise generated"""
+        known = {key: app_structure[key] for key in ('app_name', 'package_name', 'description', 'ui_components')
+                 if key in app_structure and key not in fields}
+        activities = [app_structure.get('main_activity')] + list(app_structure.get('additional_activities') or [])
+        screens = [{'name': activity.get('name'), 'layout': activity.get('layout')}
+                   for activity in activities if isinstance(activity, dict)]
+        example = json.dumps({field: APP_STRUCTURE_EXAMPLE[field] for field in fields if field in APP_STRUCTURE_EXAMPLE},
+                             indent=2)
+        return f"""You are an expert Android app developer. Part of an Android app has already been generated for these requirements.
+
+User Requirements: {prompt}
+
+Already generated: {json.dumps(known)}
+Screens: {json.dumps(screens)}
+
+Return your response as valid JSON with only the following fields:
+{example}
+
+Make sure all code is complete, functional, consistent with what was already generated, and follows Android development best practices. Return only the JSON, no other text."""
+
+    def merge_fields(self, app_structure, fields, response_text):
+        """Fill fields of app_structure from a follow-up response; returns (app_structure, fields still missing)"""
+        patch = parse_response(response_text).data if response_text else None
+        if not patch:
+            logging.warning(f"Follow-up response from {self.provider} had no usable fields")
+            return app_structure, list(fields)
+        for field in fields:
+            if patch.get(field) not in (None, ''):
+                app_structure[field] = patch[field]
+        # Re-validate the merged app; fields the follow-up skipped or got wrong are still missing
+        return app_structure, ParseResult(missing=validate(app_structure, APP_STRUCTURE_SCHEMA,
+                                                           APP_STRUCTURE_OPTIONAL)).missing_fields
+
+    def complete_missing_fields(self, prompt, app_structure, fields, model_name=None):
+        """Re-request only the fields a response lacked or lost to truncation.
+
+        Returns (app_structure, fields still missing); on failure the partial structure is returned.
+        """
+        logging.info(f"Re-requesting {', '.join(fields)} from {self.provider}")
+        try:
+            response_text = self.request_content(self.build_fields_prompt(prompt, app_structure, fields),
+                                                 model_name=model_name)
+        except Exception as e:
+            # A partial app is still more useful than none
+            logging.error(f"Could not complete missing fields: {str(e)}")
+            return app_structure, list(fields)
+        return self.merge_fields(app_structure, fields, response_text)
+
+    def cache_if_complete(self, cache_key, app_structure, missing):
+        """Cache a structure only when nothing is missing, so an incomplete app is retried next time"""
+        if missing:
+            logging.warning(f"Not caching incomplete response from {self.provider}; missing {', '.join(missing)}")
+            return
+        self.cache.set(cache_key, app_structure)
+
+    def edit_android_app(self, previous_structure, previous_prompt, prompt, preview_only=False, cancel_token=None):
+        """Patch a previously generated app for an edited prompt instead of regenerating it.
+
+        Only the changed top-level fields are requested. Returns (app_structure, changed_fields);
+        (None, []) means the response was unusable (or the call was cancelled through
+        cancel_token) and the caller should regenerate. Provider errors are raised.
+        """
+        if self.provider != "ollama" and not self.api_key:
+            return None, []
+        fields = PREVIEW_FIELDS if preview_only else tuple(APP_STRUCTURE_EXAMPLE) + ("primary_color", "accent_color")
+        current = {field: previous_structure[field] for field in fields if field in previous_structure}
+        if prompt.strip() == previous_prompt.strip():
+            return dict(previous_structure), []
+
+        full_prompt = self.prompt_builder.edit_prompt(self.provider, previous_prompt, prompt, current)
+        model_name = self.get_model_name(preview_only)
+        max_tokens = PREVIEW_MAX_TOKENS if preview_only else None
+
+        cache_key = self.get_cache_key(full_prompt, model_name=model_name)
+        patch = self.cache.get(cache_key) if cache_key else None
+        if patch is None:
+            if cancel_token is not None:
+                response_text = self.collect_content_stream(full_prompt, None, cancel_token, model_name=model_name,
+                                                            max_tokens=max_tokens)
+                if response_text is None:
+                    return None, []
+            else:
+                response_text = self.request_content(full_prompt, model_name=model_name, max_tokens=max_tokens)
+            patch = parse_response(response_text).data if response_text else None
+            if not isinstance(patch, dict):
+                logging.warning(f"Edit response from {self.provider} had no usable JSON")
+                return None, []
+            if cache_key:
+                self.cache.set(cache_key, patch)
+
+        app_structure = dict(previous_structure)
+        changed = []
+        for field in fields:
+            value = patch.get(field)
+            if value in (None, '') or value == previous_structure.get(field):
+                continue
+            if not isinstance(value, type(APP_STRUCTURE_EXAMPLE.get(field, ''))):
+                logging.warning(f"Ignoring edited {field} of unexpected type from {self.provider}")
+                continue
+            app_structure[field] = value
+            changed.append(field)
+        logging.info(f"Edit changed {', '.join(changed) or 'nothing'} with {self.provider}")
+        return app_structure, changed
 
     def get_fallback_app_structure(self, prompt):
         """Generate a basic fallback app structure when API fails"""
@@ -0,0 +1,190 @@
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from prompt_builder import INLINE_IMAGE_REFERENCE
+
+# Output budgets per call; each part is a fraction of the single-shot response
+PLAN_MAX_TOKENS = 1500
+SCREEN_MAX_TOKENS = 4000
+RESOURCES_MAX_TOKENS = 2500
+CONFIG_MAX_TOKENS = 2500
+# Screens beyond this are dropped from the plan
+MAX_SCREENS = 6
+
+PLAN_SYSTEM_PROMPT = """You are an expert Android app architect. Plan an Android app for the user's requirements.
+
+Return only compact JSON with exactly these fields:
+{
+  "app_name": "App Name",
+  "package_name": "com.example.appname",
+  "description": "Brief description of the app",
+  "primary_color": "#RRGGBB",
+  "accent_color": "#RRGGBB",
+  "screens": [
+    {
+      "name": "MainActivity",
+      "layout": "activity_main",
+      "purpose": "What the screen is for",
+      "components": [
+        {"type": "Button|TextView|EditText|ImageView|etc", "id": "component_id", "text": "display text"}
+      ]
+    }
+  ]
+}
+
+The first screen must be MainActivity with layout activity_main. List at most """ + str(MAX_SCREENS) + """ screens. Do not include any code. Return only the JSON, no other text."""
+
+SCREEN_PROMPT = """You are an expert Android app developer. Write one screen of the Android app "{app_name}" (package {package_name}).
+
+App description: {description}
+{design}Screens in the app: {screen_names}
+
+Screen to write: {name}, layout {layout}. {purpose}
+Components: {components}
+
+Return your response as valid JSON with the following structure:
+{{
+  "java_code": "Complete Java code for {name}",
+  "xml_layout": "Complete XML layout code for {layout}"
+}}
+
+Use package {package_name}, R.layout.{layout} and the component ids above. Make sure all code is complete, functional, and follows Android development best practices. Return only the JSON, no other text."""
+
+RESOURCES_PROMPT = """You are an expert Android app developer. Write the value resources of the Android app "{app_name}" (package {package_name}).
+
+App description: {description}
+{design}Primary color: {primary_color}. Accent color: {accent_color}.
+Screens and their components: {screens}
+
+Return your response as valid JSON with the following structure:
+{{
+  "styles": "Complete styles.xml content",
+  "colors": "Complete colors.xml content, including colorPrimary and colorAccent",
+  "strings": "Complete strings.xml content, including app_name and every label shown on the screens"
+}}
+
+Make sure every file is complete and valid XML. Return only the JSON, no other text."""
+
+CONFIG_PROMPT = """You are an expert Android app developer. Write the build configuration of the Android app "{app_name}" (package {package_name}).
+
+App description: {description}
+Activities: {screen_names} (MainActivity is the launcher activity)
+
+Return your response as valid JSON with the following structure:
+{{
+  "manifest": "Complete AndroidManifest.xml content declaring every activity",
+  "gradle": "Complete app-level build.gradle content"
+}}
+
+Make sure all files are complete and follow Android development best practices. Return only the JSON, no other text."""
+
+
+class GenerationPipeline:
+    """Generates an app structure in parts instead of one long completion.
+
+    A plan call fixes the app name, package, colors and screens; each screen, the value
+    resources and the manifest/gradle files are then generated by concurrent smaller calls
+    and merged into the usual app_structure schema. A separate image analysis runs
+    alongside the plan and informs the screen and resource calls.
+    """
+
+    def __init__(self, service, max_workers=4):
+        self.service = service
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pipeline')
+
+    def request_json(self, prompt, image_path=None, max_tokens=None):
+        """Make one provider call and parse its JSON; provider errors propagate"""
+        text = self.service.request_content(prompt, image_path, max_tokens=max_tokens)
+        result = self.service.parse_app_structure(text) if text else None
+        if not isinstance(result, dict):
+            raise ValueError(f"{self.service.provider} returned no usable JSON for a pipeline step")
+        return result
+
+    def run(self, prompt, image_path=None, cancel_token=None):
+        """Return the merged app structure, or None if cancelled"""
+        has_image = bool(image_path and os.path.exists(image_path))
+        inline_image = image_path if has_image and self.service.sends_image_inline() else None
+
+        analysis = None
+        if has_image and not inline_image:
+            analysis = self._executor.submit(self.service.analyze_image, image_path)
+        plan_prompt = self.service.prompt_builder.build(PLAN_SYSTEM_PROMPT, self.service.provider, prompt,
+                                                        INLINE_IMAGE_REFERENCE if inline_image else None)
+
+        plan = self.request_json(plan_prompt, inline_image, PLAN_MAX_TOKENS)
+        screens = self.plan_screens(plan)
+
+        design = ''
+        if inline_image:
+            design = "Match the layout, colors and components of the attached GUI design image.\n"
+        elif analysis is not None and analysis.result():
+            design = f"GUI Design Reference: {analysis.result()}\n"
+
+        if cancel_token is not None and cancel_token.cancelled:
+            return None
+
+        details = {
+            'app_name': plan.get('app_name', 'My Android App'),
+            'package_name': plan.get('package_name', 'com.example.myapp'),
+            'description': plan.get('description', ''),
+            'primary_color': plan.get('primary_color', '#2196F3'),
+            'accent_color': plan.get('accent_color', '#FF4081'),
+            'design': design,
+            'screen_names': ', '.join(screen['name'] for screen in screens),
+        }
+        screen_calls = [
+            self._executor.submit(self.request_json, SCREEN_PROMPT.format(
+                name=screen['name'], layout=screen['layout'], purpose=screen.get('purpose', ''),
+                components=json.dumps(screen.get('components', [])), **details), inline_image, SCREEN_MAX_TOKENS)
+            for screen in screens
+        ]
+        resources_call = self._executor.submit(self.request_json, RESOURCES_PROMPT.format(
+            screens=json.dumps([{'name': screen['name'], 'components': screen.get('components', [])}
+                                for screen in screens]), **details), None, RESOURCES_MAX_TOKENS)
+        config_call = self._executor.submit(self.request_json, CONFIG_PROMPT.format(**details),
+                                            None, CONFIG_MAX_TOKENS)
+
+        try:
+            activities = []
+            for screen, call in zip(screens, screen_calls):
+                code = call.result()
+                activities.append({
+                    'name': screen['name'],
+                    'layout': screen['layout'],
+                    'java_code': code.get('java_code', ''),
+                    'xml_layout': code.get('xml_layout', ''),
+                })
+            resources = resources_call.result()
+            config = config_call.result()
+        finally:
+            # Skip calls that have not started yet if another part failed
+            for call in screen_calls + [resources_call, config_call]:
+                call.cancel()
+
+        logging.info(f"Pipeline generated {len(activities)} screens with {self.service.provider}")
+        return {
+            'app_name': details['app_name'],
+            'package_name': details['package_name'],
+            'description': details['description'],
+            'primary_color': details['primary_color'],
+            'accent_color': details['accent_color'],
+            'main_activity': activities[0],
+            'additional_activities': activities[1:],
+            'styles': resources.get('styles', ''),
+            'colors': resources.get('colors', ''),
+            'strings': resources.get('strings', ''),
+            'manifest': config.get('manifest', ''),
+            'gradle': config.get('gradle', ''),
+            'ui_components': screens[0].get('components', []),
+        }
+
+    def plan_screens(self, plan):
+        """Normalise the planned screens; the first one is always MainActivity/activity_main"""
+        screens = [screen for screen in plan.get('screens') or [] if isinstance(screen, dict) and screen.get('name')]
+        screens = screens[:MAX_SCREENS] or [{'name': 'MainActivity', 'components': plan.get('ui_components', [])}]
+        screens[0] = dict(screens[0], name='MainActivity', layout='activity_main')
+        for index, screen in enumerate(screens[1:], 1):
+            screen.setdefault('layout', f'activity_screen{index}')
+        return screens
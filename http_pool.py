@@ -0,0 +1,71 @@
+import socket
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def abort_response(response):
+    """Abort a streaming response from another thread.
+
+    Closing the response does not wake a thread blocked reading it, so the socket is shut
+    down instead; the reader then fails at once and its connection is discarded.
+    """
+    sock = getattr(getattr(response.raw, '_connection', None), 'sock', None)
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class SessionPool:
+    """Process-wide keep-alive requests.Session per provider with bounded connection pools"""
+
+    def __init__(self, pool_size=10, connect_timeout=5.0, read_timeout=120.0, pool_block=False):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_block = pool_block
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    @property
+    def timeout(self):
+        """(connect, read) timeout tuple passed to every request"""
+        return (self.connect_timeout, self.read_timeout)
+
+    def get(self, provider):
+        """Return the shared session for a provider, creating it on first use"""
+        session = self._sessions.get(provider)
+        if session is not None:
+            return session
+        with self._lock:
+            session = self._sessions.get(provider)
+            if session is None:
+                session = self._create_session()
+                self._sessions[provider] = session
+                logging.debug(f"Created HTTP session pool for {provider} (size={self.pool_size})")
+            return session
+
+    def _create_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size,
+                              pool_block=self.pool_block)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({'Connection': 'keep-alive'})
+        return session
+
+    def close_all(self):
+        """Close every pooled session and drop its connections"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+# Used by services that are not handed an explicit pool
+default_session_pool = SessionPool()
@@ -0,0 +1,222 @@
+import os
+import io
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from PIL import Image, ImageOps
+from sqlite_util import connect
+
+# Longest edge sent to each provider; larger images only add upload time and vision tokens
+PROVIDER_MAX_DIMENSION = {
+    "gemini": 1536,
+    "groq": 1024,
+    "ollama": 1024,
+    "huggingface": 1024,
+}
+DEFAULT_MAX_DIMENSION = 1024
+
+JPEG_QUALITY = 85
+HASH_SIZE = 16  # 16x16 difference hash -> 256-bit perceptual hash
+# Hashes are indexed in this many equal bands; two hashes within HASH_BANDS - 1 bits share a band
+HASH_BANDS = 8
+
+MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'WEBP': 'image/webp',
+    'GIF': 'image/gif',
+}
+EXTENSION_MIME_TYPES = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'gif': 'image/gif',
+}
+
+
+def max_dimension_for(provider):
+    """Return the longest edge to keep for a provider"""
+    return PROVIDER_MAX_DIMENSION.get(provider, DEFAULT_MAX_DIMENSION)
+
+
+def guess_mime_type(image_path):
+    """Return the MIME type of an image file, sniffing its content first"""
+    try:
+        with Image.open(image_path) as image:
+            if image.format in MIME_TYPES:
+                return MIME_TYPES[image.format]
+    except Exception:
+        pass
+    extension = image_path.rsplit('.', 1)[-1].lower()
+    return EXTENSION_MIME_TYPES.get(extension, 'image/jpeg')
+
+
+def perceptual_hash(image, hash_size=HASH_SIZE):
+    """Difference hash: stable across re-encoding and resizing of the same picture"""
+    gray = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(gray.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (1 if pixels[offset + col] > pixels[offset + col + 1] else 0)
+    return f"{value:0{hash_size * hash_size // 4}x}"
+
+
+def hash_bands(phash, bands=HASH_BANDS):
+    """Split a hash into equal segments for the similarity index"""
+    width = len(phash) // bands
+    return [phash[index * width:(index + 1) * width] for index in range(bands)]
+
+
+def hamming_distance(hash_a, hash_b):
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count('1')
+
+
+def _encode(image, image_format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+
+def preprocess_image(source, max_dimension=DEFAULT_MAX_DIMENSION):
+    """Normalize an uploaded image: fix orientation, downscale, strip metadata and re-encode.
+
+    Returns (data, extension, mime_type, phash, (width, height)).
+    """
+    with Image.open(source) as original:
+        original.seek(0)  # First frame of animated GIFs
+        image = ImageOps.exif_transpose(original)
+        image.load()
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    # Saving a fresh image without passing exif/icc/info drops all metadata.
+    # Flat UI screenshots are often smaller as PNG than JPEG, so keep whichever is smaller.
+    candidates = [('png', 'image/png', _encode(image, 'PNG', optimize=True))]
+    if not has_alpha:
+        candidates.append(('jpg', 'image/jpeg', _encode(image, 'JPEG', quality=JPEG_QUALITY,
+                                                        optimize=True, progressive=True)))
+    extension, mime_type, data = min(candidates, key=lambda candidate: len(candidate[2]))
+
+    return data, extension, mime_type, perceptual_hash(image), image.size
+
+
+class ImageIndex:
+    """SQLite index of processed uploads.
+
+    Only byte-identical uploads (same SHA-256 after preprocessing) reuse an existing file.
+    Uploads whose perceptual hash is within max_distance bits of an earlier one are still
+    stored, and only reported as similar: a difference hash cannot see text, icon or small
+    layout changes, so an edited mockup must never be swapped for the previous one.
+    """
+
+    def __init__(self, db_path, max_distance=0):
+        self.db_path = db_path
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        with connect(self.db_path) as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS images (
+                filename TEXT PRIMARY KEY,
+                phash TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                mime_type TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_images_phash ON images (phash)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_images_sha256 ON images (sha256)")
+            conn.execute("""CREATE TABLE IF NOT EXISTS image_bands (
+                band INTEGER NOT NULL,
+                value TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                PRIMARY KEY (band, value, filename)
+            )""")
+            # Index uploads recorded before the band table existed
+            missing = conn.execute("SELECT filename, phash FROM images WHERE filename NOT IN "
+                                   "(SELECT filename FROM image_bands)").fetchall()
+            for filename, phash in missing:
+                self._add_bands(conn, filename, phash)
+
+    def _add_bands(self, conn, filename, phash):
+        conn.executemany("INSERT OR IGNORE INTO image_bands (band, value, filename) VALUES (?, ?, ?)",
+                         [(band, value, filename) for band, value in enumerate(hash_bands(phash))])
+
+    def _forget(self, conn, filename):
+        conn.execute("DELETE FROM images WHERE filename = ?", (filename,))
+        conn.execute("DELETE FROM image_bands WHERE filename = ?", (filename,))
+
+    def find_exact(self, digest, folder):
+        """Return the filename of an existing upload with exactly these bytes, if it is still on disk"""
+        with connect(self.db_path) as conn:
+            rows = conn.execute("SELECT filename FROM images WHERE sha256 = ?", (digest,)).fetchall()
+            for (filename,) in rows:
+                if os.path.exists(os.path.join(folder, filename)):
+                    return filename
+                self._forget(conn, filename)
+        return None
+
+    def find_similar(self, phash, folder):
+        """Return the filename of the closest earlier upload within max_distance bits, or None.
+
+        Candidates come from the band index, so only uploads sharing a band are compared.
+        """
+        if self.max_distance <= 0:
+            return None
+        conditions = ' OR '.join(['(band = ? AND value = ?)'] * HASH_BANDS)
+        params = [item for band, value in enumerate(hash_bands(phash)) for item in (band, value)]
+        with connect(self.db_path) as conn:
+            rows = conn.execute(f"SELECT DISTINCT i.filename, i.phash FROM image_bands b "
+                                f"JOIN images i ON i.filename = b.filename WHERE {conditions}", params).fetchall()
+        best = None
+        for filename, existing_hash in rows:
+            distance = hamming_distance(phash, existing_hash)
+            if distance <= self.max_distance and os.path.exists(os.path.join(folder, filename)):
+                if best is None or distance < best[0]:
+                    best = (distance, filename)
+        return best[1] if best else None
+
+    def add(self, filename, phash, data, mime_type):
+        with connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO images (filename, phash, sha256, mime_type, size, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (filename, phash, hashlib.sha256(data).hexdigest(), mime_type, len(data), time.time()))
+            self._add_bands(conn, filename, phash)
+
+    def ingest(self, source, original_filename, folder, max_dimension=DEFAULT_MAX_DIMENSION):
+        """Preprocess an upload and store it in folder, reusing an existing file only for identical bytes.
+
+        Returns a dict with filename, file_path, mime_type, phash, duplicate flag and
+        similar_to (an earlier upload that looks alike, or None).
+        """
+        data, extension, mime_type, phash, size = preprocess_image(source, max_dimension)
+        digest = hashlib.sha256(data).hexdigest()
+        similar_to = self.find_similar(phash, folder)
+        with self._lock:
+            existing = self.find_exact(digest, folder)
+            if existing:
+                logging.info(f"Identical upload detected, reusing {existing}")
+                existing_path = os.path.join(folder, existing)
+                return {'filename': existing, 'file_path': existing_path,
+                        'mime_type': guess_mime_type(existing_path), 'phash': phash, 'duplicate': True,
+                        'similar_to': existing}
+
+            stem = os.path.splitext(original_filename)[0] or 'image'
+            filename = f"{uuid.uuid4().hex}_{stem}.{extension}"
+            file_path = os.path.join(folder, filename)
+            with open(file_path, 'wb') as f:
+                f.write(data)
+            self.add(filename, phash, data, mime_type)
+
+        if similar_to:
+            logging.info(f"Upload {filename} looks similar to {similar_to}")
+        logging.info(f"Stored {filename}: {size[0]}x{size[1]} {mime_type}, {len(data)} bytes")
+        return {'filename': filename, 'file_path': file_path, 'mime_type': mime_type,
+                'phash': phash, 'duplicate': False, 'similar_to': similar_to}
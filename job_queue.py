@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+
+class JobQueue:
+    """SQLite-backed job queue shared by every web worker process pointing at the same file"""
+
+    def __init__(self, db_path, stale_after=900):
+        self.db_path = db_path
+        self.stale_after = stale_after  # Seconds without a heartbeat before a running job is requeued
+        self._wakeup = threading.Condition()
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                provider TEXT NOT NULL DEFAULT '',
+                status TEXT NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                message TEXT NOT NULL DEFAULT '',
+                payload TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                worker_id TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                heartbeat_at REAL
+            )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, kind, payload, provider=''):
+        """Add a job and return its id"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, provider, status, message, payload, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, provider, QUEUED, 'Waiting for a worker', json.dumps(payload), now, now))
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def claim(self, worker_id, provider_limits=None, default_limit=None):
+        """Atomically take the oldest queued job whose provider is below its concurrency limit"""
+        provider_limits = provider_limits or {}
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                running = dict(conn.execute(
+                    "SELECT provider, COUNT(*) FROM jobs WHERE status = ? GROUP BY provider", (RUNNING,)).fetchall())
+                rows = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at ASC LIMIT 50", (QUEUED,)).fetchall()
+                for row in rows:
+                    limit = provider_limits.get(row['provider'], default_limit)
+                    if limit is not None and running.get(row['provider'], 0) >= limit:
+                        continue
+                    now = time.time()
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, worker_id = ?, message = ?, updated_at = ?, heartbeat_at = ? "
+                        "WHERE id = ?",
+                        (RUNNING, worker_id, 'Started', now, now, row['id']))
+                    conn.execute("COMMIT")
+                    job = self._to_dict(row)
+                    job['status'] = RUNNING
+                    return job
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return None
+
+    def update_progress(self, job_id, progress, message=''):
+        """Record progress (0.0-1.0) for a running job; doubles as its heartbeat"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET progress = ?, message = ?, updated_at = ?, heartbeat_at = ? WHERE id = ?",
+                (progress, message, now, now, job_id))
+
+    def complete(self, job_id, result):
+        """Mark a job as succeeded and store its result"""
+        self._finish(job_id, SUCCEEDED, result=json.dumps(result), message='Completed', progress=1.0)
+
+    def fail(self, job_id, error):
+        """Mark a job as failed with an error message"""
+        self._finish(job_id, FAILED, error=str(error), message='Failed')
+
+    def _finish(self, job_id, status, result=None, error=None, message='', progress=None):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, message = ?, "
+                "progress = COALESCE(?, progress), updated_at = ? WHERE id = ?",
+                (status, result, error, message, progress, now, job_id))
+
+    def get(self, job_id):
+        """Return a job as a dict, or None if unknown"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def requeue_stale(self):
+        """Put running jobs whose worker stopped heart-beating (e.g. after a restart) back in the queue"""
+        cutoff = time.time() - self.stale_after
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, worker_id = NULL, message = ? WHERE status = ? AND heartbeat_at < ?",
+                (QUEUED, 'Requeued after worker loss', RUNNING, cutoff))
+            if cursor.rowcount:
+                logging.warning(f"Requeued {cursor.rowcount} stale job(s)")
+            return cursor.rowcount
+
+    def wait_for_work(self, timeout):
+        """Sleep until a job is enqueued in this process or the timeout elapses"""
+        with self._wakeup:
+            self._wakeup.wait(timeout)
+
+    def wake_all(self):
+        """Wake every worker blocked in wait_for_work"""
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def _to_dict(self, row):
+        job = dict(row)
+        job['payload'] = json.loads(job['payload']) if job.get('payload') else {}
+        job['result'] = json.loads(job['result']) if job.get('result') else None
+        return job
+
+
+class JobWorkerPool:
+    """Bounded pool of threads executing jobs from a JobQueue"""
+
+    def __init__(self, queue, handlers, num_workers=2, provider_limits=None, default_limit=None,
+                 poll_interval=1.0):
+        self.queue = queue
+        self.handlers = handlers  # kind -> callable(payload, report_progress) returning a JSON-able result
+        self.num_workers = num_workers
+        self.provider_limits = provider_limits or {}
+        self.default_limit = default_limit
+        self.poll_interval = poll_interval
+        self._threads = []
+        self._stopping = threading.Event()
+        self._worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self):
+        """Start worker threads (no-op if already running)"""
+        if self._threads:
+            return
+        self.queue.requeue_stale()
+        for index in range(self.num_workers):
+            thread = threading.Thread(target=self._run, args=(f"{self._worker_prefix}:{index}",),
+                                      name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logging.info(f"Started {self.num_workers} job worker(s)")
+
+    def stop(self, timeout=5):
+        """Ask workers to exit after their current job"""
+        self._stopping.set()
+        self.queue.wake_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self, worker_id):
+        last_stale_check = time.time()
+        while not self._stopping.is_set():
+            try:
+                if time.time() - last_stale_check > self.queue.stale_after / 2:
+                    self.queue.requeue_stale()
+                    last_stale_check = time.time()
+                job = self.queue.claim(worker_id, self.provider_limits, self.default_limit)
+            except sqlite3.Error as e:
+                logging.error(f"Job queue unavailable: {str(e)}")
+                job = None
+            if job is None:
+                self.queue.wait_for_work(self.poll_interval)
+                continue
+            self._execute(job)
+
+    def _execute(self, job):
+        handler = self.handlers.get(job['kind'])
+        if handler is None:
+            self.queue.fail(job['id'], f"No handler for job kind: {job['kind']}")
+            return
+
+        def report_progress(progress, message=''):
+            self.queue.update_progress(job['id'], progress, message)
+
+        try:
+            result = handler(job['payload'], report_progress)
+            self.queue.complete(job['id'], result)
+        except Exception as e:
+            logging.error(f"Job {job['id']} ({job['kind']}) failed: {str(e)}")
+            self.queue.fail(job['id'], e)
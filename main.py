@@ -1,5 +1,7 @@
 from app import app
+from routes import start_background_workers
 
 if __name__ == '__main__':
     # Use 0.0.0.0 for compatibility with different environments
+    start_background_workers(reloader=True)
     app.run(host='0.0.0.0', port=8080, debug=True)
\ No newline at end of file
@@ -0,0 +1,169 @@
+import os
+import time
+import sqlite3
+import logging
+from sqlite_util import connect
+
+# Columns returned for each project, in listing order
+PROJECT_COLUMNS = ('id', 'app_name', 'package_name', 'description', 'prompt', 'provider', 'size_bytes',
+                   'file_count', 'created_at', 'updated_at', 'downloads', 'last_downloaded_at')
+MAX_PAGE_SIZE = 100
+
+# Full-text index over the projects table itself (external content, keyed by rowid), kept in
+# step by triggers so updating or removing a project touches only its own index entries
+FTS_TABLE = ("CREATE VIRTUAL TABLE projects_fts USING fts5("
+             "app_name, description, prompt, content='projects', content_rowid='rowid')")
+FTS_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS projects_fts_insert AFTER INSERT ON projects BEGIN
+        INSERT INTO projects_fts (rowid, app_name, description, prompt)
+        VALUES (new.rowid, new.app_name, new.description, new.prompt);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS projects_fts_delete AFTER DELETE ON projects BEGIN
+        INSERT INTO projects_fts (projects_fts, rowid, app_name, description, prompt)
+        VALUES ('delete', old.rowid, old.app_name, old.description, old.prompt);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS projects_fts_update AFTER UPDATE OF app_name, description, prompt ON projects BEGIN
+        INSERT INTO projects_fts (projects_fts, rowid, app_name, description, prompt)
+        VALUES ('delete', old.rowid, old.app_name, old.description, old.prompt);
+        INSERT INTO projects_fts (rowid, app_name, description, prompt)
+        VALUES (new.rowid, new.app_name, new.description, new.prompt);
+    END""",
+)
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query matching every word as a prefix"""
+    words = [word.replace('"', '""') for word in text.split()]
+    return ' '.join(f'"{word}"*' for word in words if word)
+
+
+class ProjectCatalog:
+    """Metadata of every generated project, indexed for listing and search.
+
+    Lookups by id, app_name, package_name and creation time use B-tree indexes; prompt,
+    app name and description are full-text searchable when SQLite has FTS5 (otherwise
+    search falls back to LIKE). Projects are recorded when they are written, so listing
+    never walks the project folders.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        with connect(self.db_path, row_factory=sqlite3.Row) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS projects (
+                id TEXT PRIMARY KEY,
+                app_name TEXT,
+                package_name TEXT,
+                description TEXT,
+                prompt TEXT,
+                provider TEXT,
+                size_bytes INTEGER NOT NULL DEFAULT 0,
+                file_count INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                downloads INTEGER NOT NULL DEFAULT 0,
+                last_downloaded_at REAL
+            )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS projects_app_name ON projects (app_name COLLATE NOCASE)")
+            conn.execute("CREATE INDEX IF NOT EXISTS projects_package_name ON projects (package_name)")
+            conn.execute("CREATE INDEX IF NOT EXISTS projects_created_at ON projects (created_at)")
+            try:
+                self._create_full_text_index(conn)
+                self.full_text = True
+            except sqlite3.OperationalError:
+                logging.warning("SQLite has no FTS5; project search falls back to LIKE")
+                self.full_text = False
+
+    def _create_full_text_index(self, conn):
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'projects_fts'").fetchone()
+        if row is not None and 'content=' not in row['sql']:
+            # Catalogs created before the index was tied to the projects table
+            conn.execute("DROP TABLE projects_fts")
+            row = None
+        if row is None:
+            conn.execute(FTS_TABLE)
+            conn.execute("INSERT INTO projects_fts (projects_fts) VALUES ('rebuild')")
+        for trigger in FTS_TRIGGERS:
+            conn.execute(trigger)
+
+    def record(self, project_id, app_structure, tree=None, prompt=None, provider=None):
+        """Add or refresh a project; created_at and download counts survive a refresh"""
+        now = time.time()
+        row = (
+            project_id,
+            app_structure.get('app_name'),
+            app_structure.get('package_name'),
+            app_structure.get('description'),
+            prompt,
+            provider,
+            tree.total_size() if tree is not None else 0,
+            len(tree) if tree is not None else 0,
+            now,
+            now,
+        )
+        with connect(self.db_path, row_factory=sqlite3.Row) as conn:
+            conn.execute(
+                "INSERT INTO projects (id, app_name, package_name, description, prompt, provider, size_bytes, "
+                "file_count, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET app_name = excluded.app_name, package_name = excluded.package_name, "
+                "description = excluded.description, prompt = COALESCE(excluded.prompt, prompt), "
+                "provider = COALESCE(excluded.provider, provider), size_bytes = excluded.size_bytes, "
+                "file_count = excluded.file_count, updated_at = excluded.updated_at", row)
+
+    def record_download(self, project_id):
+        with connect(self.db_path, row_factory=sqlite3.Row) as conn:
+            conn.execute("UPDATE projects SET downloads = downloads + 1, last_downloaded_at = ? WHERE id = ?",
+                         (time.time(), project_id))
+
+    def get(self, project_id):
+        with connect(self.db_path, row_factory=sqlite3.Row) as conn:
+            row = conn.execute("SELECT * FROM projects WHERE id = ?", (project_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def remove(self, project_ids):
+        with connect(self.db_path, row_factory=sqlite3.Row) as conn:
+            conn.executemany("DELETE FROM projects WHERE id = ?", [(project_id,) for project_id in project_ids])
+
+    def search(self, query=None, app_name=None, package_name=None, created_after=None, created_before=None,
+               limit=20, offset=0):
+        """Return (projects, total) matching every given filter.
+
+        Full-text matches are ranked by relevance, everything else is newest first.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        offset = max(0, int(offset))
+        joins = ''
+        where = []
+        params = []
+        order = 'p.created_at DESC'
+        if query and query.strip():
+            if self.full_text:
+                joins = 'JOIN projects_fts f ON f.rowid = p.rowid'
+                where.append('projects_fts MATCH ?')
+                params.append(fts_query(query))
+                order = 'bm25(projects_fts), p.created_at DESC'
+            else:
+                like = f"%{query.strip()}%"
+                where.append('(p.app_name LIKE ? OR p.description LIKE ? OR p.prompt LIKE ?)')
+                params.extend([like, like, like])
+        if app_name:
+            where.append('p.app_name = ? COLLATE NOCASE')
+            params.append(app_name)
+        if package_name:
+            where.append('p.package_name = ?')
+            params.append(package_name)
+        if created_after is not None:
+            where.append('p.created_at >= ?')
+            params.append(created_after)
+        if created_before is not None:
+            where.append('p.created_at < ?')
+            params.append(created_before)
+        condition = f"WHERE {' AND '.join(where)}" if where else ''
+
+        columns = ', '.join(f'p.{column}' for column in PROJECT_COLUMNS)
+        with connect(self.db_path, row_factory=sqlite3.Row) as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM projects p {joins} {condition}", params).fetchone()[0]
+            rows = conn.execute(f"SELECT {columns} FROM projects p {joins} {condition} ORDER BY {order} "
+                                f"LIMIT ? OFFSET ?", params + [limit, offset]).fetchall()
+        return [dict(row) for row in rows], total
@@ -0,0 +1,62 @@
+import os
+import shutil
+import logging
+import tempfile
+from project_tree import ProjectTree, write_tree_to_directory
+
+
+class ProjectSkeleton:
+    """Boilerplate files that are identical in every generated project.
+
+    The files are rendered once and shared by reference between project trees. With a
+    folder, they are also stored once on disk under a directory named after a digest of
+    their contents, so DirectorySink hardlinks them instead of writing fresh copies and a
+    change to the boilerplate starts a new version rather than altering linked files.
+    """
+
+    def __init__(self, folder=None):
+        self.folder = folder
+        self.files = ProjectTree()
+        self.version = None
+        self.path = None
+
+    def add_file(self, path, content, mode=0o644):
+        self.files.add_file(path, content, mode)
+
+    def finalize(self):
+        """Fix the version and store the files on disk once; call after adding every file"""
+        self.version = self.files.digest()[:12]
+        if self.folder:
+            try:
+                self.path = self._materialize()
+            except OSError as e:
+                logging.warning(f"Could not store project skeleton on disk, copying instead: {str(e)}")
+                self.path = None
+        if self.path:
+            for path, entry in self.files.iter_files():
+                entry.shared_path = os.path.join(self.path, path)
+        return self
+
+    def _materialize(self):
+        version_path = os.path.join(self.folder, self.version)
+        if os.path.isdir(version_path):
+            return version_path
+
+        os.makedirs(self.folder, exist_ok=True)
+        temp_path = tempfile.mkdtemp(dir=self.folder, prefix='.tmp-')
+        try:
+            write_tree_to_directory(self.files, temp_path)
+            os.chmod(temp_path, 0o755)
+            os.rename(temp_path, version_path)
+            logging.info(f"Stored project skeleton {self.version}")
+        except OSError:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            # Another process stored the same version first
+            if not os.path.isdir(version_path):
+                raise
+        return version_path
+
+    def apply(self, tree):
+        """Add every skeleton file to a project tree by reference"""
+        for path, entry in self.files.iter_files():
+            tree.add_entry(path, entry)
@@ -0,0 +1,224 @@
+import os
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+DEFAULT_FILE_MODE = 0o644
+
+
+class ProjectFile:
+    """A file in a ProjectTree, held in memory or backed by a file on disk.
+
+    shared_path, when set, is an immutable on-disk copy of the same contents that
+    sinks may hardlink instead of writing the data again.
+    """
+
+    __slots__ = ('data', 'source', 'mode', 'mtime', 'shared_path')
+
+    def __init__(self, data=None, source=None, mode=DEFAULT_FILE_MODE, mtime=None, shared_path=None):
+        self.data = data
+        self.source = source
+        self.mode = mode
+        self.mtime = mtime or time.time()
+        self.shared_path = shared_path
+
+    def read(self):
+        if self.data is not None:
+            return self.data
+        with open(self.source, 'rb') as f:
+            return f.read()
+
+
+class ProjectTree:
+    """Virtual file tree for a generated project, keyed by forward-slash relative paths"""
+
+    def __init__(self):
+        self.files = {}
+        self.directories = set()
+
+    def add_directory(self, path):
+        self.directories.add(path.strip('/'))
+
+    def add_file(self, path, content, mode=DEFAULT_FILE_MODE):
+        """Add or replace a file; str content is stored as UTF-8"""
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        self.files[path.strip('/')] = ProjectFile(data=content, mode=mode)
+
+    def add_source(self, path, source_path, mode=DEFAULT_FILE_MODE, mtime=None):
+        """Add a file whose contents are read lazily from source_path"""
+        self.files[path.strip('/')] = ProjectFile(source=source_path, mode=mode, mtime=mtime)
+
+    def add_entry(self, path, entry):
+        """Add an existing ProjectFile by reference, e.g. one shared between many trees"""
+        self.files[path.strip('/')] = entry
+
+    def read(self, path):
+        return self.files[path].read()
+
+    def __contains__(self, path):
+        return path in self.files
+
+    def __len__(self):
+        return len(self.files)
+
+    def iter_files(self):
+        """Yield (path, ProjectFile) in a stable order"""
+        for path in sorted(self.files):
+            yield path, self.files[path]
+
+    def total_size(self):
+        return sum(len(entry.data) if entry.data is not None else os.path.getsize(entry.source)
+                   for entry in self.files.values())
+
+    def digest(self):
+        """SHA-256 over every file's path, mode and contents"""
+        digest = hashlib.sha256()
+        for path, entry in self.iter_files():
+            digest.update(path.encode('utf-8') + b'\0')
+            digest.update(oct(entry.mode & 0o777).encode('ascii') + b'\0')
+            digest.update(entry.read())
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    @classmethod
+    def from_directory(cls, root):
+        """Build a tree referencing the files under root without reading them"""
+        tree = cls()
+        for current, dirs, files in os.walk(root):
+            for name in files:
+                source = os.path.join(current, name)
+                stat = os.stat(source)
+                path = os.path.relpath(source, root).replace(os.sep, '/')
+                tree.add_source(path, source, mode=stat.st_mode & 0o777, mtime=stat.st_mtime)
+            if not files and not dirs:
+                tree.add_directory(os.path.relpath(current, root).replace(os.sep, '/'))
+        return tree
+
+
+def _hardlink(source, target):
+    try:
+        os.link(source, target)
+        return True
+    except OSError:
+        # Missing source, another filesystem or no hardlink support: copy instead
+        return False
+
+
+def _write_entry(entry, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    # Replace rather than overwrite so a rewrite never changes a hardlinked shared file
+    if os.path.lexists(target):
+        os.unlink(target)
+    if entry.shared_path and _hardlink(entry.shared_path, target):
+        return
+    with open(target, 'wb') as f:
+        f.write(entry.read())
+    if entry.mode != DEFAULT_FILE_MODE:
+        os.chmod(target, entry.mode)
+
+
+def write_tree_to_directory(tree, root):
+    """Materialize a tree under root, hardlinking shared files where possible"""
+    os.makedirs(root, exist_ok=True)
+    for directory in tree.directories:
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+    for path, entry in tree.iter_files():
+        _write_entry(entry, os.path.join(root, path))
+
+
+def diff_trees(old, new):
+    """Return (changed, removed): paths new adds or alters relative to old, and paths it drops"""
+    changed = []
+    for path, entry in new.iter_files():
+        previous = old.files.get(path)
+        if previous is None or previous.mode & 0o777 != entry.mode & 0o777:
+            changed.append(path)
+        elif not (entry.shared_path and previous.shared_path == entry.shared_path) and previous.read() != entry.read():
+            changed.append(path)
+    removed = [path for path, _ in old.iter_files() if path not in new]
+    return changed, removed
+
+
+class DirectorySink:
+    """Stores each project as a directory tree under root (the original on-disk layout)"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path_for(self, project_id):
+        return os.path.join(self.root, project_id)
+
+    def write(self, project_id, tree):
+        project_path = self.path_for(project_id)
+        write_tree_to_directory(tree, project_path)
+        return project_path
+
+    def update(self, project_id, tree, changed, removed):
+        """Rewrite only the changed files of an existing project and delete the removed ones"""
+        project_path = self.path_for(project_id)
+        for directory in tree.directories:
+            os.makedirs(os.path.join(project_path, directory), exist_ok=True)
+        for path in changed:
+            _write_entry(tree.files[path], os.path.join(project_path, path))
+        for path in removed:
+            target = os.path.join(project_path, path)
+            if os.path.lexists(target):
+                os.unlink(target)
+        return project_path
+
+    def load(self, project_id):
+        project_path = self.path_for(project_id)
+        if not os.path.isdir(project_path):
+            return None
+        return ProjectTree.from_directory(project_path)
+
+    def exists(self, project_id):
+        return os.path.isdir(self.path_for(project_id))
+
+    def delete(self, project_id):
+        project_path = self.path_for(project_id)
+        if not os.path.isdir(project_path):
+            return False
+        shutil.rmtree(project_path)
+        return True
+
+
+class MemorySink:
+    """Keeps the most recent projects as in-memory trees; nothing touches the filesystem"""
+
+    def __init__(self, max_projects=200):
+        self.max_projects = max_projects
+        self._projects = OrderedDict()
+        self._lock = threading.Lock()
+
+    def write(self, project_id, tree):
+        with self._lock:
+            self._projects[project_id] = tree
+            self._projects.move_to_end(project_id)
+            while len(self._projects) > self.max_projects:
+                evicted, _ = self._projects.popitem(last=False)
+                logging.info(f"Evicted in-memory project {evicted}")
+        return project_id
+
+    def update(self, project_id, tree, changed, removed):
+        # Nothing is written anywhere, so swapping in the new tree is the cheapest update
+        return self.write(project_id, tree)
+
+    def load(self, project_id):
+        with self._lock:
+            tree = self._projects.get(project_id)
+            if tree is not None:
+                self._projects.move_to_end(project_id)
+            return tree
+
+    def exists(self, project_id):
+        with self._lock:
+            return project_id in self._projects
+
+    def delete(self, project_id):
+        with self._lock:
+            return self._projects.pop(project_id, None) is not None
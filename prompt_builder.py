@@ -0,0 +1,205 @@
+import json
+import difflib
+from rate_limiter import CHARS_PER_TOKEN
+
+# Approximate characters per token of each provider's tokenizer, for budgeting prompts
+PROVIDER_CHARS_PER_TOKEN = {
+    "gemini": 4.0,
+    "groq": 3.6,
+    "ollama": 3.6,
+    "huggingface": 3.2,
+}
+
+# Share of the dynamic budget kept for the image analysis when both parts have to be cut
+DESIGN_BUDGET_SHARE = 0.4
+ELISION = "\n[...]\n"
+
+# Design reference used when the image itself is attached to the generation call
+INLINE_IMAGE_REFERENCE = ("the attached image. Match its layout, colors, components "
+                          "and user interface elements.")
+
+APP_SYSTEM_PROMPT = """You are an expert Android app developer. Generate a complete Android app structure based on the user's requirements.
+
+Return your response as valid JSON with the following structure:
+{
+  "app_name": "App Name",
+  "package_name": "com.example.appname",
+  "description": "Brief description of the app",
+  "main_activity": {
+    "name": "MainActivity",
+    "layout": "activity_main",
+    "java_code": "Complete Java code for MainActivity",
+    "xml_layout": "Complete XML layout code"
+  },
+  "additional_activities": [
+    {
+      "name": "ActivityName",
+      "layout": "layout_name",
+      "java_code": "Complete Java code",
+      "xml_layout": "Complete XML layout code"
+    }
+  ],
+  "styles": "Complete styles.xml content",
+  "colors": "Complete colors.xml content",
+  "strings": "Complete strings.xml content",
+  "manifest": "Complete AndroidManifest.xml content",
+  "gradle": "Complete build.gradle content",
+  "ui_components": [
+    {
+      "type": "Button|TextView|ImageView|etc",
+      "id": "component_id",
+      "text": "display text",
+      "properties": {}
+    }
+  ]
+}
+
+Make sure all code is complete, functional, and follows Android development best practices. Return only the JSON, no other text."""
+
+PREVIEW_SYSTEM_PROMPT = """You are an expert Android UI designer. Sketch the main screen of an Android app for the user's requirements.
+
+Return only compact JSON with exactly these fields:
+{
+  "app_name": "App Name",
+  "primary_color": "#RRGGBB",
+  "accent_color": "#RRGGBB",
+  "ui_components": [
+    {"type": "Button|TextView|EditText|ImageView|etc", "id": "component_id", "text": "display text"}
+  ]
+}
+
+List at most 12 components in screen order. Do not include any code. Return only the JSON, no other text."""
+
+EDIT_SYSTEM_PROMPT = """You are an expert Android app developer. The user has changed the requirements of an Android app that was already generated. Update the app to match the new requirements.
+
+Return your response as valid JSON containing only the top-level fields of the current app that have to change, each with its complete new value, using the same structure as the current app. If any activity in additional_activities changes, return the whole additional_activities list. Keep names, ids and the package name unless the change requires otherwise, and keep every file consistent with the fields you do not return. If nothing has to change, return {}.
+
+Make sure all code is complete, functional, and follows Android development best practices. Return only the JSON, no other text."""
+
+
+class Prompt:
+    """A static instruction prefix plus the per-request part.
+
+    The prefix comes first and is byte-identical on every call, so provider-side prefix
+    caches (Ollama's KV cache, Groq/OpenAI-style prompt caching) can reuse it.
+    """
+
+    __slots__ = ('system', 'user')
+
+    def __init__(self, system, user):
+        self.system = system
+        self.user = user
+
+    def __str__(self):
+        return f"{self.system}\n\n{self.user}"
+
+    def messages(self):
+        """Chat messages with the prefix as the system message"""
+        return [{"role": "system", "content": self.system}, {"role": "user", "content": self.user}]
+
+    def parts(self):
+        """Content parts for a single-turn Gemini request, prefix first"""
+        return [self.system, self.user]
+
+
+def as_messages(prompt):
+    """Chat messages for a Prompt or a plain prompt string"""
+    if isinstance(prompt, Prompt):
+        return prompt.messages()
+    return [{"role": "user", "content": prompt}]
+
+
+def as_parts(prompt):
+    """Gemini content parts for a Prompt or a plain prompt string"""
+    if isinstance(prompt, Prompt):
+        return prompt.parts()
+    return [prompt]
+
+
+def describe_prompt_change(old, new):
+    """Summarise which sentences of the requirements were removed and added"""
+    old_lines = [line.strip() for line in old.replace('. ', '.\n').splitlines() if line.strip()]
+    new_lines = [line.strip() for line in new.replace('. ', '.\n').splitlines() if line.strip()]
+    removed = []
+    added = []
+    for line in difflib.ndiff(old_lines, new_lines):
+        if line.startswith('- '):
+            removed.append(line[2:])
+        elif line.startswith('+ '):
+            added.append(line[2:])
+    parts = []
+    if removed:
+        parts.append("Removed: " + ' '.join(removed))
+    if added:
+        parts.append("Added: " + ' '.join(added))
+    return '\n'.join(parts) or "No textual change"
+
+
+def count_tokens(text, provider=None):
+    """Estimate how many tokens text takes with a provider's tokenizer"""
+    return int(len(text) / PROVIDER_CHARS_PER_TOKEN.get(provider, CHARS_PER_TOKEN)) + 1
+
+
+def trim_to_tokens(text, max_tokens, provider=None):
+    """Shorten text to about max_tokens, keeping its beginning and end"""
+    if count_tokens(text, provider) <= max_tokens:
+        return text
+    max_chars = max(0, int(max_tokens * PROVIDER_CHARS_PER_TOKEN.get(provider, CHARS_PER_TOKEN)) - len(ELISION))
+    if max_chars <= 0:
+        return ''
+    head = max_chars * 2 // 3
+    return text[:head].rstrip() + ELISION + text[len(text) - (max_chars - head):].lstrip()
+
+
+class PromptBuilder:
+    """Assembles generation prompts within an input-token budget (0 = unlimited).
+
+    When the requirements and image analysis do not fit next to the static prefix, the
+    image analysis is cut first, down to its share of the budget, then the requirements.
+    """
+
+    def __init__(self, input_budget=0):
+        self.input_budget = input_budget
+
+    def app_prompt(self, provider, requirements, design=None):
+        return self.build(APP_SYSTEM_PROMPT, provider, requirements, design)
+
+    def preview_prompt(self, provider, requirements, design=None):
+        return self.build(PREVIEW_SYSTEM_PROMPT, provider, requirements, design)
+
+    def edit_prompt(self, provider, previous_requirements, requirements, current_fields):
+        """Ask for only the fields that the change from previous_requirements to requirements affects"""
+        current = json.dumps(current_fields)
+        change = describe_prompt_change(previous_requirements, requirements)
+        if self.input_budget:
+            available = (self.input_budget - count_tokens(EDIT_SYSTEM_PROMPT, provider)
+                         - count_tokens(current, provider) - count_tokens(change, provider) - 32)
+            requirements = trim_to_tokens(requirements, max(available // 2, 0), provider)
+            previous_requirements = trim_to_tokens(previous_requirements, max(available // 4, 0), provider)
+        return Prompt(EDIT_SYSTEM_PROMPT,
+                      f"Previous Requirements: {previous_requirements}\n\n"
+                      f"New Requirements: {requirements}\n\n"
+                      f"Change:\n{change}\n\n"
+                      f"Current App: {current}")
+
+    def build(self, system, provider, requirements, design=None):
+        requirements, design = self.fit(system, provider, requirements, design)
+        if design:
+            return Prompt(system, f"GUI Design Reference: {design}\n\nUser Requirements: {requirements}")
+        return Prompt(system, f"User Requirements: {requirements}")
+
+    def fit(self, system, provider, requirements, design=None):
+        """Return (requirements, design) trimmed so the whole prompt fits the budget"""
+        if not self.input_budget:
+            return requirements, design
+        available = self.input_budget - count_tokens(system, provider) - 16  # field labels
+        needed = count_tokens(requirements, provider) + (count_tokens(design, provider) if design else 0)
+        if needed <= available:
+            return requirements, design
+
+        if design:
+            design_budget = max(available - count_tokens(requirements, provider),
+                                int(available * DESIGN_BUDGET_SHARE))
+            design = trim_to_tokens(design, design_budget, provider)
+            available -= count_tokens(design, provider)
+        return trim_to_tokens(requirements, max(available, 0), provider), design
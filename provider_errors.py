@@ -0,0 +1,30 @@
+# Error text that marks a provider refusing work because of rate limits or quotas
+RATE_LIMIT_KEYWORDS = ['rate limit', 'quota', 'limit exceeded', '429']
+
+
+class ProviderError(RuntimeError):
+    """A provider call failed; carries the HTTP status and any Retry-After hint in seconds"""
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def is_rate_limit_error(error):
+    if isinstance(error, ProviderError) and error.status_code == 429:
+        return True
+    return any(keyword in str(error).lower() for keyword in RATE_LIMIT_KEYWORDS)
+
+
+def raise_for_provider_status(provider, response):
+    """Raise ProviderError for a non-200 provider response"""
+    if response.status_code == 200:
+        return
+    retry_after = response.headers.get("Retry-After")
+    try:
+        retry_after = float(retry_after) if retry_after else None
+    except ValueError:
+        retry_after = None  # HTTP-date form; callers fall back to their own backoff
+    raise ProviderError(f"{provider} API error: {response.status_code}, {response.text[:500]}",
+                        status_code=response.status_code, retry_after=retry_after)
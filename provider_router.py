@@ -0,0 +1,380 @@
+import time
+import queue
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from provider_errors import is_rate_limit_error
+from request_coalescer import CancelToken
+from service_registry import get_provider_credentials, KEYLESS_PROVIDERS
+
+# Assumed latency of a provider that has not answered yet; low enough that it gets tried
+INITIAL_LATENCY = 5.0
+# Cool-down after a rate-limit response that did not say how long to wait
+DEFAULT_RATE_LIMIT_BACKOFF = 30.0
+# The configured ai_provider wins unless another provider is clearly faster or healthier
+PREFERRED_BIAS = 0.8
+
+
+class ProviderHealth:
+    """Rolling latency and error rate (exponentially weighted), plus rate-limit and circuit state"""
+
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.latency = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.unavailable_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.rate_limited = 0
+
+    def record_success(self, latency):
+        self.requests += 1
+        self.consecutive_failures = 0
+        self.latency = latency if self.latency is None else self.alpha * latency + (1 - self.alpha) * self.latency
+        self.error_rate = (1 - self.alpha) * self.error_rate
+
+    def record_failure(self, error=None):
+        self.requests += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+        now = time.time()
+        if error is not None and is_rate_limit_error(error):
+            self.rate_limited += 1
+            backoff = getattr(error, 'retry_after', None) or DEFAULT_RATE_LIMIT_BACKOFF
+            self.unavailable_until = max(self.unavailable_until, now + backoff)
+        elif self.consecutive_failures >= 3:
+            # Open the circuit: 5s, 10s, 20s ... up to a minute, then let one request probe it
+            backoff = min(60.0, 5.0 * 2 ** (self.consecutive_failures - 3))
+            self.unavailable_until = max(self.unavailable_until, now + backoff)
+
+    def available(self, now=None):
+        return (now or time.time()) >= self.unavailable_until
+
+    def score(self):
+        """Expected latency, inflated by the recent error rate; lower is better"""
+        latency = self.latency if self.latency is not None else INITIAL_LATENCY
+        return latency * (1 + 4 * self.error_rate)
+
+    def snapshot(self):
+        return {
+            'latency': round(self.latency, 3) if self.latency is not None else None,
+            'error_rate': round(self.error_rate, 3),
+            'requests': self.requests,
+            'failures': self.failures,
+            'rate_limited': self.rate_limited,
+            'available': self.available(),
+            'unavailable_for': max(0.0, round(self.unavailable_until - time.time(), 1)),
+        }
+
+
+class ProviderRouter:
+    """Dispatches each request to the best healthy configured provider, failing over on errors.
+
+    Every provider with credentials in the config is a candidate. Previews can be hedged:
+    if the first provider has not answered within hedge_delay seconds, the next one is
+    started too and whichever answers first wins; the other call is cancelled.
+    """
+
+    def __init__(self, registry, providers=('gemini', 'groq', 'huggingface', 'ollama'),
+                 hedge_previews=False, hedge_delay=2.0, max_hedge_workers=8):
+        self.registry = registry
+        self.providers = providers
+        self.hedge_previews = hedge_previews
+        self.hedge_delay = hedge_delay
+        self._health = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_hedge_workers, thread_name_prefix='hedge')
+
+    def health(self, provider):
+        with self._lock:
+            return self._health.setdefault(provider, ProviderHealth())
+
+    def candidates(self, config, preferred=None, registry=None):
+        """Return [(provider, service)] for every usable provider, best first.
+
+        Services come from registry, by default the router's own (synchronous) one.
+        """
+        registry = registry or self.registry
+        preferred = (preferred or config.get('ai_provider', 'gemini')).lower()
+        entries = []
+        for provider in self.providers:
+            provider, api_key, api_url = get_provider_credentials(config, provider)
+            # api_url in config.json belongs to the configured provider; others use their defaults
+            if provider != config.get('ai_provider', 'gemini'):
+                api_url = None
+            if not api_key and not (provider in KEYLESS_PROVIDERS and provider == preferred):
+                continue
+            entries.append((provider, api_key, api_url))
+
+        now = time.time()
+        with self._lock:
+            def rank(entry):
+                health = self._health.setdefault(entry[0], ProviderHealth())
+                score = health.score() * (PREFERRED_BIAS if entry[0] == preferred else 1)
+                return (not health.available(now), score)
+            entries.sort(key=rank)
+        return [(provider, registry.get(provider, api_key, api_url)) for provider, api_key, api_url in entries]
+
+    def for_config(self, config, provider=None):
+        """Return (provider, api_key, service) like ServiceRegistry.for_config, with a routed service"""
+        preferred, api_key, _ = get_provider_credentials(config, provider)
+        if not self.candidates(config, preferred):
+            return preferred, api_key, None
+        return preferred, api_key, RoutedService(self, config, preferred)
+
+    def for_config_async(self, config, registry, provider=None):
+        """Like for_config, routing across the async services of registry (asgi.py)"""
+        preferred, api_key, _ = get_provider_credentials(config, provider)
+        if not self.candidates(config, preferred, registry):
+            return preferred, api_key, None
+        return preferred, api_key, AsyncRoutedService(self, config, preferred, registry)
+
+    def record(self, provider, started, result, error, token):
+        if token is not None and token.cancelled:
+            return  # Abandoned by the caller; says nothing about the provider
+        health = self.health(provider)
+        with self._lock:
+            if error is None and result is not None:
+                health.record_success(time.time() - started)
+            else:
+                health.record_failure(error)
+        if error is not None:
+            logging.warning(f"Provider {provider} failed: {str(error)}")
+
+    def call(self, candidates, fn, cancel_token=None, hedge=False):
+        """Run fn(service, cancel_token) on the best provider, failing over in rank order.
+
+        Returns (provider, result); result is None if every provider failed. The last error
+        is re-raised when no provider produced a result.
+        """
+        if hedge and len(candidates) > 1:
+            return self._call_hedged(candidates, fn, cancel_token)
+
+        last_error = None
+        for provider, service in candidates:
+            if cancel_token is not None and cancel_token.cancelled:
+                break
+            started = time.time()
+            try:
+                result = fn(service, cancel_token)
+                error = None
+            except Exception as e:
+                result, error = None, e
+                last_error = e
+            self.record(provider, started, result, error, cancel_token)
+            if result is not None:
+                return provider, result
+        if last_error is not None:
+            raise last_error
+        return None, None
+
+    def _call_hedged(self, candidates, fn, cancel_token):
+        results = queue.Queue()
+        tokens = []
+        remaining = list(candidates)
+        last_error = None
+
+        def launch():
+            provider, service = remaining.pop(0)
+            token = CancelToken()
+            tokens.append(token)
+            started = time.time()
+
+            def attempt():
+                try:
+                    results.put((provider, started, fn(service, token), None, token))
+                except Exception as e:
+                    results.put((provider, started, None, e, token))
+
+            self._executor.submit(attempt)
+
+        def cancel_all():
+            for token in tokens:
+                token.cancel()
+
+        if cancel_token is not None:
+            cancel_token.on_cancel(cancel_all)
+
+        launch()
+        pending = 1
+        try:
+            while pending:
+                try:
+                    # Wait for the in-flight call, but start the next provider if it is slow
+                    provider, started, result, error, token = results.get(
+                        timeout=self.hedge_delay if remaining and pending < 2 else None)
+                except queue.Empty:
+                    logging.info(f"Hedging slow preview with {remaining[0][0]}")
+                    launch()
+                    pending += 1
+                    continue
+
+                pending -= 1
+                self.record(provider, started, result, error, token)
+                if result is not None and not token.cancelled:
+                    return provider, result
+                last_error = error or last_error
+                if remaining and not (cancel_token is not None and cancel_token.cancelled):
+                    launch()
+                    pending += 1
+        finally:
+            # Abort whichever call lost the race
+            cancel_all()
+
+        if last_error is not None:
+            raise last_error
+        return None, None
+
+    async def call_async(self, candidates, fn, hedge=False):
+        """Awaitable variant of call: fn(service) returns a coroutine.
+
+        A hedged call starts the next provider once the first has run hedge_delay seconds;
+        the losing call is cancelled, as is everything in flight if the caller is cancelled.
+        """
+        remaining = list(candidates)
+        pending = {}
+        last_error = None
+        launch = True
+        try:
+            while True:
+                if launch and remaining:
+                    provider, service = remaining.pop(0)
+                    pending[asyncio.ensure_future(fn(service))] = (provider, time.time())
+                launch = False
+                if not pending:
+                    break
+                timeout = self.hedge_delay if hedge and remaining and len(pending) < 2 else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logging.info(f"Hedging slow preview with {remaining[0][0]}")
+                    launch = True
+                    continue
+                for task in done:
+                    provider, started = pending.pop(task)
+                    error = task.exception()
+                    result = task.result() if error is None else None
+                    self.record(provider, started, result, error, None)
+                    if result is not None:
+                        return provider, result
+                    last_error = error or last_error
+                    launch = True
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if last_error is not None:
+            raise last_error
+        return None, None
+
+    def stats(self):
+        with self._lock:
+            return {provider: health.snapshot() for provider, health in self._health.items()}
+
+
+class RoutedService:
+    """Stands in for a GeminiService, sending each call through the router"""
+
+    def __init__(self, router, config, provider, registry=None):
+        self.router = router
+        self.config = config
+        self.provider = provider
+        self.registry = registry or router.registry
+        self.primary = self.registry.get(*get_provider_credentials(config, provider))
+        self.api_url = self.primary.api_url
+
+    def candidates(self):
+        return self.router.candidates(self.config, self.provider, self.registry)
+
+    def fallback(self, prompt, error):
+        logging.error(f"All providers failed: {str(error)}")
+        fallback = self.primary.get_fallback_app_structure(prompt)
+        if is_rate_limit_error(error):
+            fallback['rate_limit_hit'] = True
+            fallback['error_message'] = f"API rate limit exceeded: {str(error)}"
+        return fallback
+
+    def generate_android_app(self, prompt, image_path=None, preview_only=False, cancel_token=None,
+                             use_fallback=True):
+        try:
+            provider, app_structure = self.router.call(
+                self.candidates(),
+                lambda service, token: service.generate_android_app(
+                    prompt, image_path, preview_only=preview_only, cancel_token=token, use_fallback=False),
+                cancel_token=cancel_token,
+                hedge=preview_only and self.router.hedge_previews)
+        except Exception as e:
+            if not use_fallback:
+                raise
+            return self.fallback(prompt, e)
+
+        if provider and provider != self.provider:
+            logging.info(f"Request served by {provider} instead of {self.provider}")
+        return app_structure
+
+    def edit_android_app(self, previous_structure, previous_prompt, prompt, preview_only=False, cancel_token=None):
+        provider, result = self.router.call(
+            self.candidates(),
+            lambda service, token: service.edit_android_app(previous_structure, previous_prompt, prompt,
+                                                            preview_only=preview_only, cancel_token=token),
+            cancel_token=cancel_token)
+        if provider and provider != self.provider:
+            logging.info(f"Edit served by {provider} instead of {self.provider}")
+        return result or (None, [])
+
+    def stream_android_app(self, prompt, image_path=None):
+        """Stream from the best provider; fail over only while nothing has been sent yet"""
+        last_error = None
+        for provider, service in self.candidates():
+            started = time.time()
+            events = service.stream_android_app(prompt, image_path)
+            sent = False
+            try:
+                for event in events:
+                    if event[0] == 'error' and not sent:
+                        last_error = event
+                        break
+                    if event[0] == 'done':
+                        self.router.record(provider, started, event[1], None, None)
+                    elif event[0] == 'error':
+                        self.router.record(provider, started, None, RuntimeError(event[1]), None)
+                    sent = True
+                    yield event
+            finally:
+                events.close()
+            if sent:
+                return
+            self.router.record(provider, started, None, RuntimeError(last_error[1]), None)
+        if last_error is not None:
+            yield last_error
+
+    def test_connection(self):
+        return self.primary.test_connection()
+
+    def get_fallback_app_structure(self, prompt):
+        return self.primary.get_fallback_app_structure(prompt)
+
+
+class AsyncRoutedService(RoutedService):
+    """Stands in for an AsyncGeminiService; generation is routed on the event loop"""
+
+    async def generate_android_app_async(self, prompt, image_path=None, preview_only=False, use_fallback=True):
+        try:
+            provider, app_structure = await self.router.call_async(
+                self.candidates(),
+                lambda service: service.generate_android_app_async(prompt, image_path, preview_only=preview_only,
+                                                                   use_fallback=False),
+                hedge=preview_only and self.router.hedge_previews)
+        except Exception as e:
+            if not use_fallback:
+                raise
+            return self.fallback(prompt, e)
+
+        if provider and provider != self.provider:
+            logging.info(f"Request served by {provider} instead of {self.provider}")
+        return app_structure
+
+    async def test_connection_async(self):
+        return await self.primary.test_connection_async()
@@ -0,0 +1,199 @@
+import time
+import asyncio
+import random
+import hashlib
+import logging
+import threading
+from provider_errors import ProviderError
+
+# Rough prompt size in tokens when the provider does not report usage (~4 characters per token)
+CHARS_PER_TOKEN = 4
+# Output assumed for a call without an explicit max_tokens
+DEFAULT_OUTPUT_TOKENS = 2000
+
+
+def estimate_tokens(prompt, max_tokens=None):
+    """Estimate the tokens a call will consume: prompt plus the most output it may produce"""
+    return len(prompt) // CHARS_PER_TOKEN + (max_tokens or DEFAULT_OUTPUT_TOKENS)
+
+
+def parse_rate_limits(value):
+    """Parse "groq=30:6000,gemini=15" into {provider: (requests_per_minute, tokens_per_minute)}.
+
+    A missing token limit means unlimited (0); malformed entries raise ValueError.
+    """
+    limits = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        name, separator, spec = item.partition('=')
+        parts = spec.split(':')
+        try:
+            if not separator or not name.strip() or len(parts) > 2:
+                raise ValueError
+            numbers = [int(part) if part.strip() else 0 for part in parts]
+            if any(number < 0 for number in numbers):
+                raise ValueError
+        except ValueError:
+            raise ValueError(f"Invalid RATE_LIMITS entry {item.strip()!r}; expected provider=requests_per_minute"
+                             f"[:tokens_per_minute], e.g. groq=30:6000") from None
+        limits[name.strip()] = (numbers[0], numbers[1] if len(numbers) > 1 else 0)
+    return limits
+
+
+class RateLimitExceeded(ProviderError):
+    """Raised before calling a provider when the request would exceed its limits"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message, status_code=429, retry_after=retry_after)
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at rate_per_minute"""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount tokens are available (0 if they are now)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class _KeyState:
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self.admitted = 0
+        self.rejected = 0
+
+
+class RateLimiter:
+    """Per-provider, per-API-key request and token budgets with Retry-After-aware backoff.
+
+    acquire() is the admission check made before every provider call: it waits up to
+    max_wait seconds for budget, or raises RateLimitExceeded (a 429 ProviderError, so the
+    provider router fails over) without spending provider quota on a doomed request.
+    """
+
+    def __init__(self, limits=None, max_wait=10.0, backoff_base=1.0, backoff_cap=60.0):
+        self.limits = limits or {}  # provider -> (requests per minute, tokens per minute)
+        self.max_wait = max_wait
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def _state(self, provider, api_key):
+        key = (provider, hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:12])
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _KeyState(*self.limits.get(provider, (0, 0)))
+        return state
+
+    def _reserve(self, provider, api_key, tokens, deadline):
+        """Take budget and return 0, or return how long to wait; raises if that passes the deadline"""
+        with self._lock:
+            state = self._state(provider, api_key)
+            now = time.monotonic()
+            wait = max(
+                state.blocked_until - now,
+                state.requests.wait_time(1, now) if state.requests else 0.0,
+                state.tokens.wait_time(tokens, now) if state.tokens else 0.0,
+            )
+            if wait <= 0:
+                if state.requests:
+                    state.requests.take(1, now)
+                if state.tokens and tokens:
+                    state.tokens.take(tokens, now)
+                state.admitted += 1
+                return 0.0
+            if now + wait > deadline:
+                state.rejected += 1
+                raise RateLimitExceeded(f"{provider} request rejected: rate limit budget exhausted, "
+                                        f"retry in {wait:.1f}s", retry_after=wait)
+            return wait
+
+    def acquire(self, provider, api_key, tokens=0, max_wait=None):
+        """Reserve one request and an estimated token count, waiting for budget if allowed"""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self._reserve(provider, api_key, tokens, deadline)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, provider, api_key, tokens=0, max_wait=None):
+        """Like acquire, but waits on the event loop instead of blocking the thread"""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self._reserve(provider, api_key, tokens, deadline)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def settle(self, provider, api_key, estimated, actual):
+        """Correct the token budget once the provider reports the real usage"""
+        if actual is None:
+            return
+        with self._lock:
+            state = self._state(provider, api_key)
+            if not state.tokens:
+                return
+            if actual < estimated:
+                state.tokens.give_back(estimated - actual)
+            else:
+                state.tokens.tokens -= actual - estimated
+
+    def backoff(self, provider, api_key, attempt, retry_after=None):
+        """Block the key after a 429 and return the delay chosen.
+
+        Honours Retry-After when the provider sent one; otherwise exponential backoff with
+        full jitter so many clients do not retry in lockstep.
+        """
+        if retry_after:
+            delay = retry_after + random.uniform(0, min(1.0, retry_after * 0.1))
+        else:
+            delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        with self._lock:
+            state = self._state(provider, api_key)
+            state.blocked_until = max(state.blocked_until, time.monotonic() + delay)
+            state.throttled += 1
+        logging.warning(f"{provider} rate limited; backing off {delay:.1f}s")
+        return delay
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                f"{provider}:{key_hash}": {
+                    'admitted': state.admitted,
+                    'rejected': state.rejected,
+                    'throttled': state.throttled,
+                    'blocked_for': max(0.0, round(state.blocked_until - now, 1)),
+                    'requests_available': round(state.requests.tokens, 1) if state.requests else None,
+                    'tokens_available': round(state.tokens.tokens) if state.tokens else None,
+                }
+                for (provider, key_hash), state in self._states.items()
+            }
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import threading
+
+
+class Superseded(Exception):
+    """Raised when a request was cancelled because a newer one replaced it"""
+
+
+class CancelToken:
+    """Thread-safe cancellation flag with callbacks"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        """Cancel the token and run registered callbacks once"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Cancel callback failed: {str(e)}")
+
+    def on_cancel(self, callback):
+        """Register a callback; runs immediately if the token is already cancelled"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def wait(self, timeout=None):
+        return self._event.wait(timeout)
+
+
+class SessionRequestTracker:
+    """Remember the latest request per session and cancel the one it supersedes"""
+
+    def __init__(self):
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def begin(self, session_key):
+        """Start a request for a session, cancelling any request still in flight for it"""
+        token = CancelToken()
+        with self._lock:
+            previous = self._active.get(session_key)
+            self._active[session_key] = token
+        if previous is not None:
+            logging.info(f"Superseding in-flight request for session {session_key[:8]}")
+            previous.cancel()
+        return token
+
+    def end(self, session_key, token):
+        """Forget a finished request unless a newer one already replaced it"""
+        with self._lock:
+            if self._active.get(session_key) is token:
+                del self._active[session_key]
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.token = CancelToken()
+        self.waiters = 0
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse identical concurrent calls into one upstream call whose result every caller shares.
+
+    The shared call is only cancelled once every caller waiting on it has been cancelled.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, cancel_token=None):
+        """Run fn(flight_token) for key, or wait for the identical call already in flight"""
+        with self._lock:
+            flight = self._flights.get(key)
+            # A flight every caller abandoned is still winding down; start a fresh one
+            leader = flight is None or flight.token.cancelled
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+            flight.waiters += 1
+
+        if cancel_token is not None:
+            cancel_token.on_cancel(lambda: self._leave(flight))
+
+        if leader:
+            try:
+                flight.result = fn(flight.token)
+            except Exception as e:
+                flight.error = e
+            finally:
+                with self._lock:
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+                flight.done.set()
+        else:
+            logging.debug(f"Joining in-flight call {key[:12]}")
+            while not flight.done.wait(0.1):
+                if cancel_token is not None and cancel_token.cancelled:
+                    break
+
+        if cancel_token is not None and cancel_token.cancelled:
+            raise Superseded()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def _leave(self, flight):
+        with self._lock:
+            flight.waiters -= 1
+            abandoned = flight.waiters <= 0
+        if abandoned:
+            flight.token.cancel()
+
+
+class _AsyncFlight:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+        self.abandoned = False
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines on one event loop.
+
+    The shared call runs as its own task, which is only cancelled once every caller
+    awaiting it has been cancelled.
+    """
+
+    def __init__(self):
+        self._flights = {}
+
+    async def do(self, key, coro_fn):
+        """Await coro_fn() for key, or join the identical call already in flight"""
+        flight = self._flights.get(key)
+        # A flight every caller abandoned is still winding down; start a fresh one
+        if flight is None or flight.abandoned:
+            flight = _AsyncFlight(asyncio.ensure_future(coro_fn()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            logging.debug(f"Joining in-flight call {key[:12]}")
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1:
+                flight.abandoned = True
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _forget(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
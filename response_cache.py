@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from sqlite_util import connect
+
+
+def make_cache_key(*parts):
+    """Build a content-addressed cache key from strings/bytes parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if part is None:
+            part = b''
+        elif isinstance(part, str):
+            part = part.encode('utf-8')
+        # Length-prefix each part so ("ab", "c") and ("a", "bc") never collide
+        digest.update(str(len(part)).encode('ascii') + b':')
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Two-tier (in-process LRU + SQLite on disk) cache for provider responses"""
+
+    def __init__(self, db_path=None, max_memory_entries=256, max_disk_bytes=256 * 1024 * 1024,
+                 ttl_seconds=7 * 24 * 3600):
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if self.db_path:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            with connect(self.db_path, wal=True) as conn:
+                conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )""")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+
+    def _expired(self, created_at):
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if not self._expired(created_at):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(value)
+                del self._memory[key]
+
+        value = self._disk_get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, value[0], value[1])
+        return json.loads(value[1])
+
+    def set(self, key, value):
+        """Store a JSON-serializable value under key in both tiers"""
+        try:
+            serialized = json.dumps(value)
+        except (TypeError, ValueError) as e:
+            logging.warning(f"Response not cacheable: {str(e)}")
+            return
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, serialized)
+        self._disk_set(key, serialized, now)
+
+    def _remember(self, key, created_at, serialized):
+        self._memory[key] = (created_at, serialized)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key):
+        if not self.db_path:
+            return None
+        try:
+            with connect(self.db_path, wal=True) as conn:
+                row = conn.execute("SELECT created_at, value FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                if self._expired(row[0]):
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    return None
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                return row
+        except sqlite3.Error as e:
+            logging.error(f"Response cache read failed: {str(e)}")
+            return None
+
+    def _disk_set(self, key, serialized, now):
+        if not self.db_path:
+            return
+        try:
+            with connect(self.db_path, wal=True) as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, serialized, len(serialized), now, now))
+                self._evict(conn)
+        except sqlite3.Error as e:
+            logging.error(f"Response cache write failed: {str(e)}")
+
+    def _evict(self, conn):
+        """Drop expired rows, then least recently used rows until under the size budget"""
+        if self.ttl_seconds is not None:
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        if self.max_disk_bytes is None:
+            return
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        rows = conn.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC").fetchall()
+        stale = []
+        for key, size in rows:
+            if total <= self.max_disk_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def clear(self):
+        """Remove every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+        if self.db_path:
+            with connect(self.db_path, wal=True) as conn:
+                conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        """Return hit/miss counters for monitoring"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'memory_entries': len(self._memory)}
@@ -0,0 +1,264 @@
+import re
+import json
+import logging
+
+# Dotted paths checked in a full app structure; optional ones are only type-checked when present
+APP_STRUCTURE_SCHEMA = {
+    'app_name': str,
+    'package_name': str,
+    'description': str,
+    'main_activity': dict,
+    'main_activity.java_code': str,
+    'main_activity.xml_layout': str,
+    'additional_activities': list,
+    'styles': str,
+    'colors': str,
+    'strings': str,
+    'manifest': str,
+    'gradle': str,
+    'ui_components': list,
+}
+APP_STRUCTURE_OPTIONAL = ('description', 'additional_activities', 'gradle')
+
+PREVIEW_SCHEMA = {
+    'app_name': str,
+    'ui_components': list,
+}
+
+# Shape of each top-level field, used when asking a provider for just the missing ones
+APP_STRUCTURE_EXAMPLE = {
+    "app_name": "App Name",
+    "package_name": "com.example.appname",
+    "description": "Brief description of the app",
+    "main_activity": {
+        "name": "MainActivity",
+        "layout": "activity_main",
+        "java_code": "Complete Java code for MainActivity",
+        "xml_layout": "Complete XML layout code"
+    },
+    "additional_activities": [
+        {
+            "name": "ActivityName",
+            "layout": "layout_name",
+            "java_code": "Complete Java code",
+            "xml_layout": "Complete XML layout code"
+        }
+    ],
+    "styles": "Complete styles.xml content",
+    "colors": "Complete colors.xml content",
+    "strings": "Complete strings.xml content",
+    "manifest": "Complete AndroidManifest.xml content",
+    "gradle": "Complete build.gradle content",
+    "ui_components": [
+        {
+            "type": "Button|TextView|ImageView|etc",
+            "id": "component_id",
+            "text": "display text",
+            "properties": {}
+        }
+    ]
+}
+
+FENCE_PATTERN = re.compile(r"```[a-zA-Z]*\s*\n?")
+VALID_ESCAPES = '"\\/bfnrtu'
+CONTROL_ESCAPES = {'\n': '\\n', '\r': '\\r', '\t': '\\t', '\b': '\\b', '\f': '\\f'}
+
+
+class ParseResult:
+    """Outcome of parsing one provider response.
+
+    data is the parsed dict (None if no JSON object could be recovered); missing lists
+    the schema paths that are absent, empty or cut off; repaired and truncated say what
+    had to be fixed to get there.
+    """
+
+    def __init__(self, data=None, missing=(), repaired=False, truncated=False, incomplete=None):
+        self.data = data
+        self.missing = list(missing)
+        self.repaired = repaired
+        self.truncated = truncated
+        self.incomplete = incomplete
+
+    @property
+    def missing_fields(self):
+        """Top-level fields to re-request, in schema order"""
+        fields = []
+        for path in self.missing:
+            field = path.split('.')[0]
+            if field not in fields:
+                fields.append(field)
+        return fields
+
+
+def strip_fences(text):
+    """Drop markdown code fences so only their contents remain"""
+    return FENCE_PATTERN.sub('', text).replace('```', '')
+
+
+def repair_json(text):
+    """Make a single pass over text from its first '{' and return (json_text, truncated, incomplete_key).
+
+    Fixes trailing commas, raw control characters and invalid escapes inside strings,
+    and ignores anything after the document closes. A truncated document is closed at
+    the end, or cut back to its last complete member if closing alone does not parse;
+    incomplete_key is the top-level field that was being written when it was cut off.
+    """
+    start = text.find('{')
+    if start < 0:
+        return None, False, None
+
+    out = []
+    stack = []
+    in_string = False
+    string_is_key = False
+    key_chars = []
+    last_significant = ''
+    top_key = None
+    in_top_value = False
+    safe_point = None  # (length of out, open containers) after the last complete member
+
+    i = start
+    while i < len(text):
+        c = text[i]
+        i += 1
+        if in_string:
+            if c == '\\':
+                if i >= len(text):
+                    break  # Dangling escape at the cut; dropped
+                nxt = text[i]
+                i += 1
+                if nxt in VALID_ESCAPES:
+                    out.append(c + nxt)
+                elif nxt == "'":
+                    out.append("'")
+                else:
+                    out.append('\\\\' + nxt)
+                if string_is_key:
+                    key_chars.append(nxt)
+            elif c == '"':
+                in_string = False
+                out.append(c)
+                last_significant = '"'
+                if len(stack) == 1:
+                    if string_is_key:
+                        top_key = ''.join(key_chars)
+                    else:
+                        in_top_value = False
+            elif c in CONTROL_ESCAPES or ord(c) < 0x20:
+                out.append(CONTROL_ESCAPES.get(c, f'\\u{ord(c):04x}'))
+            else:
+                out.append(c)
+                if string_is_key:
+                    key_chars.append(c)
+            continue
+
+        if c.isspace():
+            out.append(c)
+            continue
+        if c == '"':
+            in_string = True
+            string_is_key = bool(stack) and stack[-1] == '}' and last_significant in '{,'
+            key_chars = []
+            out.append(c)
+            continue
+        if c in '{[':
+            stack.append('}' if c == '{' else ']')
+            out.append(c)
+        elif c in '}]':
+            # Trailing comma before a closing bracket
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ',':
+                out.pop()
+            if not stack or stack[-1] != c:
+                continue  # Stray closer; skip it
+            stack.pop()
+            out.append(c)
+            if not stack:
+                return ''.join(out), False, None
+            if len(stack) == 1:
+                in_top_value = False
+        elif c == ',':
+            if last_significant in '{[,':
+                continue  # Empty member, e.g. a doubled comma
+            safe_point = (len(out), list(stack))
+            out.append(c)
+        else:
+            out.append(c)
+        if c == ':' and len(stack) == 1:
+            in_top_value = True
+        elif c == ',' and len(stack) == 1:
+            in_top_value = False
+        last_significant = c
+
+    # Ran out of text inside the document: close what is open
+    incomplete = top_key if (len(stack) > 1 or in_top_value) else None
+    closed = ''.join(out) + ('"' if in_string else '')
+    closed = closed.rstrip().rstrip(',')
+    candidate = closed + ''.join(reversed(stack))
+    try:
+        json.loads(candidate)
+        return candidate, True, incomplete
+    except ValueError:
+        pass
+    if safe_point is None:
+        return None, True, incomplete
+    length, open_stack = safe_point
+    return ''.join(out[:length]) + ''.join(reversed(open_stack)), True, incomplete
+
+
+def get_path(data, path):
+    for part in path.split('.'):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(part)
+    return data
+
+
+def validate(data, schema, optional=()):
+    """Return the schema paths that are missing, empty or of the wrong type"""
+    missing = []
+    for path, expected in schema.items():
+        value = get_path(data, path)
+        if value is None or value == '':
+            if path not in optional:
+                missing.append(path)
+        elif not isinstance(value, expected):
+            missing.append(path)
+    return missing
+
+
+def parse_response(text, schema=None, optional=()):
+    """Recover a JSON object from a provider response and validate it against schema"""
+    if not text or not text.strip():
+        return ParseResult()
+    text = text.strip()
+    if text.startswith('<'):
+        logging.error(f"Received HTML response instead of JSON: {text[:200]}")
+        return ParseResult()
+
+    try:
+        data = json.loads(text)
+        repaired = truncated = False
+        incomplete = None
+    except ValueError:
+        json_text, truncated, incomplete = repair_json(strip_fences(text))
+        data = None
+        if json_text is not None:
+            try:
+                data = json.loads(json_text)
+            except ValueError as e:
+                logging.error(f"Could not repair JSON response: {str(e)}")
+        repaired = True
+
+    if not isinstance(data, dict):
+        logging.error("Could not find JSON structure in response")
+        logging.error(f"Raw response: {text[:500]}")
+        return ParseResult(repaired=repaired, truncated=truncated)
+
+    if truncated:
+        logging.warning(f"Recovered truncated response; incomplete field: {incomplete}")
+    missing = validate(data, schema, optional) if schema else []
+    if incomplete and schema and not any(path.split('.')[0] == incomplete for path in missing):
+        missing.append(incomplete)
+    return ParseResult(data, missing, repaired, truncated, incomplete)
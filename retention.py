@@ -0,0 +1,281 @@
+import os
+import json
+import time
+import shutil
+import logging
+import argparse
+import threading
+from sqlite_util import connect
+
+
+class AccessTracker:
+    """Remembers when stored items were last used so eviction can be least-recently-used.
+
+    Touches are buffered in memory and written in batches, keeping the request path free
+    of disk writes.
+    """
+
+    def __init__(self, db_path, flush_every=100):
+        self.db_path = db_path
+        self.flush_every = flush_every
+        self._pending = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        with connect(self.db_path) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS access (
+                target TEXT NOT NULL,
+                key TEXT NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (target, key)
+            )""")
+
+    def touch(self, target, key):
+        with self._lock:
+            self._pending[(target, key)] = time.time()
+            flush = len(self._pending) >= self.flush_every
+        if flush:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        with connect(self.db_path) as conn:
+            conn.executemany(
+                "INSERT INTO access (target, key, last_access) VALUES (?, ?, ?) "
+                "ON CONFLICT(target, key) DO UPDATE SET last_access = MAX(last_access, excluded.last_access)",
+                [(target, key, last_access) for (target, key), last_access in pending.items()])
+
+    def last_access(self, target):
+        """Return {key: last access time} for a target"""
+        self.flush()
+        with connect(self.db_path) as conn:
+            return dict(conn.execute("SELECT key, last_access FROM access WHERE target = ?", (target,)))
+
+    def forget(self, target, keys):
+        with connect(self.db_path) as conn:
+            conn.executemany("DELETE FROM access WHERE target = ? AND key = ?", [(target, key) for key in keys])
+
+
+class FolderTarget:
+    """Every top-level file or directory in a folder is one item"""
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+
+    def _measure(self, entry):
+        """Return (size, mtime) of an item; a directory's mtime is the newest of everything in it.
+
+        Directories are walked on every sweep: editing a project rewrites nested files without
+        touching the top-level directory, so nothing cheaper tells whether its size changed.
+        """
+        stat = entry.stat(follow_symlinks=False)
+        if not entry.is_dir(follow_symlinks=False):
+            return stat.st_size, stat.st_mtime
+        size, mtime = 0, stat.st_mtime
+        for current, dirs, files in os.walk(entry.path):
+            for name in files:
+                try:
+                    file_stat = os.lstat(os.path.join(current, name))
+                except OSError:
+                    continue
+                size += file_stat.st_size
+                mtime = max(mtime, file_stat.st_mtime)
+        return size, mtime
+
+    def iter_items(self):
+        """Yield (key, size, mtime) for each item; dotfiles such as .gitkeep are not items"""
+        if not os.path.isdir(self.path):
+            return
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    size, mtime = self._measure(entry)
+                except OSError:
+                    continue
+                yield entry.name, size, mtime
+
+    def delete(self, key):
+        path = os.path.join(self.path, key)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.unlink(path)
+
+    def finish(self, removed):
+        pass
+
+
+class BlobStoreTarget:
+    """Each project manifest in a BlobStore is one item.
+
+    Sizes are logical (sum of the project's files), so blobs shared between projects are
+    counted once per project. Unreferenced blobs are collected after each sweep that
+    removed manifests.
+    """
+
+    def __init__(self, name, store, gc_grace=3600):
+        self.name = name
+        self.store = store
+        self.gc_grace = gc_grace
+
+    def iter_items(self):
+        for project_id in self.store.project_ids():
+            manifest = self.store.read_manifest(project_id)
+            if manifest:
+                size = sum(entry['size'] for entry in manifest['files'].values())
+                yield project_id, size, manifest['created_at']
+
+    def delete(self, key):
+        self.store.delete_manifest(key)
+
+    def finish(self, removed):
+        if removed:
+            self.store.gc(self.gc_grace)
+
+
+class RetentionSweeper:
+    """Deletes items past their TTL, then least-recently-used items until each target fits its quota.
+
+    Each pass removes at most batch_size items per target, so a large backlog is worked
+    through over several passes instead of one long blocking sweep.
+    """
+
+    def __init__(self, tracker, interval=600, batch_size=200):
+        self.tracker = tracker
+        self.interval = interval
+        self.batch_size = batch_size
+        self._targets = []
+        self._metrics = {}
+        self._on_remove = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, target, ttl_seconds=0, max_bytes=0, on_remove=None):
+        """Register a target; a TTL or quota of 0 disables that limit.
+
+        on_remove, if given, is called with the keys removed by each sweep.
+        """
+        self._targets.append((target, ttl_seconds, max_bytes))
+        if on_remove is not None:
+            self._on_remove[target.name] = on_remove
+        self._metrics[target.name] = {
+            'ttl_seconds': ttl_seconds,
+            'max_bytes': max_bytes,
+            'items': 0,
+            'bytes': 0,
+            'removed_items': 0,
+            'reclaimed_bytes': 0,
+            'sweeps': 0,
+            'last_sweep_at': None,
+            'last_sweep_seconds': None,
+        }
+
+    def touch(self, target_name, key):
+        self.tracker.touch(target_name, key)
+
+    def sweep_once(self, dry_run=False, batch_size=None):
+        """Run one pass over every target and return what was (or would be) removed per target"""
+        results = {}
+        for target, ttl_seconds, max_bytes in self._targets:
+            try:
+                results[target.name] = self._sweep_target(target, ttl_seconds, max_bytes, dry_run,
+                                                          batch_size if batch_size is not None else self.batch_size)
+            except Exception as e:
+                logging.error(f"Retention sweep of {target.name} failed: {str(e)}")
+                results[target.name] = {'error': str(e)}
+        return results
+
+    def _sweep_target(self, target, ttl_seconds, max_bytes, dry_run, batch_size):
+        started = time.time()
+        access = self.tracker.last_access(target.name)
+        items = sorted((max(mtime, access.get(key, 0)), key, size) for key, size, mtime in target.iter_items())
+        total = sum(size for _, _, size in items)
+
+        # Oldest first: once an item is neither expired nor needed to get under quota, none after it are
+        victims = []
+        for last_used, key, size in items:
+            if batch_size and len(victims) >= batch_size:
+                break
+            expired = ttl_seconds and started - last_used > ttl_seconds
+            over_quota = max_bytes and total > max_bytes
+            if not expired and not over_quota:
+                break
+            victims.append((key, size))
+            total -= size
+
+        removed = []
+        reclaimed = 0
+        if not dry_run:
+            for key, size in victims:
+                try:
+                    target.delete(key)
+                except OSError as e:
+                    logging.warning(f"Could not remove {target.name}/{key}: {str(e)}")
+                    continue
+                removed.append(key)
+                reclaimed += size
+            if removed:
+                self.tracker.forget(target.name, removed)
+                if target.name in self._on_remove:
+                    self._on_remove[target.name](removed)
+            target.finish(len(removed))
+
+        with self._lock:
+            metrics = self._metrics[target.name]
+            metrics['items'] = len(items) - len(removed)
+            metrics['bytes'] = sum(size for _, _, size in items) - reclaimed
+            metrics['removed_items'] += len(removed)
+            metrics['reclaimed_bytes'] += reclaimed
+            metrics['sweeps'] += 1
+            metrics['last_sweep_at'] = started
+            metrics['last_sweep_seconds'] = round(time.time() - started, 3)
+
+        if removed:
+            logging.info(f"Retention removed {len(removed)} items ({reclaimed} bytes) from {target.name}")
+        return {
+            'scanned': len(items),
+            'removed': len(removed) if not dry_run else 0,
+            'reclaimed_bytes': reclaimed,
+            'candidates': [key for key, _ in victims] if dry_run else [],
+        }
+
+    def stats(self):
+        with self._lock:
+            return {name: dict(metrics) for name, metrics in self._metrics.items()}
+
+    def start(self):
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='retention-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sweep_once()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Remove expired and over-quota uploads and generated projects')
+    parser.add_argument('--dry-run', action='store_true', help='list what would be removed without deleting')
+    parser.add_argument('--batch-size', type=int, default=0, help='max items removed per target (0 = no limit)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    from app import app
+    from routes import retention_sweeper
+    print(json.dumps(retention_sweeper.sweep_once(dry_run=args.dry_run, batch_size=args.batch_size), indent=2))
@@ -1,44 +1,346 @@
 import os
 import json
 import uuid
-import zipfile
 import shutil
-from flask import render_template, request, jsonify, flash, redirect, url_for, send_file
+from datetime import datetime
+from flask import render_template, request, jsonify, flash, redirect, url_for, send_file, Response, stream_with_context, session
 from werkzeug.utils import secure_filename
 from app import app
 from gemini_service import GeminiService
+from service_registry import ServiceRegistry, SUPPORTED_PROVIDERS
+from provider_router import ProviderRouter, RoutedService
+from rate_limiter import RateLimiter
+from prompt_builder import PromptBuilder
 from android_generator import AndroidGenerator
+from response_cache import ResponseCache
+from http_pool import SessionPool
+from job_queue import JobQueue, JobWorkerPool, SUCCEEDED, FAILED
+from request_coalescer import SessionRequestTracker, SingleFlight, Superseded
+from response_cache import make_cache_key
+from image_processing import ImageIndex, max_dimension_for
+from zip_stream import ZipCache, iter_zip_tree
+from project_tree import DirectorySink, MemorySink
+from blob_store import BlobStore, BlobStoreSink
+from config_store import ConfigStore
+from edit_sessions import EditSessionStore
+from project_catalog import ProjectCatalog, MAX_PAGE_SIZE
+from batch_generation import BatchGenerator, BatchStore, build_batch_tree
+from retention import AccessTracker, RetentionSweeper, FolderTarget, BlobStoreTarget
 # Assuming you have other service classes like LlamaService, etc.
 # from llama_service import LlamaService 
 
-# Initialize services
-gemini_service = GeminiService()
-android_generator = AndroidGenerator()
-# ai_service = None # Will be initialized based on provider
+# Shared across requests so repeated prompts skip the provider round-trip
+response_cache = ResponseCache(
+    db_path=os.path.join(app.config['CACHE_FOLDER'], 'responses.db'),
+    max_memory_entries=app.config['RESPONSE_CACHE_MEMORY_ENTRIES'],
+    max_disk_bytes=app.config['RESPONSE_CACHE_MAX_BYTES'],
+    ttl_seconds=app.config['RESPONSE_CACHE_TTL']
+)
+
+# Keep-alive connections to each provider, reused by every service instance
+session_pool = SessionPool(
+    pool_size=app.config['HTTP_POOL_SIZE'],
+    connect_timeout=app.config['HTTP_CONNECT_TIMEOUT'],
+    read_timeout=app.config['HTTP_READ_TIMEOUT']
+)
+
+# Request/token budgets and 429 backoff shared by every provider client
+rate_limiter = RateLimiter(limits=app.config['RATE_LIMITS'], max_wait=app.config['RATE_LIMIT_MAX_WAIT'])
+
+# Static instructions first, per-request text trimmed to the input budget
+prompt_builder = PromptBuilder(input_budget=app.config['PROMPT_INPUT_BUDGET'])
+
+def create_ai_service():
+    """Build a provider service wired to the shared cache, connection pool and rate limiter"""
+    return GeminiService(cache=response_cache, session_pool=session_pool,
+                         single_pass_images=app.config['IMAGE_SINGLE_PASS'],
+                         rate_limiter=rate_limiter, max_retries=app.config['PROVIDER_MAX_RETRIES'],
+                         pipeline_workers=app.config['PIPELINE_WORKERS'] if app.config['GENERATION_PIPELINE'] else 0,
+                         prompt_builder=prompt_builder)
+
+# One configured client per (provider, key, url), shared by every request
+ai_services = ServiceRegistry(create_ai_service)
+provider_router = ProviderRouter(ai_services, providers=app.config['ROUTING_PROVIDERS'],
+                                 hedge_previews=app.config['HEDGE_PREVIEWS'],
+                                 hedge_delay=app.config['HEDGE_DELAY'])
+
+def resolve_ai_service(config, provider=None):
+    """Return (provider, api_key, service) for a request, routed across providers when enabled"""
+    if app.config['PROVIDER_ROUTING']:
+        return provider_router.for_config(config, provider)
+    return ai_services.for_config(config, provider)
+
+def create_project_sink():
+    """Pick the storage backend for generated projects"""
+    if app.config['PROJECT_BACKEND'] == 'memory':
+        return MemorySink(max_projects=app.config['MEMORY_PROJECTS_MAX'])
+    if app.config['PROJECT_BACKEND'] == 'blobstore':
+        return BlobStoreSink(BlobStore(app.config['BLOB_STORE_FOLDER']))
+    return DirectorySink(app.config['GENERATED_PROJECTS_FOLDER'])
+
+project_sink = create_project_sink()
+# Metadata of every generated project, so listing and search never walk the project folders
+project_catalog = ProjectCatalog(os.path.join(app.config['CACHE_FOLDER'], 'projects.db'))
+# Boilerplate shared by every project is stored once under cache/skeleton and hardlinked
+android_generator = AndroidGenerator(sink=project_sink,
+                                     skeleton_folder=os.path.join(app.config['CACHE_FOLDER'], 'skeleton'),
+                                     catalog=project_catalog)
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def load_config():
-    """Load configuration from config.json"""
+# Parsed once and reloaded only when config.json changes on disk
+config_store = ConfigStore(app.config['CONFIG_FILE'])
+
+def sse_event(event, data):
+    """Format a server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def build_generation_result(ai_service, prompt, image_path, report_progress=None):
+    """Generate the app structure, write the project and render its preview"""
+    report_progress = report_progress or (lambda progress, message='': None)
+
+    report_progress(0.1, 'Generating app structure')
+    app_structure = ai_service.generate_android_app(prompt, image_path)
+    return complete_generation_result(app_structure, report_progress, prompt, ai_service.provider)
+
+def complete_generation_result(app_structure, report_progress=None, prompt=None, provider=None):
+    """Write the project for a generated app structure and render its preview"""
+    report_progress = report_progress or (lambda progress, message='': None)
+    if not app_structure:
+        app.logger.error("generate_android_app returned None")
+        return {'success': False, 'message': 'Failed to generate Android app structure. Please try again or check your API configuration.'}
+
+    # Create Android files
+    report_progress(0.7, 'Writing project files')
+    project_id = str(uuid.uuid4())
+    android_generator.create_android_project(app_structure, project_id, prompt=prompt, provider=provider)
+
+    # Generate preview HTML
+    report_progress(0.9, 'Rendering preview')
+    preview_html = android_generator.generate_preview_html(app_structure)
+
+    return {
+        'success': True,
+        'message': 'Android app generated successfully',
+        'project_id': project_id,
+        'preview_html': preview_html,
+        'app_structure': app_structure
+    }
+
+# Last generated app of each browser session, so a prompt edit patches it instead of starting over
+edit_sessions = EditSessionStore(os.path.join(app.config['CACHE_FOLDER'], 'edit_sessions.db'),
+                                 ttl_seconds=app.config['EDIT_SESSION_TTL'])
+
+def find_edit_base(session_key, image_path, require_project=True):
+    """Return the session's previous generation if an edit of the prompt can patch it, else None"""
+    edit = edit_sessions.get(session_key)
+    if edit is None or edit['image_path'] != image_path:
+        return None
+    if require_project and not project_sink.exists(edit['project_id']):
+        return None
+    return edit
+
+def remember_generation(session_key, prompt, image_path, result):
+    """Keep a successful generation as the base for the session's next edit"""
+    app_structure = result.get('app_structure') if result.get('success') else None
+    # Placeholder structures after a provider failure have no code to patch
+    if not app_structure or 'main_activity' not in app_structure or app_structure.get('rate_limit_hit'):
+        return
+    edit_sessions.save(session_key, result['project_id'], prompt, image_path, app_structure)
+
+def build_edit_result(ai_service, edit, prompt, report_progress=None):
+    """Patch the previous app for an edited prompt and rewrite only the files that change.
+
+    Returns None when the edit could not be applied, so the caller regenerates from scratch.
+    """
+    report_progress = report_progress or (lambda progress, message='': None)
+
+    report_progress(0.1, 'Updating app structure')
     try:
-        with open('config.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
+        app_structure, changed_fields = ai_service.edit_android_app(edit['app_structure'], edit['prompt'], prompt)
+    except Exception as e:
+        app.logger.error(f"Error editing app, regenerating instead: {str(e)}")
+        return None
+    if not app_structure:
+        return None
+
+    report_progress(0.7, 'Updating project files')
+    changed_files = android_generator.update_android_project(app_structure, edit['project_id'], prompt=prompt,
+                                                             provider=ai_service.provider)
+    if changed_files is None:
+        return None
+
+    report_progress(0.9, 'Rendering preview')
+    preview_html = android_generator.generate_preview_html(app_structure)
+
+    return {
+        'success': True,
+        'message': 'Android app updated successfully',
+        'project_id': edit['project_id'],
+        'preview_html': preview_html,
+        'app_structure': app_structure,
+        'changed_fields': changed_fields,
+        'changed_files': changed_files
+    }
+
+def generate_or_edit(ai_service, prompt, image_path, session_key=None, edit=False, report_progress=None):
+    """Patch the session's previous app when an edit is requested, otherwise generate a new one"""
+    result = None
+    base = find_edit_base(session_key, image_path) if edit else None
+    if base is not None:
+        result = build_edit_result(ai_service, base, prompt, report_progress)
+    if result is None:
+        result = build_generation_result(ai_service, prompt, image_path, report_progress)
+    remember_generation(session_key, prompt, image_path, result)
+    return result
+
+def edit_preview_structure(ai_service, edit, prompt, cancel_token=None):
+    """Patch only the previewed fields of the previous app; None if the edit failed or was cancelled"""
+    try:
+        app_structure, _ = ai_service.edit_android_app(edit['app_structure'], edit['prompt'], prompt,
+                                                       preview_only=True, cancel_token=cancel_token)
+    except Exception as e:
+        app.logger.error(f"Error editing preview, regenerating instead: {str(e)}")
+        return None
+    return app_structure
+
+def run_generation_job(payload, report_progress):
+    """Job handler executing a queued /generate_app request"""
+    provider, api_key, ai_service = resolve_ai_service(config_store.load(), payload.get('provider'))
+    if not ai_service:
+        raise RuntimeError(f'No API key configured for {provider}')
+
+    image_path = payload.get('image_path')
+    if image_path and not os.path.exists(image_path):
+        image_path = None
 
-def save_config(config_data):
-    """Save configuration to config.json"""
-    with open('config.json', 'w') as f:
-        json.dump(config_data, f, indent=2)
+    result = generate_or_edit(ai_service, payload['prompt'], image_path, payload.get('session_key'),
+                              payload.get('edit', False), report_progress)
+    if not result['success']:
+        raise RuntimeError(result['message'])
+    return result
+
+# Uploads are downscaled, re-encoded and indexed by perceptual hash
+image_index = ImageIndex(os.path.join(app.config['CACHE_FOLDER'], 'images.db'),
+                         max_distance=app.config['IMAGE_DUPLICATE_MAX_DISTANCE'])
+
+# Optional build-once ZIPs, rebuilt only when a project's contents change
+zip_cache = ZipCache(os.path.join(app.config['CACHE_FOLDER'], 'zips')) if app.config['ZIP_CACHE_ENABLED'] else None
+
+# A new preview from the same browser session aborts the previous one, and identical
+# previews requested concurrently by different sessions share one provider call
+preview_requests = SessionRequestTracker()
+preview_flights = SingleFlight()
+
+def get_session_key():
+    """Return a stable id for the browser session making the request"""
+    if 'client_id' not in session:
+        session['client_id'] = uuid.uuid4().hex
+    return session['client_id']
+
+# Background generation jobs; the queue file can be shared by several web worker processes
+job_queue = JobQueue(os.path.join(app.config['CACHE_FOLDER'], 'jobs.db'),
+                     stale_after=app.config['JOB_STALE_AFTER'])
+# Many prompts per request, spread over every configured provider
+batch_generator = BatchGenerator(build_generation_result, max_concurrency=app.config['BATCH_CONCURRENCY'],
+                                 provider_limits=app.config['JOB_PROVIDER_CONCURRENCY'])
+batch_store = BatchStore(os.path.join(app.config['CACHE_FOLDER'], 'batches'))
+
+def batch_providers(config, provider=None):
+    """Return [(provider, service)] a batch spreads its prompts over, preferred provider first"""
+    if app.config['PROVIDER_ROUTING']:
+        # Each slot prefers its own provider but still fails over through the router
+        return [(name, RoutedService(provider_router, config, name))
+                for name, _ in provider_router.candidates(config, provider)]
+    provider, api_key, service = ai_services.for_config(config, provider)
+    return [(provider, service)] if service else []
+
+def run_batch(prompts, image_path=None, provider=None, max_concurrency=None, report_progress=None):
+    """Generate an app per prompt, store the batch manifest and return the API response"""
+    providers = batch_providers(config_store.load(), provider)
+    if not providers:
+        return {'success': False, 'message': f"No API key configured for {provider or 'the configured provider'}"}
+
+    manifest = batch_generator.run(prompts, providers, image_path, report_progress, max_concurrency)
+    batch_store.save(manifest)
+    # Built without a request so queued batches get the same links
+    urls = app.url_map.bind('')
+    return {
+        'success': True,
+        'message': f"Generated {manifest['succeeded']} of {manifest['unique']} apps",
+        'batch_id': manifest['batch_id'],
+        'manifest_url': urls.build('batch_manifest', {'batch_id': manifest['batch_id']}),
+        'download_url': urls.build('download_batch', {'batch_id': manifest['batch_id']}),
+        'manifest': manifest
+    }
+
+def run_batch_job(payload, report_progress):
+    """Job handler executing a queued /generate_batch request"""
+    image_path = payload.get('image_path')
+    if image_path and not os.path.exists(image_path):
+        image_path = None
+    result = run_batch(payload['prompts'], image_path, payload.get('provider'), report_progress=report_progress)
+    if not result['success']:
+        raise RuntimeError(result['message'])
+    return result
+
+job_workers = JobWorkerPool(job_queue, {'generate_app': run_generation_job, 'generate_batch': run_batch_job},
+                            num_workers=app.config['JOB_WORKERS'],
+                            provider_limits=app.config['JOB_PROVIDER_CONCURRENCY'],
+                            default_limit=app.config['JOB_DEFAULT_CONCURRENCY'])
+
+def create_retention_sweeper():
+    """Expire and cap uploads, generated projects and cached ZIPs"""
+    sweeper = RetentionSweeper(AccessTracker(os.path.join(app.config['CACHE_FOLDER'], 'access.db')),
+                               interval=app.config['RETENTION_SWEEP_INTERVAL'],
+                               batch_size=app.config['RETENTION_BATCH_SIZE'])
+    sweeper.add(FolderTarget('uploads', app.config['UPLOAD_FOLDER']),
+                app.config['UPLOAD_TTL'], app.config['UPLOAD_MAX_BYTES'])
+    # Also covers ZIPs left behind by older versions that wrote them next to the projects
+    sweeper.add(FolderTarget('projects', app.config['GENERATED_PROJECTS_FOLDER']),
+                app.config['PROJECT_TTL'], app.config['PROJECT_MAX_BYTES'], on_remove=project_catalog.remove)
+    if isinstance(project_sink, BlobStoreSink):
+        sweeper.add(BlobStoreTarget('blobstore', project_sink.store),
+                    app.config['PROJECT_TTL'], app.config['PROJECT_MAX_BYTES'], on_remove=project_catalog.remove)
+    sweeper.add(FolderTarget('batches', batch_store.folder), app.config['PROJECT_TTL'], 0)
+    if zip_cache:
+        sweeper.add(FolderTarget('zips', zip_cache.folder),
+                    app.config['ZIP_CACHE_TTL'], app.config['ZIP_CACHE_MAX_BYTES'])
+    return sweeper
+
+retention_sweeper = create_retention_sweeper()
+
+def start_background_workers(reloader=False):
+    """Start the job workers and retention sweeper; called by the server entry points, not on import.
+
+    Under the debug reloader the entry point also runs in the file-watching parent process;
+    only the child that serves requests (WERKZEUG_RUN_MAIN=true) starts them.
+    """
+    if reloader and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return
+    if app.config['JOB_WORKERS'] > 0:
+        job_workers.start()
+    retention_sweeper.start()
+
+def resolve_uploaded_image(uploaded_image):
+    """Return the path of a previously uploaded image, or None if it no longer exists"""
+    if not uploaded_image:
+        return None
+    image_path = os.path.join(app.config['UPLOAD_FOLDER'], uploaded_image)
+    if not os.path.exists(image_path):
+        return None
+    retention_sweeper.touch('uploads', uploaded_image)
+    return image_path
 
 @app.route('/')
 def index():
     """Main page with Android app generator interface"""
-    config = load_config()
+    config = config_store.load()
     api_key_set = bool(config.get('gemini_api_key')) # This might need to be generalized
+    get_session_key()  # Assign the session id up front so concurrent previews share it
     return render_template('index.html', api_key_set=api_key_set)
 
 @app.route('/save_api_key', methods=['POST'])
@@ -53,52 +355,15 @@ def save_api_key():
         if not api_key:
             return jsonify({'success': False, 'message': 'API key cannot be empty'})
 
-        config = load_config()
-        config['ai_provider'] = provider
-        config['api_url'] = api_url
-
-        # Store API key securely, perhaps not directly in config if sensitive
-        if provider == 'gemini':
-            config['gemini_api_key'] = api_key
-        elif provider == 'llama':
-            config['llama_api_key'] = api_key # Example for Llama
-        elif provider == 'groq':
-            config['groq_api_key'] = api_key
-        elif provider == 'ollama':
-            config['ollama_api_key'] = api_key
-        elif provider == 'huggingface':
-            config['huggingface_api_key'] = api_key
-
-        save_config(config)
-
-        # Initialize or update the appropriate AI service
-        # This part needs to be dynamic based on the provider
-        global ai_service # Use global to modify the service instance
-        if provider == 'gemini':
-            ai_service = GeminiService()
-            ai_service.set_api_key(api_key, provider='gemini')
-        elif provider == 'llama':
-            # Assuming LlamaService is available and takes api_key and optional api_url
-            # ai_service = LlamaService(api_key=api_key, api_url=api_url)
-            # For now, we'll just set a placeholder if LlamaService isn't fully integrated yet
-            ai_service = GeminiService() # Placeholder, replace with actual LlamaService initialization
-            ai_service.set_api_key(api_key, provider='llama', api_url=api_url) # Placeholder
-            app.logger.warning("LlamaService not fully implemented yet. Using GeminiService as placeholder.")
-        elif provider == 'groq':
-            # Use GeminiService but configure it for Groq
-            ai_service = GeminiService()
-            ai_service.set_api_key(api_key, provider='groq', api_url=api_url)
-        elif provider == 'ollama':
-            # Use GeminiService but configure it for Ollama
-            ai_service = GeminiService()
-            ai_service.set_api_key(api_key, provider='ollama', api_url=api_url)
-        elif provider == 'huggingface':
-            # Use GeminiService but configure it for HuggingFace
-            ai_service = GeminiService()
-            ai_service.set_api_key(api_key, provider='huggingface', api_url=api_url)
-        else:
+        if provider not in SUPPORTED_PROVIDERS:
             return jsonify({'success': False, 'message': f'Unsupported AI provider: {provider}'})
 
+        # Build the new client before saving so requests switch over to a ready client
+        ai_services.configure(provider, api_key, api_url)
+
+        # Read-modify-write under the store's lock so concurrent saves do not lose updates
+        config_store.update({'ai_provider': provider, 'api_url': api_url, f'{provider}_api_key': api_key})
+
         return jsonify({'success': True, 'message': 'API configuration saved successfully'})
     except Exception as e:
         app.logger.error(f"Error saving API key/config: {str(e)}")
@@ -108,46 +373,9 @@ def save_api_key():
 def test_api_key():
     """Test the configured API key with a simple call"""
     try:
-        config = load_config()
-        provider = config.get('ai_provider', 'gemini')
-        api_url = config.get('api_url', None)
-
-        # Get the appropriate API key based on provider
-        if provider == 'gemini':
-            api_key = config.get('gemini_api_key')
-        elif provider == 'groq':
-            api_key = config.get('groq_api_key')
-        elif provider == 'ollama':
-            api_key = config.get('ollama_api_key')
-        elif provider == 'huggingface':
-            api_key = config.get('huggingface_api_key')
-        else:
-            api_key = config.get('llama_api_key')
-
-        if not api_key and provider not in ['ollama']: # Ollama might not require an API key directly here
-            return jsonify({'success': False, 'message': f'No API key configured for {provider}'})
-
-        # Initialize the correct service based on the provider
-        current_ai_service = None
-        if provider == 'gemini':
-            current_ai_service = GeminiService()
-            current_ai_service.set_api_key(api_key, provider='gemini')
-        elif provider == 'llama':
-            current_ai_service = GeminiService()
-            current_ai_service.set_api_key(api_key, provider='llama', api_url=api_url)
-            app.logger.warning("LlamaService not fully implemented for testing. Using GeminiService as placeholder.")
-        elif provider == 'groq':
-            current_ai_service = GeminiService()
-            current_ai_service.set_api_key(api_key, provider='groq', api_url=api_url)
-        elif provider == 'ollama':
-            current_ai_service = GeminiService()
-            current_ai_service.set_api_key(api_key, provider='ollama', api_url=api_url)
-        elif provider == 'huggingface':
-            current_ai_service = GeminiService()
-            current_ai_service.set_api_key(api_key, provider='huggingface', api_url=api_url)
-
+        provider, api_key, current_ai_service = ai_services.for_config(config_store.load())
         if not current_ai_service:
-            return jsonify({'success': False, 'message': f'AI service not initialized for provider: {provider}'})
+            return jsonify({'success': False, 'message': f'No API key configured for {provider}'})
 
         success, message = current_ai_service.test_connection()
 
@@ -169,16 +397,24 @@ def upload_image():
 
         if file and file.filename and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            # Add unique prefix to avoid conflicts
-            unique_filename = f"{uuid.uuid4().hex}_{filename}"
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-            file.save(file_path)
-
+            provider = config_store.load().get('ai_provider', 'gemini')
+            try:
+                # Downscale for the active provider, re-encode and strip metadata before storing
+                stored = image_index.ingest(file.stream, filename, app.config['UPLOAD_FOLDER'],
+                                            max_dimension=max_dimension_for(provider))
+            except (OSError, SyntaxError) as e:
+                app.logger.error(f"Could not decode uploaded image: {str(e)}")
+                return jsonify({'success': False, 'message': 'Could not read the image. Please upload a valid PNG, JPG, JPEG, GIF, or WEBP file.'})
+
+            retention_sweeper.touch('uploads', stored['filename'])
             return jsonify({
                 'success': True, 
                 'message': 'Image uploaded successfully',
-                'filename': unique_filename,
-                'file_path': file_path
+                'filename': stored['filename'],
+                'file_path': stored['file_path'],
+                'mime_type': stored['mime_type'],
+                'duplicate': stored['duplicate'],
+                'similar_to': stored['similar_to']
             })
         else:
             return jsonify({'success': False, 'message': 'Invalid file type. Please upload PNG, JPG, JPEG, GIF, or WEBP files.'})
@@ -190,23 +426,8 @@ def upload_image():
 def generate_app():
     """Generate Android app based on prompt and optional image"""
     try:
-        config = load_config()
-        provider = config.get('ai_provider', 'gemini')
-        api_url = config.get('api_url', None)
-
-        # Get the appropriate API key based on provider
-        if provider == 'gemini':
-            api_key = config.get('gemini_api_key')
-        elif provider == 'groq':
-            api_key = config.get('groq_api_key')
-        elif provider == 'ollama':
-            api_key = config.get('ollama_api_key')
-        elif provider == 'huggingface':
-            api_key = config.get('huggingface_api_key')
-        else:
-            api_key = config.get('llama_api_key')
-
-        if not api_key and provider not in ['ollama']: # Ollama might not require an API key directly here
+        provider, api_key, current_ai_service = resolve_ai_service(config_store.load())
+        if not current_ai_service:
             return jsonify({'success': False, 'message': f'No API key configured for {provider}'})
 
         prompt = request.form.get('prompt', '').strip()
@@ -214,87 +435,281 @@ def generate_app():
             return jsonify({'success': False, 'message': 'Prompt cannot be empty'})
 
         uploaded_image = request.form.get('uploaded_image')
-        image_path = None
-        if uploaded_image:
-            image_path = os.path.join(app.config['UPLOAD_FOLDER'], uploaded_image)
-            if not os.path.exists(image_path):
-                image_path = None
-
-        # Initialize the correct AI service
-        current_ai_service = None
-        if provider == 'gemini':
-            current_ai_service = GeminiService()
-            current_ai_service.set_api_key(api_key, provider='gemini')
-        elif provider == 'llama':
-            current_ai_service = GeminiService()
-            current_ai_service.set_api_key(api_key, provider='llama', api_url=api_url)
-            app.logger.warning("LlamaService not fully implemented for generation. Using GeminiService as placeholder.")
-        elif provider == 'groq':
-            current_ai_service = GeminiService()
-            current_ai_service.set_api_key(api_key, provider='groq', api_url=api_url)
-        elif provider == 'ollama':
-            current_ai_service = GeminiService()
-            current_ai_service.set_api_key(api_key, provider='ollama', api_url=api_url)
-        elif provider == 'huggingface':
-            current_ai_service = GeminiService()
-            current_ai_service.set_api_key(api_key, provider='huggingface', api_url=api_url)
-
-        if not current_ai_service:
-            return jsonify({'success': False, 'message': f'AI service not initialized for provider: {provider}'})
+        image_path = resolve_uploaded_image(uploaded_image)
+        # edit=1 patches this session's previous app instead of generating a new project
+        edit = request.form.get('edit', '').lower() in ['1', 'true', 'yes']
+        session_key = get_session_key()
+
+        # Queue the work and return immediately when the client asks for a background job
+        if request.form.get('async', '').lower() in ['1', 'true', 'yes']:
+            job_id = job_queue.enqueue('generate_app', {
+                'prompt': prompt,
+                'image_path': image_path,
+                'provider': provider,
+                'session_key': session_key,
+                'edit': edit
+            }, provider=provider)
+            return jsonify({
+                'success': True,
+                'message': 'Generation job queued',
+                'job_id': job_id,
+                'status_url': url_for('job_status', job_id=job_id),
+                'result_url': url_for('job_result', job_id=job_id)
+            }), 202
 
         # Generate Android app structure
         app.logger.info(f"Generating app with provider: {provider}")
-        app_structure = current_ai_service.generate_android_app(prompt, image_path)
-        if not app_structure:
-            app.logger.error("generate_android_app returned None")
-            return jsonify({'success': False, 'message': 'Failed to generate Android app structure. Please try again or check your API configuration.'})
+        return jsonify(generate_or_edit(current_ai_service, prompt, image_path, session_key, edit))
 
-        # Create Android files
-        project_id = str(uuid.uuid4())
-        project_path = android_generator.create_android_project(app_structure, project_id)
+    except Exception as e:
+        app.logger.error(f"Error generating app: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error generating app: {str(e)}'})
 
-        # Generate preview HTML
-        preview_html = android_generator.generate_preview_html(app_structure)
+@app.route('/generate_batch', methods=['POST'])
+def generate_batch():
+    """Generate an app for each prompt of a JSON list and bundle them in one ZIP"""
+    try:
+        data = request.get_json(silent=True) or {}
+        prompts = data.get('prompts')
+        if not isinstance(prompts, list) or not prompts or \
+                not all(isinstance(prompt, str) and prompt.strip() for prompt in prompts):
+            return jsonify({'success': False, 'message': 'prompts must be a non-empty list of prompts'}), 400
+        if len(prompts) > app.config['BATCH_MAX_PROMPTS']:
+            return jsonify({'success': False,
+                            'message': f"A batch can have at most {app.config['BATCH_MAX_PROMPTS']} prompts"}), 400
+
+        image_path = resolve_uploaded_image(data.get('uploaded_image'))
+        provider = data.get('provider')
+
+        if data.get('async'):
+            job_id = job_queue.enqueue('generate_batch', {
+                'prompts': prompts,
+                'image_path': image_path,
+                'provider': provider
+            })
+            return jsonify({
+                'success': True,
+                'message': 'Batch job queued',
+                'job_id': job_id,
+                'status_url': url_for('job_status', job_id=job_id),
+                'result_url': url_for('job_result', job_id=job_id)
+            }), 202
 
-        return jsonify({
-            'success': True,
-            'message': 'Android app generated successfully',
-            'project_id': project_id,
-            'preview_html': preview_html,
-            'app_structure': app_structure
-        })
+        app.logger.info(f"Generating batch of {len(prompts)} prompts")
+        return jsonify(run_batch(prompts, image_path, provider))
 
     except Exception as e:
-        app.logger.error(f"Error generating app: {str(e)}")
-        return jsonify({'success': False, 'message': f'Error generating app: {str(e)}'})
+        app.logger.error(f"Error generating batch: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error generating batch: {str(e)}'})
+
+@app.route('/batches/<batch_id>')
+def batch_manifest(batch_id):
+    """Manifest of a finished batch: one item per prompt with its project and provider"""
+    manifest = batch_store.load(batch_id)
+    if not manifest:
+        return jsonify({'success': False, 'message': 'Batch not found'}), 404
+    return jsonify({'success': True, 'manifest': manifest})
+
+@app.route('/batches/<batch_id>/download')
+def download_batch(batch_id):
+    """Download every project of a batch, plus manifest.json, as one ZIP"""
+    manifest = batch_store.load(batch_id)
+    if not manifest:
+        return jsonify({'success': False, 'message': 'Batch not found'}), 404
+
+    retention_sweeper.touch('batches', f"{batch_id}.json")
+    tree = build_batch_tree(manifest, project_sink.load)
+    zip_filename = f"android_apps_{batch_id}.zip"
+    if zip_cache:
+        zip_path = zip_cache.get_or_build(f"batch-{batch_id}", tree)
+        retention_sweeper.touch('zips', os.path.basename(zip_path))
+        return send_file(zip_path, as_attachment=True, download_name=zip_filename)
+    return Response(stream_with_context(iter_zip_tree(tree)), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="{zip_filename}"'})
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Report status and progress of a background generation job"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+
+    return jsonify({
+        'success': True,
+        'job_id': job['id'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'message': job['message'],
+        'error': job['error'],
+        'result_url': url_for('job_result', job_id=job_id) if job['status'] == SUCCEEDED else None
+    })
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    """Return the result of a finished background generation job"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    if job['status'] == FAILED:
+        return jsonify({'success': False, 'message': f"Error generating app: {job['error']}"})
+    if job['status'] != SUCCEEDED:
+        return jsonify({'success': False, 'status': job['status'], 'message': 'Job has not finished yet'}), 409
+
+    return jsonify(job['result'])
+
+@app.route('/generate_app_stream', methods=['POST'])
+def generate_app_stream():
+    """Generate Android app while streaming partial results to the browser as server-sent events"""
+    provider, api_key, current_ai_service = resolve_ai_service(config_store.load())
+    if not current_ai_service:
+        return jsonify({'success': False, 'message': f'No API key configured for {provider}'})
+
+    prompt = request.form.get('prompt', '').strip()
+    if not prompt:
+        return jsonify({'success': False, 'message': 'Prompt cannot be empty'})
+
+    uploaded_image = request.form.get('uploaded_image')
+    image_path = resolve_uploaded_image(uploaded_image)
+    session_key = get_session_key()
+
+    def event_stream():
+        partial_structure = {}
+        events = current_ai_service.stream_android_app(prompt, image_path)
+        try:
+            for event in events:
+                kind = event[0]
+                if kind == 'field':
+                    _, key, value = event
+                    partial_structure[key] = value
+                    yield sse_event('field', {'key': key, 'value': value})
+                    if key in ('app_name', 'colors', 'ui_components'):
+                        yield sse_event('preview', {'preview_html': android_generator.generate_preview_html(partial_structure)})
+                elif kind == 'item':
+                    _, key, index, value = event
+                    yield sse_event('item', {'key': key, 'index': index, 'value': value})
+                    if key == 'ui_components':
+                        partial_structure.setdefault('ui_components', []).append(value)
+                        yield sse_event('preview', {'preview_html': android_generator.generate_preview_html(partial_structure)})
+                elif kind == 'error':
+                    yield sse_event('error', {'message': event[1]})
+                    return
+                elif kind == 'done':
+                    app_structure = event[1]
+                    project_id = str(uuid.uuid4())
+                    android_generator.create_android_project(app_structure, project_id, prompt=prompt,
+                                                             provider=provider)
+                    result = {
+                        'success': True,
+                        'message': 'Android app generated successfully',
+                        'project_id': project_id,
+                        'preview_html': android_generator.generate_preview_html(app_structure),
+                        'app_structure': app_structure
+                    }
+                    remember_generation(session_key, prompt, image_path, result)
+                    yield sse_event('done', result)
+        except Exception as e:
+            app.logger.error(f"Error streaming app generation: {str(e)}")
+            yield sse_event('error', {'message': f'Error generating app: {str(e)}'})
+        finally:
+            # Closes the provider stream if the browser disconnected early
+            events.close()
+
+    return Response(stream_with_context(event_stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/download_project/<project_id>')
 def download_project(project_id):
     """Download generated Android project as ZIP file"""
     try:
-        project_path = os.path.join(app.config['GENERATED_PROJECTS_FOLDER'], project_id)
-        if not os.path.exists(project_path):
+        tree = project_sink.load(project_id)
+        if tree is None:
             flash('Project not found', 'error')
             return redirect(url_for('index'))
 
-        # Create ZIP file
+        retention_sweeper.touch('blobstore' if isinstance(project_sink, BlobStoreSink) else 'projects', project_id)
+        project_catalog.record_download(project_id)
         zip_filename = f"android_app_{project_id}.zip"
-        zip_path = os.path.join(app.config['GENERATED_PROJECTS_FOLDER'], zip_filename)
 
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(project_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, project_path)
-                    zipf.write(file_path, arcname)
+        if zip_cache:
+            zip_path = zip_cache.get_or_build(project_id, tree)
+            retention_sweeper.touch('zips', os.path.basename(zip_path))
+            return send_file(zip_path, as_attachment=True, download_name=zip_filename)
 
-        return send_file(zip_path, as_attachment=True, download_name=zip_filename)
+        # Stream the archive as it is built; no temporary file is written
+        return Response(stream_with_context(iter_zip_tree(tree)), mimetype='application/zip',
+                        headers={'Content-Disposition': f'attachment; filename="{zip_filename}"'})
 
     except Exception as e:
         app.logger.error(f"Error downloading project: {str(e)}")
         flash(f'Error downloading project: {str(e)}', 'error')
         return redirect(url_for('index'))
 
+def parse_time(value):
+    """Accept a Unix timestamp or an ISO 8601 date/time; None if absent"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def list_catalog(query=None):
+    """Page through the catalog with the filters given in the query string"""
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = max(1, min(int(request.args.get('per_page', 20)), MAX_PAGE_SIZE))
+        created_after = parse_time(request.args.get('since'))
+        created_before = parse_time(request.args.get('until'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid query parameter: {str(e)}'}), 400
+
+    projects, total = project_catalog.search(query=query,
+                                             app_name=request.args.get('app_name'),
+                                             package_name=request.args.get('package_name'),
+                                             created_after=created_after, created_before=created_before,
+                                             limit=per_page, offset=(page - 1) * per_page)
+    return jsonify({
+        'success': True,
+        'projects': projects,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'pages': (total + per_page - 1) // per_page
+    })
+
+@app.route('/projects')
+def list_projects():
+    """Generated projects, newest first; filter by app_name, package_name, since and until"""
+    return list_catalog()
+
+@app.route('/projects/search')
+def search_projects():
+    """Full-text search over prompts, app names and descriptions (q), ranked by relevance"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'message': 'Search query cannot be empty'}), 400
+    return list_catalog(query)
+
+@app.route('/projects/<project_id>')
+def project_details(project_id):
+    """Catalog metadata of one generated project"""
+    project = project_catalog.get(project_id)
+    if not project:
+        return jsonify({'success': False, 'message': 'Project not found'}), 404
+    return jsonify({'success': True, 'project': project,
+                    'download_url': url_for('download_project', project_id=project_id)})
+
+@app.route('/storage/stats')
+def storage_stats():
+    """Retention metrics: items and bytes kept, removed and reclaimed per folder"""
+    return jsonify(retention_sweeper.stats())
+
+@app.route('/providers/stats')
+def provider_stats():
+    """Rolling latency, error rate and rate-limit state per provider"""
+    return jsonify({'routing': app.config['PROVIDER_ROUTING'], 'providers': provider_router.stats(),
+                    'rate_limits': rate_limiter.stats()})
+
 @app.route('/download_source')
 def download_source():
     """Download the complete source code as ZIP file"""
@@ -314,23 +729,8 @@ def download_source():
 def update_preview():
     """Update preview based on modified prompt"""
     try:
-        config = load_config()
-        provider = config.get('ai_provider', 'gemini')
-        api_url = config.get('api_url', None)
-
-        # Get the appropriate API key based on provider
-        if provider == 'gemini':
-            api_key = config.get('gemini_api_key')
-        elif provider == 'groq':
-            api_key = config.get('groq_api_key')
-        elif provider == 'ollama':
-            api_key = config.get('ollama_api_key')
-        elif provider == 'huggingface':
-            api_key = config.get('huggingface_api_key')
-        else:
-            api_key = config.get('llama_api_key')
-
-        if not api_key and provider not in ['ollama']: # Ollama might not require an API key directly here
+        provider, api_key, current_ai_service = resolve_ai_service(config_store.load())
+        if not current_ai_service:
             return jsonify({'success': False, 'message': f'No API key configured for {provider}'})
 
         prompt = request.form.get('prompt', '').strip()
@@ -338,36 +738,35 @@ def update_preview():
             return jsonify({'success': False, 'message': 'Prompt cannot be empty'})
 
         uploaded_image = request.form.get('uploaded_image')
-        image_path = None
-        if uploaded_image:
-            image_path = os.path.join(app.config['UPLOAD_FOLDER'], uploaded_image)
-            if not os.path.exists(image_path):
-                image_path = None
-
-        # Initialize the correct AI service
-        current_ai_service = None
-        if provider == 'gemini':
-            current_ai_service = GeminiService()
-            current_ai_service.set_api_key(api_key, provider='gemini')
-        elif provider == 'llama':
-            current_ai_service = GeminiService()
-            current_ai_service.set_api_key(api_key, provider='llama', api_url=api_url)
-            app.logger.warning("LlamaService not fully implemented for preview. Using GeminiService as placeholder.")
-        elif provider == 'groq':
-            current_ai_service = GeminiService()
-            current_ai_service.set_api_key(api_key, provider='groq', api_url=api_url)
-        elif provider == 'ollama':
-            current_ai_service = GeminiService()
-            current_ai_service.set_api_key(api_key, provider='ollama', api_url=api_url)
-        elif provider == 'huggingface':
-            current_ai_service = GeminiService()
-            current_ai_service.set_api_key(api_key, provider='huggingface', api_url=api_url)
-
-        if not current_ai_service:
-            return jsonify({'success': False, 'message': f'AI service not initialized for provider: {provider}'})
+        image_path = resolve_uploaded_image(uploaded_image)
 
         # Generate updated Android app structure for preview
-        app_structure = current_ai_service.generate_android_app(prompt, image_path, preview_only=True)
+        session_key = get_session_key()
+        base = None
+        if request.form.get('edit', '').lower() in ['1', 'true', 'yes']:
+            base = find_edit_base(session_key, image_path, require_project=False)
+        cancel_token = preview_requests.begin(session_key)
+        try:
+            if base is not None:
+                # Only the previewed fields are patched; the stored app changes on the next generate
+                flight_key = make_cache_key('preview-edit', provider, current_ai_service.api_url, base['project_id'],
+                                            prompt)
+                app_structure = preview_flights.do(
+                    flight_key,
+                    lambda flight_token: edit_preview_structure(current_ai_service, base, prompt, flight_token),
+                    cancel_token=cancel_token)
+            if base is None or not app_structure:
+                flight_key = make_cache_key('preview', provider, current_ai_service.api_url, prompt, image_path)
+                app_structure = preview_flights.do(
+                    flight_key,
+                    lambda flight_token: current_ai_service.generate_android_app(
+                        prompt, image_path, preview_only=True, cancel_token=flight_token),
+                    cancel_token=cancel_token)
+        except Superseded:
+            return jsonify({'success': False, 'superseded': True, 'message': 'Preview superseded by a newer request'})
+        finally:
+            preview_requests.end(session_key, cancel_token)
+
         if not app_structure:
             return jsonify({'success': False, 'message': 'Failed to generate preview. Please check your API key and try a simpler prompt.'})
 
@@ -0,0 +1,92 @@
+import logging
+import threading
+from collections import OrderedDict
+
+SUPPORTED_PROVIDERS = ('gemini', 'llama', 'groq', 'ollama', 'huggingface')
+# Providers that can run without an API key (Ollama is usually a local server)
+KEYLESS_PROVIDERS = ('ollama',)
+
+
+def get_provider_credentials(config, provider=None):
+    """Return (provider, api_key, api_url) for the configured or requested provider"""
+    provider = (provider or config.get('ai_provider', 'gemini')).lower()
+    if provider in ['gemini', 'groq', 'ollama', 'huggingface']:
+        api_key = config.get(f'{provider}_api_key')
+    else:
+        api_key = config.get('llama_api_key')
+    return provider, api_key, config.get('api_url', None)
+
+
+class ServiceRegistry:
+    """Process-wide provider clients, one per (provider, api_key, api_url).
+
+    Each client is configured once and then shared by every request and thread, so its
+    connection pool, caches and counters outlive a single request. The client for the
+    saved configuration is swapped in atomically; requests already holding the previous
+    one finish with it.
+    """
+
+    def __init__(self, factory, max_services=16):
+        self.factory = factory
+        self.max_services = max_services
+        self._services = OrderedDict()
+        self._active_key = None
+        self._lock = threading.Lock()
+
+    def _build(self, provider, api_key, api_url):
+        if provider not in SUPPORTED_PROVIDERS:
+            raise ValueError(f'Unsupported AI provider: {provider}')
+        service = self.factory()
+        service.set_api_key(api_key, provider=provider, api_url=api_url)
+        if provider == 'llama':
+            # No dedicated Llama client yet; GeminiService stands in
+            logging.warning("LlamaService not fully implemented yet. Using GeminiService as placeholder.")
+        return service
+
+    def get(self, provider, api_key, api_url=None):
+        """Return the shared client for these credentials, building it on first use"""
+        key = (provider.lower(), api_key, api_url)
+        with self._lock:
+            service = self._services.get(key)
+            if service is None:
+                service = self._build(*key)
+                self._services[key] = service
+                while len(self._services) > self.max_services:
+                    evicted, _ = self._services.popitem(last=False)
+                    logging.info(f"Dropped idle {evicted[0]} client")
+            else:
+                self._services.move_to_end(key)
+        service.activate()
+        return service
+
+    def for_config(self, config, provider=None):
+        """Return (provider, api_key, service) for a configuration; service is None without a key"""
+        provider, api_key, api_url = get_provider_credentials(config, provider)
+        if not api_key and provider not in KEYLESS_PROVIDERS:
+            return provider, api_key, None
+        return provider, api_key, self.get(provider, api_key, api_url)
+
+    def configure(self, provider, api_key, api_url=None):
+        """Make these credentials the active ones, replacing older clients for the same provider"""
+        provider = provider.lower()
+        service = self._build(provider, api_key, api_url)
+        key = (provider, api_key, api_url)
+        with self._lock:
+            for stale in [k for k in self._services if k[0] == provider and k != key]:
+                del self._services[stale]
+            self._services[key] = service
+            self._active_key = key
+        service.activate()
+        return service
+
+    def active(self):
+        """Return the client for the most recently saved configuration, if any"""
+        with self._lock:
+            return self._services.get(self._active_key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'services': [{'provider': provider, 'api_url': api_url} for provider, _, api_url in self._services],
+                'active_provider': self._active_key[0] if self._active_key else None,
+            }
@@ -0,0 +1,16 @@
+import sqlite3
+from contextlib import contextmanager
+
+
+@contextmanager
+def connect(db_path, row_factory=None, wal=False, timeout=10):
+    """Open db_path for one transaction: committed on success, rolled back on error, always closed"""
+    conn = sqlite3.connect(db_path, timeout=timeout)
+    conn.row_factory = row_factory
+    try:
+        if wal:
+            conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            yield conn
+    finally:
+        conn.close()
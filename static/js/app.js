@@ -22,9 +22,16 @@ document.addEventListener('DOMContentLoaded', function() {
     const appPreview = document.getElementById('appPreview');
     const downloadPanel = document.getElementById('downloadPanel');
     const downloadBtn = document.getElementById('downloadBtn');
+    const editModeGroup = document.getElementById('editModeGroup');
+    const editCurrentApp = document.getElementById('editCurrentApp');
     const loadingModal = new bootstrap.Modal(document.getElementById('loadingModal'));
 
     // Utility functions
+    function isEditing() {
+        // Editing is opt-in; otherwise every generation creates a new project
+        return Boolean(currentProjectId && editCurrentApp && editCurrentApp.checked);
+    }
+
     function showApiStatus(message, type) {
         const statusDiv = document.getElementById('apiStatus');
         if (statusDiv) {
@@ -295,6 +302,7 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     // Preview functionality
+    let previewController = null;
     if (updatePreviewBtn) {
         updatePreviewBtn.addEventListener('click', async function() {
             const prompt = appPrompt ? appPrompt.value.trim() : '';
@@ -303,6 +311,11 @@ document.addEventListener('DOMContentLoaded', function() {
                 return;
             }
 
+            // Drop the previous preview request; the server aborts its provider call too
+            if (previewController) previewController.abort();
+            const controller = new AbortController();
+            previewController = controller;
+
             try {
                 showLoadingModal('Generating preview...', 'Please wait while we create your app preview');
 
@@ -311,14 +324,20 @@ document.addEventListener('DOMContentLoaded', function() {
                 if (uploadedImageFilename) {
                     formData.append('uploaded_image', uploadedImageFilename);
                 }
+                // Patch the generated app's preview instead of sketching a new one
+                if (isEditing()) formData.append('edit', '1');
 
                 const response = await fetch('/update_preview', {
                     method: 'POST',
-                    body: formData
+                    body: formData,
+                    signal: controller.signal
                 });
 
                 const result = await response.json();
 
+                // A newer preview request is already on its way
+                if (result.superseded || controller !== previewController) return;
+
                 hideLoadingModal();
 
                 if (result.success) {
@@ -331,12 +350,57 @@ document.addEventListener('DOMContentLoaded', function() {
                     showGenerationStatus(result.message, 'error');
                 }
             } catch (error) {
+                if (error.name === 'AbortError') return;
                 hideLoadingModal();
                 showGenerationStatus('Error generating preview: ' + error.message, 'error');
+            } finally {
+                if (previewController === controller) previewController = null;
             }
         });
     }
 
+    // Read server-sent events from /generate_app_stream, updating the preview as fields arrive
+    async function readGenerationStream(response) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let result = { success: false, message: 'Generation ended unexpectedly. Please try again.' };
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let eventName = 'message';
+                let data = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                });
+                if (!data) continue;
+                const payload = JSON.parse(data);
+
+                if (eventName === 'preview') {
+                    // Show partial results as soon as the first useful fields arrive
+                    hideLoadingModal();
+                    if (appPreview) appPreview.innerHTML = payload.preview_html;
+                    if (previewPanel) previewPanel.style.display = 'block';
+                    showGenerationStatus('Generating Android app... the preview updates as parts arrive', 'info');
+                } else if (eventName === 'done') {
+                    result = payload;
+                } else if (eventName === 'error') {
+                    result = { success: false, message: payload.message };
+                }
+            }
+        }
+        return result;
+    }
+
     // App generation functionality
     if (appGeneratorForm) {
         appGeneratorForm.addEventListener('submit', async function(e) {
@@ -359,17 +423,31 @@ document.addEventListener('DOMContentLoaded', function() {
                     formData.append('uploaded_image', uploadedImageFilename);
                 }
 
-                const response = await fetch('/generate_app', {
+                // Editing the current project rewrites only the changed files
+                let url = '/generate_app_stream';
+                if (isEditing()) {
+                    formData.append('edit', '1');
+                    url = '/generate_app';
+                }
+
+                const response = await fetch(url, {
                     method: 'POST',
                     body: formData
                 });
 
-                const result = await response.json();
+                let result;
+                const contentType = response.headers.get('Content-Type') || '';
+                if (contentType.includes('text/event-stream') && response.body) {
+                    result = await readGenerationStream(response);
+                } else {
+                    result = await response.json();
+                }
 
                 hideLoadingModal();
 
                 if (result.success) {
                     currentProjectId = result.project_id;
+                    if (editModeGroup) editModeGroup.style.display = 'block';
 
                     // Update preview
                     if (appPreview) appPreview.innerHTML = result.preview_html;
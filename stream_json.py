@@ -0,0 +1,128 @@
+import json
+
+# Characters of leading prose tolerated before the JSON document must start
+MAX_PREAMBLE_CHARS = 2000
+
+
+class MalformedStreamError(ValueError):
+    """Raised when a streamed response clearly is not the expected JSON document"""
+
+
+class IncrementalJSONParser:
+    """Incrementally scan a streamed JSON object and report members as soon as they complete.
+
+    feed() returns a list of events:
+      ('field', key, value)        a top-level member finished parsing
+      ('item', key, index, value)  an element of a top-level array listed in item_keys finished
+    """
+
+    def __init__(self, item_keys=()):
+        self.item_keys = set(item_keys)
+        self.text = ''
+        self.fields = {}
+        self.done = False
+        self._pos = 0
+        self._started = False
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._key = None
+        self._expect_key = True
+        self._value_start = None
+        self._array_key = None
+        self._item_start = None
+        self._item_index = 0
+
+    def feed(self, chunk):
+        """Consume the next chunk of text and return any completed events"""
+        self.text += chunk
+        events = []
+        text = self.text
+        while self._pos < len(text) and not self.done:
+            char = text[self._pos]
+            if not self._started:
+                self._scan_preamble(char)
+            elif self._in_string:
+                self._scan_string(char)
+            else:
+                self._scan_structure(char, events)
+            self._pos += 1
+        return events
+
+    def _scan_preamble(self, char):
+        if char == '{':
+            self._started = True
+            self._stack.append('{')
+        elif char == '<' and not self.text[:self._pos].strip():
+            raise MalformedStreamError("Response looks like HTML, not JSON")
+        elif self._pos >= MAX_PREAMBLE_CHARS:
+            raise MalformedStreamError("No JSON object found at the start of the response")
+
+    def _scan_string(self, char):
+        if self._escape:
+            self._escape = False
+        elif char == '\\':
+            self._escape = True
+        elif char == '"':
+            self._in_string = False
+            if self._string_start is not None:
+                self._key = json.loads(self.text[self._string_start:self._pos + 1], strict=False)
+                self._string_start = None
+                self._expect_key = False
+
+    def _scan_structure(self, char, events):
+        depth = len(self._stack)
+        if char == '"':
+            self._in_string = True
+            if depth == 1 and self._expect_key:
+                self._string_start = self._pos
+        elif char == ':' and depth == 1:
+            self._value_start = self._pos + 1
+        elif char in '{[':
+            if char == '[' and depth == 1 and self._key in self.item_keys:
+                self._array_key = self._key
+                self._item_start = self._pos + 1
+                self._item_index = 0
+            self._stack.append(char)
+        elif char in '}]':
+            if depth == 2 and char == ']' and self._array_key is not None:
+                self._emit_item(events, self._pos)
+                self._array_key = None
+            self._stack.pop()
+            if not self._stack:
+                self._emit_field(events, self._pos)
+                self.done = True
+        elif char == ',':
+            if depth == 1:
+                self._emit_field(events, self._pos)
+                self._expect_key = True
+            elif depth == 2 and self._array_key is not None:
+                self._emit_item(events, self._pos)
+                self._item_start = self._pos + 1
+
+    def _emit_field(self, events, end):
+        if self._key is None or self._value_start is None:
+            return
+        raw = self.text[self._value_start:end].strip()
+        try:
+            value = json.loads(raw, strict=False)
+        except json.JSONDecodeError:
+            # Leave malformed members to the full-document parse at the end
+            pass
+        else:
+            self.fields[self._key] = value
+            events.append(('field', self._key, value))
+        self._key = None
+        self._value_start = None
+
+    def _emit_item(self, events, end):
+        raw = self.text[self._item_start:end].strip()
+        if not raw:
+            return
+        try:
+            value = json.loads(raw, strict=False)
+        except json.JSONDecodeError:
+            return
+        events.append(('item', self._array_key, self._item_index, value))
+        self._item_index += 1
@@ -0,0 +1,149 @@
+import time
+import asyncio
+import unittest
+from provider_errors import ProviderError
+from provider_router import ProviderRouter
+
+CONFIG = {'ai_provider': 'groq', 'groq_api_key': 'groq-key', 'gemini_api_key': 'gemini-key'}
+
+
+class FakeService:
+    def __init__(self, provider, result=None, error=None, delay=0.0):
+        self.provider = provider
+        self.api_url = None
+        self.result = result
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+        self.cancelled = False
+
+    def generate_android_app(self, prompt, image_path=None, preview_only=False, cancel_token=None,
+                             use_fallback=True):
+        self.calls += 1
+        if self.delay:
+            # A stalled call returns early once its token is cancelled
+            if cancel_token is not None and cancel_token.wait(self.delay):
+                self.cancelled = True
+                return None
+            if cancel_token is None:
+                time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    async def generate_android_app_async(self, prompt, image_path=None, preview_only=False, use_fallback=True):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def get_fallback_app_structure(self, prompt):
+        return {'app_name': 'Fallback'}
+
+
+class FakeRegistry:
+    def __init__(self, services):
+        self.services = services
+
+    def get(self, provider, api_key=None, api_url=None):
+        return self.services[provider]
+
+
+class ProviderRouterTest(unittest.TestCase):
+    def make_router(self, groq, gemini, **kwargs):
+        self.services = {'groq': groq, 'gemini': gemini}
+        return ProviderRouter(FakeRegistry(self.services), providers=('gemini', 'groq'), **kwargs)
+
+    def test_configured_provider_is_tried_first(self):
+        router = self.make_router(FakeService('groq', {'app_name': 'Groq'}),
+                                  FakeService('gemini', {'app_name': 'Gemini'}))
+        self.assertEqual([provider for provider, _ in router.candidates(CONFIG)], ['groq', 'gemini'])
+        _, _, service = router.for_config(CONFIG)
+        self.assertEqual(service.generate_android_app('todo'), {'app_name': 'Groq'})
+        self.assertEqual(self.services['gemini'].calls, 0)
+
+    def test_providers_without_credentials_are_skipped(self):
+        router = self.make_router(FakeService('groq'), FakeService('gemini'))
+        config = {'ai_provider': 'groq', 'groq_api_key': 'groq-key'}
+        self.assertEqual([provider for provider, _ in router.candidates(config)], ['groq'])
+
+    def test_failover_on_provider_error(self):
+        router = self.make_router(FakeService('groq', error=ProviderError('upstream down', status_code=503)),
+                                  FakeService('gemini', {'app_name': 'Gemini'}))
+        _, _, service = router.for_config(CONFIG)
+        self.assertEqual(service.generate_android_app('todo'), {'app_name': 'Gemini'})
+        self.assertEqual((self.services['groq'].calls, self.services['gemini'].calls), (1, 1))
+
+        stats = router.stats()
+        self.assertEqual(stats['groq']['failures'], 1)
+        self.assertEqual(stats['gemini']['failures'], 0)
+
+    def test_rate_limited_provider_is_ranked_last_until_it_recovers(self):
+        rate_limited = ProviderError('slow down', status_code=429, retry_after=30)
+        router = self.make_router(FakeService('groq', error=rate_limited),
+                                  FakeService('gemini', {'app_name': 'Gemini'}))
+        _, _, service = router.for_config(CONFIG)
+        service.generate_android_app('todo')
+        self.assertFalse(router.health('groq').available())
+        self.assertEqual([provider for provider, _ in router.candidates(CONFIG)], ['gemini', 'groq'])
+
+        service.generate_android_app('todo')
+        self.assertEqual(self.services['groq'].calls, 1)
+
+    def test_all_providers_failing(self):
+        router = self.make_router(FakeService('groq', error=ProviderError('down', status_code=500)),
+                                  FakeService('gemini', error=ProviderError('also down', status_code=500)))
+        _, _, service = router.for_config(CONFIG)
+        with self.assertRaises(ProviderError):
+            service.generate_android_app('todo', use_fallback=False)
+        self.assertEqual(service.generate_android_app('todo'), {'app_name': 'Fallback'})
+
+    def test_circuit_opens_after_repeated_failures(self):
+        router = self.make_router(FakeService('groq'), FakeService('gemini'))
+        for _ in range(3):
+            router.record('groq', time.time(), None, ProviderError('down', status_code=500), None)
+        self.assertFalse(router.health('groq').available())
+
+    def test_hedged_preview_takes_the_faster_provider(self):
+        router = self.make_router(FakeService('groq', {'app_name': 'Groq'}, delay=5),
+                                  FakeService('gemini', {'app_name': 'Gemini'}),
+                                  hedge_previews=True, hedge_delay=0.05)
+        _, _, service = router.for_config(CONFIG)
+        started = time.time()
+        self.assertEqual(service.generate_android_app('todo', preview_only=True), {'app_name': 'Gemini'})
+        self.assertLess(time.time() - started, 2)
+        # The slow call is cancelled once the hedge wins
+        for _ in range(100):
+            if self.services['groq'].cancelled:
+                break
+            time.sleep(0.01)
+        self.assertTrue(self.services['groq'].cancelled)
+
+    def test_async_failover_and_hedging(self):
+        router = self.make_router(FakeService('groq', error=ProviderError('upstream down', status_code=503)),
+                                  FakeService('gemini', {'app_name': 'Gemini'}),
+                                  hedge_previews=True, hedge_delay=0.05)
+        registry = FakeRegistry(self.services)
+        _, _, service = router.for_config_async(CONFIG, registry)
+        self.assertEqual(asyncio.run(service.generate_android_app_async('todo')), {'app_name': 'Gemini'})
+
+        # gemini now ranks first; when it stalls, the hedge to groq answers the preview
+        self.assertEqual([provider for provider, _ in router.candidates(CONFIG, registry=registry)],
+                         ['gemini', 'groq'])
+        self.services['groq'].error = None
+        self.services['groq'].result = {'app_name': 'Groq'}
+        self.services['gemini'].delay = 5
+        started = time.time()
+        result = asyncio.run(service.generate_android_app_async('todo', preview_only=True))
+        self.assertEqual(result, {'app_name': 'Groq'})
+        self.assertLess(time.time() - started, 2)
+        self.assertTrue(self.services['gemini'].cancelled)
+
+
+if __name__ == '__main__':
+    unittest.main()
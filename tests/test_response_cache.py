@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from response_cache import ResponseCache, make_cache_key
+
+
+class FakeClock:
+    def __init__(self, now=1000000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.folder.name, 'responses.db')
+        self.clock = FakeClock()
+        patcher = mock.patch('response_cache.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.folder.cleanup)
+
+    def disk_keys(self):
+        with sqlite3.connect(self.db_path) as conn:
+            return {row[0] for row in conn.execute("SELECT key FROM responses")}
+
+    def test_round_trip_through_both_tiers(self):
+        cache = ResponseCache(self.db_path)
+        cache.set('a', {'app_name': 'Todo'})
+        self.assertEqual(cache.get('a'), {'app_name': 'Todo'})
+        # A fresh process only has the disk tier
+        self.assertEqual(ResponseCache(self.db_path).get('a'), {'app_name': 'Todo'})
+        self.assertIsNone(cache.get('missing'))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_ttl_expiry(self):
+        cache = ResponseCache(self.db_path, ttl_seconds=60)
+        cache.set('a', 'first')
+        self.clock.now += 59
+        self.assertEqual(cache.get('a'), 'first')
+        self.assertEqual(ResponseCache(self.db_path, ttl_seconds=60).get('a'), 'first')
+
+        self.clock.now += 2
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNone(ResponseCache(self.db_path, ttl_seconds=60).get('a'))
+        self.assertEqual(self.disk_keys(), set())
+
+    def test_expired_rows_are_evicted_on_write(self):
+        cache = ResponseCache(self.db_path, ttl_seconds=60)
+        cache.set('old', 'x')
+        self.clock.now += 120
+        cache.set('new', 'y')
+        self.assertEqual(self.disk_keys(), {'new'})
+
+    def test_memory_tier_evicts_least_recently_used(self):
+        cache = ResponseCache(max_memory_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(list(cache._memory), ['a', 'c'])
+        self.assertIsNone(cache.get('b'))
+
+    def test_disk_tier_evicts_least_recently_used_over_budget(self):
+        value = 'x' * 100
+        entry_size = len('"' + value + '"')
+        # No memory tier, so every read reaches SQLite and refreshes accessed_at
+        cache = ResponseCache(self.db_path, max_memory_entries=0, max_disk_bytes=entry_size * 3)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, value)
+            self.clock.now += 1
+        cache.get('a')
+        self.clock.now += 1
+
+        cache.set('d', value)
+        self.assertEqual(self.disk_keys(), {'a', 'c', 'd'})
+        self.clock.now += 1
+        cache.set('e', value)
+        self.assertEqual(self.disk_keys(), {'a', 'd', 'e'})
+
+    def test_uncacheable_values_are_skipped(self):
+        cache = ResponseCache(self.db_path)
+        cache.set('a', {'bad': object()})
+        self.assertIsNone(cache.get('a'))
+
+    def test_cache_key_parts_are_length_prefixed(self):
+        self.assertNotEqual(make_cache_key('ab', 'c'), make_cache_key('a', 'bc'))
+        self.assertEqual(make_cache_key('a', None), make_cache_key('a', b''))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import json
+import unittest
+from response_parser import parse_response, repair_json, strip_fences, validate
+
+SCHEMA = {'app_name': str, 'main_activity': dict, 'main_activity.java_code': str, 'strings': str}
+OPTIONAL = ('strings',)
+
+
+class RepairJsonTest(unittest.TestCase):
+    CASES = [
+        # (response text, expected data)
+        ('{"a": 1}', {'a': 1}),
+        ('Here is your app:\n```json\n{"a": 1}\n```\nEnjoy!', {'a': 1}),
+        ('```\n{"a": [1, 2]}\n```', {'a': [1, 2]}),
+        ('{"a": 1,}', {'a': 1}),
+        ('{"a": [1, 2, ], "b": {"c": 3,},}', {'a': [1, 2], 'b': {'c': 3}}),
+        ('{"a": [1,, 2]}', {'a': [1, 2]}),
+        ('{"code": "line one\nline two\tend"}', {'code': 'line one\nline two\tend'}),
+        ('{"path": "C:\\Users\\app"}', {'path': 'C:\\Users\\app'}),
+        ('{"regex": "\\d+\\.\\w"}', {'regex': '\\d+\\.\\w'}),
+        ('{"quote": "it\\\'s"}', {'quote': "it's"}),
+        ('{"ok": "\\n\\"\\u0041"}', {'ok': '\n"A'}),
+        ('{"a": 1} trailing text {"b": 2}', {'a': 1}),
+        ('{"a": 1}]', {'a': 1}),
+    ]
+
+    def test_repairs(self):
+        for text, expected in self.CASES:
+            with self.subTest(text=text):
+                result = parse_response(text)
+                self.assertEqual(result.data, expected)
+
+    def test_strip_fences(self):
+        self.assertEqual(strip_fences('```json\n{}\n```'), '{}\n')
+
+    def test_no_json(self):
+        for text in ('', '   ', 'no braces here', '<html><body>502</body></html>'):
+            with self.subTest(text=text):
+                self.assertIsNone(parse_response(text).data)
+
+
+class TruncationTest(unittest.TestCase):
+    CASES = [
+        # (truncated text, expected data, field being written when the text was cut)
+        ('{"app_name": "Todo", "strings": "<resources>', {'app_name': 'Todo', 'strings': '<resources>'}, 'strings'),
+        ('{"app_name": "Todo", "main_activity": {"name": "Main", "java_code": "class',
+         {'app_name': 'Todo', 'main_activity': {'name': 'Main', 'java_code': 'class'}}, 'main_activity'),
+        ('{"app_name": "Todo", "items": [1, 2,', {'app_name': 'Todo', 'items': [1, 2]}, 'items'),
+        ('{"app_name": "Todo",', {'app_name': 'Todo'}, None),
+        ('{"app_name": "Todo", "strings": "a\\', {'app_name': 'Todo', 'strings': 'a'}, 'strings'),
+    ]
+
+    def test_truncated_documents_are_closed(self):
+        for text, expected, incomplete in self.CASES:
+            with self.subTest(text=text):
+                json_text, truncated, incomplete_key = repair_json(text)
+                self.assertTrue(truncated)
+                self.assertEqual(json.loads(json_text), expected)
+                self.assertEqual(incomplete_key, incomplete)
+
+    def test_cut_inside_a_key_falls_back_to_last_complete_member(self):
+        json_text, truncated, _ = repair_json('{"app_name": "Todo", "main_act')
+        self.assertTrue(truncated)
+        self.assertEqual(json.loads(json_text), {'app_name': 'Todo'})
+
+    def test_incomplete_field_is_reported_missing(self):
+        text = '{"app_name": "Todo", "main_activity": {"java_code": "class Main {}"}, "strings": "<resou'
+        result = parse_response(text, SCHEMA, OPTIONAL)
+        self.assertTrue(result.truncated)
+        self.assertEqual(result.incomplete, 'strings')
+        self.assertEqual(result.missing_fields, ['strings'])
+
+    def test_complete_document_is_not_truncated(self):
+        result = parse_response('{"app_name": "Todo", "main_activity": {"java_code": "x"}}', SCHEMA, OPTIONAL)
+        self.assertFalse(result.truncated)
+        self.assertFalse(result.repaired)
+        self.assertEqual(result.missing, [])
+
+
+class ValidateTest(unittest.TestCase):
+    CASES = [
+        ({'app_name': 'Todo', 'main_activity': {'java_code': 'x'}}, []),
+        ({'app_name': '', 'main_activity': {'java_code': 'x'}}, ['app_name']),
+        ({'app_name': 'Todo'}, ['main_activity', 'main_activity.java_code']),
+        ({'app_name': 'Todo', 'main_activity': 'MainActivity'}, ['main_activity', 'main_activity.java_code']),
+        ({'app_name': 'Todo', 'main_activity': {'java_code': 'x'}, 'strings': 5}, ['strings']),
+    ]
+
+    def test_validate(self):
+        for data, missing in self.CASES:
+            with self.subTest(data=data):
+                self.assertEqual(validate(data, SCHEMA, OPTIONAL), missing)
+
+    def test_missing_fields_are_top_level(self):
+        result = parse_response('{"app_name": "Todo"}', SCHEMA, OPTIONAL)
+        self.assertEqual(result.missing_fields, ['main_activity'])
+
+
+if __name__ == '__main__':
+    unittest.main()
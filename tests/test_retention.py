@@ -0,0 +1,45 @@
+import os
+import time
+import tempfile
+import unittest
+from retention import AccessTracker, FolderTarget, RetentionSweeper
+
+
+class FolderTargetTest(unittest.TestCase):
+    def test_sweep_keeps_dotfiles(self):
+        with tempfile.TemporaryDirectory() as root:
+            folder = os.path.join(root, 'uploads')
+            os.makedirs(folder)
+            old = time.time() - 30 * 24 * 3600
+            for name in ('.gitkeep', 'old.png'):
+                path = os.path.join(folder, name)
+                open(path, 'w').close()
+                os.utime(path, (old, old))
+
+            sweeper = RetentionSweeper(AccessTracker(os.path.join(root, 'access.db')), interval=0)
+            sweeper.add(FolderTarget('uploads', folder), ttl_seconds=3600)
+            result = sweeper.sweep_once()
+
+            self.assertEqual(result['uploads']['removed'], 1)
+            self.assertEqual(os.listdir(folder), ['.gitkeep'])
+
+    def test_size_follows_nested_rewrites(self):
+        with tempfile.TemporaryDirectory() as root:
+            project = os.path.join(root, 'project')
+            os.makedirs(os.path.join(project, 'app', 'src'))
+            source = os.path.join(project, 'app', 'src', 'Main.java')
+            with open(source, 'w') as f:
+                f.write('x' * 10)
+            target = FolderTarget('projects', root)
+            self.assertEqual([size for _, size, _ in target.iter_items()], [10])
+
+            # An edit rewrites the file in place; the project directory's own mtime stays the same
+            top_mtime = os.stat(project).st_mtime_ns
+            with open(source, 'w') as f:
+                f.write('x' * 500)
+            os.utime(project, ns=(top_mtime, top_mtime))
+            self.assertEqual([size for _, size, _ in target.iter_items()], [500])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import json
+import random
+import unittest
+from stream_json import IncrementalJSONParser, MalformedStreamError, MAX_PREAMBLE_CHARS
+
+DOCUMENT = {
+    'app_name': 'Quote "Book"',
+    'package_name': 'com.example.quotes',
+    'main_activity': {'name': 'MainActivity', 'java_code': 'if (a) { b(","); }\nreturn "\\\\";'},
+    'ui_components': [
+        {'type': 'Button', 'id': 'add', 'text': 'Add, then save'},
+        {'type': 'TextView', 'id': 'title', 'text': 'Say \\"hi\\" ]}'},
+    ],
+    'additional_activities': [],
+    'strings': '<resources>\n    <string name="app_name">Quote \\u0022Book\\u0022</string>\n</resources>',
+    'version': 3,
+    'enabled': True,
+}
+ITEM_KEYS = ('ui_components', 'additional_activities')
+
+
+def expected_events(document):
+    events = []
+    for key, value in document.items():
+        if key in ITEM_KEYS:
+            events.extend(('item', key, index, item) for index, item in enumerate(value))
+        events.append(('field', key, value))
+    return events
+
+
+def feed_in_chunks(text, sizes):
+    parser = IncrementalJSONParser(item_keys=ITEM_KEYS)
+    events = []
+    position = 0
+    for size in sizes:
+        events.extend(parser.feed(text[position:position + size]))
+        position += size
+    events.extend(parser.feed(text[position:]))
+    return parser, events
+
+
+class IncrementalJSONParserTest(unittest.TestCase):
+    def setUp(self):
+        self.text = json.dumps(DOCUMENT, indent=2)
+
+    def test_whole_document(self):
+        parser, events = feed_in_chunks(self.text, [])
+        self.assertEqual(events, expected_events(DOCUMENT))
+        self.assertTrue(parser.done)
+        self.assertEqual(parser.fields, DOCUMENT)
+
+    def test_fixed_chunk_sizes(self):
+        for size in (1, 2, 3, 5, 8, 13, 64):
+            with self.subTest(size=size):
+                _, events = feed_in_chunks(self.text, [size] * (len(self.text) // size + 1))
+                self.assertEqual(events, expected_events(DOCUMENT))
+
+    def test_random_splits(self):
+        generator = random.Random(1234)
+        for _ in range(50):
+            sizes = [generator.randint(1, 20) for _ in range(len(self.text))]
+            with self.subTest(sizes=sizes[:10]):
+                _, events = feed_in_chunks(self.text, sizes)
+                self.assertEqual(events, expected_events(DOCUMENT))
+
+    def test_splits_around_escapes(self):
+        # Cut right after each backslash so an escape is split across chunks
+        text = json.dumps({'code': 'a\\"b', 'items': ['x\\\\', '"]'], 'end': 1})
+        cuts = [index + 1 for index, char in enumerate(text) if char == '\\']
+        parser = IncrementalJSONParser(item_keys=('items',))
+        events = []
+        previous = 0
+        for cut in cuts + [len(text)]:
+            events.extend(parser.feed(text[previous:cut]))
+            previous = cut
+        self.assertEqual(events, [
+            ('field', 'code', 'a\\"b'),
+            ('item', 'items', 0, 'x\\\\'),
+            ('item', 'items', 1, '"]'),
+            ('field', 'items', ['x\\\\', '"]']),
+            ('field', 'end', 1),
+        ])
+
+    def test_code_fences_and_preamble(self):
+        text = f"Here is the app:\n```json\n{self.text}\n```\nLet me know if you need changes."
+        for size in (1, 7, len(text)):
+            with self.subTest(size=size):
+                parser, events = feed_in_chunks(text, [size] * (len(text) // size + 1))
+                self.assertEqual(events, expected_events(DOCUMENT))
+                self.assertTrue(parser.done)
+
+    def test_events_arrive_before_the_document_ends(self):
+        parser = IncrementalJSONParser(item_keys=ITEM_KEYS)
+        events = parser.feed('{"app_name": "Todo", "ui_components": [{"id": "a"}, {"id"')
+        self.assertEqual(events, [('field', 'app_name', 'Todo'), ('item', 'ui_components', 0, {'id': 'a'})])
+        self.assertFalse(parser.done)
+        self.assertEqual(parser.feed(': "b"}]}'), [
+            ('item', 'ui_components', 1, {'id': 'b'}),
+            ('field', 'ui_components', [{'id': 'a'}, {'id': 'b'}]),
+        ])
+        self.assertTrue(parser.done)
+
+    def test_raw_control_characters_in_strings(self):
+        parser = IncrementalJSONParser()
+        self.assertEqual(parser.feed('{"code": "line one\nline two"}'), [('field', 'code', 'line one\nline two')])
+
+    def test_html_response(self):
+        with self.assertRaises(MalformedStreamError):
+            IncrementalJSONParser().feed('  <!DOCTYPE html><html>')
+
+    def test_missing_document(self):
+        parser = IncrementalJSONParser()
+        with self.assertRaises(MalformedStreamError):
+            for _ in range(MAX_PREAMBLE_CHARS // 100 + 1):
+                parser.feed('no json here ' * 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import glob
+import time
+import logging
+import tempfile
+import threading
+import zipfile
+from project_tree import ProjectTree
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _StreamBuffer:
+    """Write-only, non-seekable sink that lets zipfile emit an archive piece by piece"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def seekable(self):
+        return False
+
+    def drain(self):
+        """Return and forget everything written since the last drain"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _zip_info(path, entry):
+    info = zipfile.ZipInfo(path, date_time=time.localtime(entry.mtime)[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = (0o100000 | (entry.mode & 0o777)) << 16
+    return info
+
+
+def iter_zip_tree(tree):
+    """Build a ZIP of a ProjectTree on the fly and yield it as byte chunks, without a temporary file"""
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for path, entry in tree.iter_files():
+            data = entry.read()
+            with zipf.open(_zip_info(path, entry), 'w') as dst:
+                for offset in range(0, len(data), CHUNK_SIZE):
+                    dst.write(data[offset:offset + CHUNK_SIZE])
+                    chunk = buffer.drain()
+                    if chunk:
+                        yield chunk
+            chunk = buffer.drain()
+            if chunk:
+                yield chunk
+    # Central directory is written on close
+    yield buffer.drain()
+
+
+def iter_zip_directory(root):
+    """Stream a ZIP of every file under root"""
+    return iter_zip_tree(ProjectTree.from_directory(root))
+
+
+class ZipCache:
+    """Build each project's ZIP once and reuse it until the project contents change"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._lock = threading.Lock()
+        os.makedirs(self.folder, exist_ok=True)
+
+    def get_or_build(self, project_id, tree):
+        """Return the path of an up-to-date ZIP for the project tree, building it if needed"""
+        digest = tree.digest()[:16]
+        zip_path = os.path.join(self.folder, f"{project_id}-{digest}.zip")
+        if os.path.exists(zip_path):
+            return zip_path
+
+        with self._lock:
+            if os.path.exists(zip_path):
+                return zip_path
+            fd, temp_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in iter_zip_tree(tree):
+                        f.write(chunk)
+                os.replace(temp_path, zip_path)
+            except Exception:
+                os.unlink(temp_path)
+                raise
+            self._remove_stale(project_id, zip_path)
+        logging.info(f"Built cached ZIP for project {project_id} ({digest})")
+        return zip_path
+
+    def _remove_stale(self, project_id, current_path):
+        for path in glob.glob(os.path.join(self.folder, f"{glob.escape(project_id)}-*.zip")):
+            if path != current_path:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass